@@ -0,0 +1,13 @@
+"""
+URLconf of the ASGI application (see config/asgi.py): config.urls with the store routes of
+store.urls.async_urlpatterns, where the catalog reads are served by async views.
+"""
+from django.urls import include, path
+
+from store.urls import async_urlpatterns
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('store/', include(async_urlpatterns)),
+    *wsgi_urlpatterns,
+]
@@ -0,0 +1,27 @@
+"""
+Settings for running the test suite without MySQL: `python manage.py test --settings=config.test_settings`.
+`replica` is a second SQLite database standing in for a read replica (see store.replicas). The test
+database of `default` is a file, not SQLite's in-memory database, so tests can write to it from
+concurrent connections. The tests run in one process, so they use a LocMemCache instead of the
+shared cache (see store.checks).
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test-default.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test-default-test.sqlite3'},
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test-replica.sqlite3',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+SILENCED_SYSTEM_CHECKS = ['store.E001']
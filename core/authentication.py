@@ -0,0 +1,113 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+from .models import RevokedToken
+
+IDENTITY_CACHE_TIMEOUT = getattr(settings, 'STORE_IDENTITY_CACHE_TIMEOUT', 300)
+
+# What authenticating a user needs, cached per user: the columns of IDENTITY_USER_FIELDS, a digest of
+# the password hash when tokens carry one (CHECK_REVOKE_TOKEN), the id of its Customer and the `jti`s
+# of its revoked tokens that have not expired yet. The password hash itself is not cached.
+Identity = namedtuple('Identity', ['user_values', 'password_digest', 'customer_id', 'revoked_jtis'])
+
+# The user columns read by authentication and permission checks; the others are loaded on first access.
+IDENTITY_USER_FIELDS = ['id', 'is_active', 'is_staff', 'is_superuser']
+
+
+def identity_cache_key(user_id):
+    # Versioned with the shape of Identity, so entries cached by an older release are not read back.
+    return f'core:identity:v2:{user_id}'
+
+
+def invalidate_identity(user_id):
+    """Drop the cached identity of `user_id` once the current transaction commits."""
+    key = identity_cache_key(user_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def load_identity(user_model, user_id):
+    """The Identity of `user_id` from the database, or None if there is no such user."""
+    fields = list(dict.fromkeys([*IDENTITY_USER_FIELDS, api_settings.USER_ID_FIELD]))
+    row = (
+        user_model.objects
+        .annotate(customer_pk=F('customer'))
+        .filter(**{api_settings.USER_ID_FIELD: user_id})
+        .values_list(*fields, 'password', 'customer_pk')
+        .first()
+    )
+    if row is None:
+        return None
+    *values, password, customer_id = row
+    user_values = dict(zip(fields, values))
+    password_digest = get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None
+    revoked_jtis = (
+        RevokedToken.objects
+        .filter(user_id=user_values['id'], expires_at__gt=timezone.now())
+        .values_list('jti', flat=True)
+    )
+    return Identity(user_values, password_digest, customer_id, frozenset(revoked_jtis))
+
+
+def revoke_tokens(user_id, tokens):
+    """Refuse `tokens` of `user_id` until they expire; expired revocations of the user are deleted."""
+    RevokedToken.objects.bulk_create([
+        RevokedToken(jti=token[api_settings.JTI_CLAIM], user_id=user_id, expires_at=datetime_from_epoch(token['exp']))
+        for token in tokens
+    ], ignore_conflicts=True)
+    RevokedToken.objects.filter(user_id=user_id, expires_at__lte=timezone.now()).delete()
+    invalidate_identity(user_id)
+
+
+def get_customer_id(user):
+    """The Customer id cached with `user` by CachedJWTAuthentication, or None for users authenticated otherwise."""
+    return getattr(user, 'customer_id', None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that reads the user from the identity cache instead of the database. A cached
+    identity also carries the user's Customer id (see get_customer_id()) and revoked tokens, so an
+    authenticated request needs no identity queries until the entry expires or is invalidated by a
+    save of the user or its customer (see core.signals) or by a revocation (revoke_tokens()).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        key = identity_cache_key(user_id)
+        identity = cache.get(key)
+        if identity is None:
+            identity = load_identity(self.user_model, user_id)
+            if identity is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            cache.set(key, identity, IDENTITY_CACHE_TIMEOUT)
+
+        # A user with the cached columns loaded, the others deferred as with QuerySet.only(). from_db()
+        # takes the values in the order of the model's fields.
+        fields = [field.attname for field in self.user_model._meta.concrete_fields
+                  if field.attname in identity.user_values]
+        user = self.user_model.from_db(self.user_model.objects.db, fields,
+                                       [identity.user_values[name] for name in fields])
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if validated_token.get(api_settings.JTI_CLAIM) in identity.revoked_jtis:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != identity.password_digest:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        user.customer_id = identity.customer_id
+        return user
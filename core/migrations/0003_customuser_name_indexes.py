@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['last_name', 'first_name'], name='customuser_last_first_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['last_name'], name='customuser_last_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['first_name'], name='customuser_first_name_ci_idx'),
+        ),
+    ]
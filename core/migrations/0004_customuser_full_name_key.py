@@ -0,0 +1,21 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_customuser_name_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='customuser_last_first_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(fields=('last_name', 'first_name', 'username'), name='customuser_full_name_key'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_customuser_full_name_key'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='customuser',
+            name='customuser_full_name_key',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='customuser_last_name_ci_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['last_name', 'first_name'], name='customuser_last_first_idx'),
+        ),
+    ]
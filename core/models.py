@@ -1,6 +1,25 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
-
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # The customer admin lists customers by name and searches name prefixes. MySQL's default
+            # collations are case-insensitive, so the indexes serve the `istartswith` searches there.
+            models.Index(fields=['last_name', 'first_name'], name='customuser_last_first_idx'),
+            models.Index(fields=['first_name'], name='customuser_first_name_ci_idx'),
+        ]
+
+
+class RevokedToken(models.Model):
+    """A JWT refused until it expires (see core.authentication), by its `jti` claim."""
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='revoked_tokens')
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expires_at'], name='revokedtoken_user_expires_idx'),
+        ]
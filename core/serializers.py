@@ -1,5 +1,14 @@
+from django.utils.translation import gettext_lazy as _
 from djoser.serializers import UserCreateSerializer as DjoserUserCreateSerializer
 from djoser.serializers import UserSerializer as DjoserUserSerializer
+from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as JWTTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import revoke_tokens
+from .models import RevokedToken
 
 
 class UserCreateSerializer(DjoserUserCreateSerializer):
@@ -12,3 +21,32 @@ class UserSerializer(DjoserUserSerializer):
 
     class Meta(DjoserUserSerializer.Meta):
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
+
+
+class TokenRefreshSerializer(JWTTokenRefreshSerializer):
+    """Refuses refresh tokens revoked through RevokeTokenSerializer."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if RevokedToken.objects.filter(jti=refresh[jwt_settings.JTI_CLAIM]).exists():
+            raise TokenError(_('Token has been revoked'))
+        return super().validate(attrs)
+
+
+class RevokeTokenSerializer(serializers.Serializer):
+    """The access token of the request, and optionally a refresh token of the same user, to revoke."""
+    refresh = serializers.CharField(required=False)
+
+    def validate_refresh(self, value):
+        try:
+            refresh = RefreshToken(value)
+        except TokenError as exc:
+            raise serializers.ValidationError(str(exc))
+        if str(refresh[jwt_settings.USER_ID_CLAIM]) != str(self.context['request'].user.pk):
+            raise serializers.ValidationError(_('Token belongs to another user'))
+        return refresh
+
+    def save(self, **kwargs):
+        request = self.context['request']
+        tokens = [token for token in (request.auth, self.validated_data.get('refresh')) if token is not None]
+        revoke_tokens(request.user.pk, tokens)
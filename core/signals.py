@@ -1,7 +1,24 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+
+from store.models import Customer
 from store.signals import order_create
+from .authentication import invalidate_identity
 
 
 @receiver(order_create)
 def after_order_create(sender, **kwargs):
     print(f'New order created successfully! {kwargs["order"].id}')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_identity_on_user_change(sender, instance, **kwargs):
+    invalidate_identity(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_identity_on_customer_change(sender, instance, **kwargs):
+    invalidate_identity(instance.user_id)
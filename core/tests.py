@@ -1,3 +1,72 @@
+import pickle
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from store.instrumentation import record_queries
+from store.models import Order
+from .authentication import CachedJWTAuthentication, identity_cache_key
+
+# SQL that resolves who the request is: the user, its revoked tokens, its customer by user id.
+IDENTITY_SQL = ('"core_customuser"', '"core_revokedtoken"', '"store_customer"."user_id" =')
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='customer', email='customer@store.local',
+                                                        password='customer-password')
+        Order.objects.create(customer=cls.user.customer)
+
+    def setUp(self):
+        cache.clear()
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {self.refresh.access_token}')
+
+    def test_cached_identity_needs_no_identity_queries(self):
+        self.client.get(reverse('order-list'))
+        for name in ('order-list', 'customer-me'):
+            with self.subTest(route=name), record_queries() as recorder:
+                response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200, response.content)
+            identity_queries = [query.sql for query in recorder.queries
+                                if any(sql in query.sql for sql in IDENTITY_SQL)]
+            self.assertEqual(identity_queries, [], recorder.report())
+        self.assertEqual(len(self.client.get(reverse('order-list')).data['results']), 1)
+
+    def test_user_save_invalidates_cached_identity(self):
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, 401)
+
+    def test_revoked_tokens_are_refused(self):
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('jwt-revoke'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 204, response.content)
+
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, 401)
+        response = APIClient().post(reverse('jwt-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+        other = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {other.access_token}')
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, 200)
+
+    def test_cached_identity_leaves_out_the_password(self):
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(self.refresh.access_token)
+        cached = pickle.dumps(cache.get(identity_cache_key(self.user.pk)))
+        self.assertNotIn(self.user.password.encode(), cached)
 
-# Create your tests here.
+        user = authentication.get_user(self.refresh.access_token)
+        self.assertEqual((user.pk, user.is_staff, user.customer_id), (self.user.pk, False, self.user.customer.pk))
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertEqual(user.username, 'customer')
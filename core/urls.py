@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('jwt/revoke/', views.RevokeTokenView.as_view(), name='jwt-revoke'),
+]
@@ -1,3 +1,20 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .serializers import RevokeTokenSerializer
+
+
+class RevokeTokenView(APIView):
+    """
+    Revokes the JWT the request is authenticated with and the `refresh` token in the body, if any:
+    both are refused from now until they expire.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = RevokeTokenSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(status=status.HTTP_204_NO_CONTENT)
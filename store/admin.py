@@ -1,10 +1,13 @@
 from django.contrib import admin, messages
-from django.db.models import Count
+from django.db.models.functions import Now
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.http import urlencode
 
 from . import models
+from .analytics import rebuild_customer_stats, sync_order_sales, withdraw_order_sales
+from .pagination import EstimatedCountPaginator
 
 
 class InventoryFilter(admin.SimpleListFilter):
@@ -36,6 +39,8 @@ class ProductAdmin(admin.ModelAdmin):
     list_per_page = 10
     list_editable = ['unit_price']
     list_select_related = ['category']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_filter = ['datetime_created', InventoryFilter]
     actions = ['clear_inventory']
     search_fields = ['name', ]
@@ -43,13 +48,6 @@ class ProductAdmin(admin.ModelAdmin):
         'slug': ['name', ]
     }
 
-    def get_queryset(self, request):
-        return super().get_queryset(request) \
-            .prefetch_related('comments') \
-            .annotate(
-            comments_count=Count('comments'),
-        )
-
     def inventory_status(self, product):
         if product.inventory < 10:
             return 'Low'
@@ -57,16 +55,17 @@ class ProductAdmin(admin.ModelAdmin):
             return 'High'
         return 'Medium'
 
-    @admin.display(description='# comments', ordering='comments_count')
+    @admin.display(description='# approved comments', ordering='approved_comments_count')
     def num_of_comments(self, product):
         url = (
                 reverse('admin:store_comment_changelist')
                 + '?'
                 + urlencode({
             'product__id': product.id,
+            'status__exact': models.Comment.COMMENT_STATUS_APPROVED,
         })
         )
-        return format_html('<a href="{}">{}</a>', url, product.comments_count)
+        return format_html('<a href="{}">{}</a>', url, product.approved_comments_count)
 
     @admin.display(ordering='category__title')
     def product_category(self, product):
@@ -74,7 +73,8 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description='Clear inventory')
     def clear_inventory(self, request, queryset):
-        update_count = queryset.update(inventory=0)
+        # QuerySet.update() skips auto_now: conditional GETs would keep validating the old inventory.
+        update_count = queryset.update(inventory=0, datetime_modified=Now())
         self.message_user(
             request,
             f'{update_count} of products inventories cleared to zero.',
@@ -86,7 +86,11 @@ class ProductAdmin(admin.ModelAdmin):
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['id', 'product', 'status', ]
     list_editable = ['status']
+    list_filter = ['status']
     list_per_page = 10
+    list_select_related = ['product']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     autocomplete_fields = ['product', ]
 
 
@@ -99,19 +103,24 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(models.Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'customer', 'status', 'datetime_created', 'num_of_items']
+    list_display = ['id', 'customer', 'status', 'datetime_created', 'num_of_items', 'total_amount']
     list_editable = ['status']
     list_per_page = 10
+    list_select_related = ['customer__user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     ordering = ['-datetime_created']
+    readonly_fields = ['items_count', 'total_amount']
     inlines = [OrderItemInline]
 
-    def get_queryset(self, request):
-        return super() \
-            .get_queryset(request) \
-            .prefetch_related('items') \
-            .annotate(
-            items_count=Count('items')
-        )
+    def save_related(self, request, form, formsets, change):
+        # The sales rollups count the items, which the inlines may change; they are counted again once saved.
+        withdraw_order_sales([form.instance.pk])
+        super().save_related(request, form, formsets, change)
+        sync_order_sales([form.instance.pk])
+        form.instance.recalculate_totals()
+        # The items changed the order total, which the customer's paid total may include.
+        rebuild_customer_stats(models.Customer.objects.filter(pk=form.instance.customer_id))
 
     @admin.display(ordering='items_count', description='# items')
     def num_of_items(self, order):
@@ -123,14 +132,18 @@ admin.site.register(models.Category)
 
 @admin.register(models.Customer)
 class CustomerAdmin(admin.ModelAdmin):
-    list_display = ['first_name', 'last_name', 'email', ]
+    list_display = ['first_name', 'last_name', 'email', 'orders_count', 'paid_total', 'last_order_at']
     list_per_page = 10
+    list_select_related = ['user']
+    list_filter = ['last_order_at']
     ordering = ['user__last_name', 'user__first_name', ]
     search_fields = ['user__first_name__istartswith', 'user__last_name__istartswith', ]
 
+    @admin.display(ordering='user__first_name')
     def first_name(self, customer):
         return customer.user.first_name
 
+    @admin.display(ordering='user__last_name')
     def last_name(self, customer):
         return customer.user.last_name
 
@@ -143,6 +156,34 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product', 'quantity', 'unit_price']
     autocomplete_fields = ['product', ]
 
+    def save_model(self, request, obj, form, change):
+        order_ids = {obj.order_id}
+        if change and 'order' in form.changed_data:
+            order_ids.add(form.initial['order'])
+        # The sales rollups count the items of an order; they are counted again once the item is saved.
+        withdraw_order_sales(order_ids)
+        super().save_model(request, obj, form, change)
+        self.update_orders(order_ids)
+
+    def delete_model(self, request, obj):
+        withdraw_order_sales([obj.order_id])
+        super().delete_model(request, obj)
+        self.update_orders([obj.order_id])
+
+    def delete_queryset(self, request, queryset):
+        order_ids = list(queryset.values_list('order_id', flat=True).distinct())
+        withdraw_order_sales(order_ids)
+        super().delete_queryset(request, queryset)
+        self.update_orders(order_ids)
+
+    @staticmethod
+    def update_orders(order_ids):
+        """Recompute what the items of the orders add up to: their sales, totals and their customers' stats."""
+        sync_order_sales(order_ids)
+        orders = models.Order.objects.filter(pk__in=order_ids)
+        orders.recalculate_totals()
+        rebuild_customer_stats(models.Customer.objects.filter(pk__in=orders.values('customer_id')))
+
 
 class CartItemInline(admin.TabularInline):
     model = models.CartItem
@@ -153,5 +194,19 @@ class CartItemInline(admin.TabularInline):
 
 @admin.register(models.Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['id', 'created_at']
+    list_display = ['id', 'created_at', 'last_activity']
     inlines = [CartItemInline]
+
+
+@admin.register(models.Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'receiver', 'status', 'attempts', 'run_after', 'datetime_created']
+    list_filter = ['status', 'receiver']
+    list_per_page = 10
+    readonly_fields = ['signal', 'sender', 'receiver', 'payload', 'attempts', 'last_error', 'datetime_created']
+    actions = ['retry_now']
+
+    @admin.action(description='Retry now')
+    def retry_now(self, request, queryset):
+        update_count = queryset.update(status=models.Job.STATUS_PENDING, attempts=0, run_after=timezone.now())
+        self.message_user(request, f'{update_count} jobs scheduled to run again.', messages.SUCCESS)
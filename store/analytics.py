@@ -0,0 +1,220 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Customer, DailyCategorySales, DailyProductSales, OrderItem, Order, OrderSales
+
+GROUP_BY_DAY = 'day'
+GROUP_BY_PRODUCT = 'product'
+GROUP_BY_CATEGORY = 'category'
+
+
+def _rollup_rows(date, lines):
+    """
+    Fold `(status, product_id, category_id, units, revenue)` lines of one day into the rows of
+    DailyProductSales and DailyCategorySales.
+    """
+    products = defaultdict(lambda: [0, Decimal(0)])
+    categories = defaultdict(lambda: [0, Decimal(0)])
+    for status, product_id, category_id, units, revenue in lines:
+        for totals in (products[status, product_id], categories[status, category_id]):
+            totals[0] += units
+            totals[1] += revenue
+    product_rows = [
+        {'date': date, 'status': status, 'product_id': product_id, 'units': units, 'revenue': revenue}
+        for (status, product_id), (units, revenue) in products.items()
+    ]
+    category_rows = [
+        {'date': date, 'status': status, 'category_id': category_id, 'units': units, 'revenue': revenue}
+        for (status, category_id), (units, revenue) in categories.items()
+    ]
+    return product_rows, category_rows
+
+
+def apply_order_sales(deltas, counted_categories=None):
+    """
+    Add the items of each order of `deltas` to the rollups of its day once per `(status, sign)` in
+    `deltas[order]`, e.g. `{order: [(old_status, -1), (new_status, 1)]}` moves them from one status
+    to another. Items are taken out (sign -1) of the category `counted_categories[order.pk]` recorded
+    for their product when they were counted, if any, and added to their product's current category.
+    One read of the items and one upsert per rollup, whatever the number of orders.
+
+    Returns the current categories of the products of each order, to record as OrderSales.categories.
+    """
+    counted_categories = counted_categories or {}
+    orders = {order.pk: order for order in deltas}
+    items = (
+        OrderItem.objects
+        .filter(order_id__in=orders)
+        .values_list('order_id', 'product_id', 'product__category_id', 'quantity', 'unit_price')
+    )
+    categories = defaultdict(dict)
+    lines_by_date = defaultdict(list)
+    for order_id, product_id, category_id, quantity, unit_price in items:
+        order = orders[order_id]
+        categories[order_id][str(product_id)] = category_id
+        counted_category_id = counted_categories.get(order_id, {}).get(str(product_id), category_id)
+        lines_by_date[timezone.localdate(order.datetime_created)] += [
+            (status, product_id, counted_category_id if sign < 0 else category_id,
+             sign * quantity, sign * quantity * unit_price)
+            for status, sign in deltas[order]
+        ]
+    product_rows = []
+    category_rows = []
+    for date, lines in lines_by_date.items():
+        rows = _rollup_rows(date, lines)
+        product_rows += rows[0]
+        category_rows += rows[1]
+    with transaction.atomic():
+        DailyProductSales.objects.add_sales(product_rows)
+        DailyCategorySales.objects.add_sales(category_rows)
+    return categories
+
+
+def sync_order_sales(order_ids):
+    """
+    Count the items of the orders in the rollups under their current status, moving them from the
+    status they were counted under, if any. The order rows are locked while OrderSales is compared and
+    written, so callers racing on one order, e.g. the deferred order_create job and a status change,
+    apply each change once whatever order they run in.
+    """
+    with transaction.atomic():
+        orders = Order.objects.select_for_update().in_bulk(order_ids)
+        counted = OrderSales.objects.filter(order_id__in=orders).in_bulk()
+        counted_statuses = {order_id: sales.status for order_id, sales in counted.items()}
+        deltas = {
+            order: [(order.status, 1)] if order.pk not in counted_statuses
+            else [(counted_statuses[order.pk], -1), (order.status, 1)]
+            for order in orders.values()
+            if counted_statuses.get(order.pk) != order.status
+        }
+        if not deltas:
+            return
+        categories = apply_order_sales(deltas, {order_id: sales.categories for order_id, sales in counted.items()})
+        OrderSales.objects.filter(order__in=deltas).delete()
+        OrderSales.objects.bulk_create(
+            OrderSales(order=order, status=order.status, categories=categories[order.pk]) for order in deltas
+        )
+
+
+def withdraw_order_sales(order_ids):
+    """
+    Take the items of the orders out of the rollups, e.g. before their items are edited; call
+    sync_order_sales once the edit is saved to count them again.
+    """
+    with transaction.atomic():
+        orders = Order.objects.select_for_update().in_bulk(order_ids)
+        counted = OrderSales.objects.filter(order_id__in=orders).in_bulk()
+        deltas = {orders[order_id]: [(sales.status, -1)] for order_id, sales in counted.items()}
+        if not deltas:
+            return
+        apply_order_sales(deltas, {order_id: sales.categories for order_id, sales in counted.items()})
+        OrderSales.objects.filter(order__in=deltas).delete()
+
+
+def _start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def rebuild_sales_rollups(start=None, end=None, days_per_batch=31):
+    """
+    Recompute the rollups of the days in [start, end] from the order items, `days_per_batch` days per
+    transaction. Without bounds, every day between the first and the last order is rebuilt.
+    Returns the number of days rebuilt.
+    """
+    if start is None or end is None:
+        bounds = Order.objects.aggregate(first=Min('datetime_created'), last=Max('datetime_created'))
+        if bounds['first'] is None:
+            return 0
+        start = start or timezone.localdate(bounds['first'])
+        end = end or timezone.localdate(bounds['last'])
+
+    day = start
+    while day <= end:
+        batch_end = min(day + timedelta(days=days_per_batch - 1), end)
+        with transaction.atomic():
+            DailyProductSales.objects.filter(date__range=(day, batch_end)).delete()
+            DailyCategorySales.objects.filter(date__range=(day, batch_end)).delete()
+            lines_by_date = defaultdict(list)
+            aggregates = (
+                OrderItem.objects
+                .filter(order__datetime_created__gte=_start_of_day(day),
+                        order__datetime_created__lt=_start_of_day(batch_end + timedelta(days=1)))
+                .annotate(date=TruncDate('order__datetime_created'))
+                .values_list('date', 'order__status', 'product_id', 'product__category_id')
+                .annotate(units=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price')))
+                .order_by()
+            )
+            for date, status, product_id, category_id, units, revenue in aggregates:
+                lines_by_date[date].append((status, product_id, category_id, units, revenue))
+            for date, lines in lines_by_date.items():
+                product_rows, category_rows = _rollup_rows(date, lines)
+                DailyProductSales.objects.bulk_create([DailyProductSales(**row) for row in product_rows])
+                DailyCategorySales.objects.bulk_create([DailyCategorySales(**row) for row in category_rows])
+            orders = Order.objects.filter(datetime_created__gte=_start_of_day(day),
+                                          datetime_created__lt=_start_of_day(batch_end + timedelta(days=1)))
+            categories = defaultdict(dict)
+            items = OrderItem.objects.filter(order__in=orders).values_list('order_id', 'product_id', 'product__category_id')
+            for order_id, product_id, category_id in items:
+                categories[order_id][str(product_id)] = category_id
+            OrderSales.objects.filter(order__in=orders).delete()
+            OrderSales.objects.bulk_create(
+                OrderSales(order_id=order_id, status=status, categories=categories[order_id])
+                for order_id, status in orders.values_list('pk', 'status')
+            )
+        day = batch_end + timedelta(days=1)
+    return (end - start).days + 1
+
+
+def rebuild_customer_stats(customers):
+    """Recompute the stored lifetime stats of the `customers` queryset from their orders, in one UPDATE."""
+    orders = Order.objects.filter(customer_id=OuterRef('pk')).order_by().values('customer_id')
+    paid_orders = orders.filter(status=Order.ORDER_STATUS_PAID)
+    return customers.update(
+        orders_count=Coalesce(Subquery(orders.annotate(count=Count('id')).values('count')), 0),
+        paid_total=Coalesce(
+            Subquery(paid_orders.annotate(total=Sum('total_amount')).values('total')),
+            Decimal(0),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        last_order_at=Subquery(orders.annotate(last=Max('datetime_created')).values('last')),
+    )
+
+
+def sales_report(start, end, statuses, group_by=GROUP_BY_DAY, limit=100):
+    """
+    Units and revenue of the orders in `statuses` between `start` and `end` (inclusive), read from the
+    rollups only: per day, or the top `limit` products or categories by revenue.
+    """
+    totals = {'units': Sum('units'), 'revenue': Sum('revenue')}
+    if group_by == GROUP_BY_PRODUCT:
+        rows = (
+            DailyProductSales.objects
+            .filter(date__range=(start, end), status__in=statuses)
+            .values('product_id', product_name=F('product__name'))
+            .annotate(**totals)
+            .order_by('-revenue', 'product_id')[:limit]
+        )
+    elif group_by == GROUP_BY_CATEGORY:
+        rows = (
+            DailyCategorySales.objects
+            .filter(date__range=(start, end), status__in=statuses)
+            .values('category_id', category_title=F('category__title'))
+            .annotate(**totals)
+            .order_by('-revenue', 'category_id')[:limit]
+        )
+    else:
+        # Every sold product belongs to exactly one category, so the category rollup is the smaller one to sum.
+        rows = (
+            DailyCategorySales.objects
+            .filter(date__range=(start, end), status__in=statuses)
+            .values('date')
+            .annotate(**totals)
+            .order_by('date')
+        )
+    return list(rows)
@@ -6,4 +6,5 @@ class StoreConfig(AppConfig):
     name = 'store'
 
     def ready(self) -> None:
+        import store.checks
         import store.signals.handelers
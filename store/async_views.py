@@ -0,0 +1,153 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIHandler
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern
+from django.utils.decorators import classonlymethod
+from django.views import View
+from rest_framework.response import Response
+
+
+class AsyncReadMixin:
+    """
+    Async counterparts of the list and retrieve actions of a generic viewset, run by AsyncViewSetView.
+    They build the same querysets, serializers and responses as the sync actions; only the queries
+    are awaited through the async ORM.
+    """
+
+    def can_read_async(self, request):
+        """Return False for requests that need the sync action, e.g. filters that query while they filter."""
+        return True
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        if hasattr(self.paginator, 'apaginate_queryset'):
+            return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+        return await sync_to_async(self.paginator.paginate_queryset)(queryset, self.request, view=self)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(await self.aget_serializer_data(serializer))
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(await self.aget_serializer_data(serializer))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(await self.aget_serializer_data(serializer))
+
+    @staticmethod
+    async def aget_serializer_data(serializer):
+        """`serializer.data`, once what the serializer preloads for its rows (e.g. prices) is fetched."""
+        if hasattr(serializer, 'aload'):
+            await serializer.aload()
+        return serializer.data
+
+
+class AsyncViewSetView(View):
+    """
+    Serves the GET/HEAD requests of one viewset route with the viewset's async actions (`alist`,
+    `aretrieve`) without leaving the event loop. Requests the async path cannot answer the same way
+    are handed to the regular sync view:
+
+    - other methods (writes, OPTIONS),
+    - requests with credentials, whose authentication queries the database,
+    - formats other than JSON (the browsable API renders forms from querysets),
+    - requests the viewset's `can_read_async()` turns down.
+    """
+    sync_view = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Like every DRF view; csrf_exempt() itself would hide that the view is a coroutine function.
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD') and 'HTTP_AUTHORIZATION' not in request.META:
+            return await self.get(request, *args, **kwargs)
+        return await self.delegate(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        response = await self.read(request, *args, **kwargs)
+        if response is None:
+            response = await self.delegate(request, *args, **kwargs)
+        return response
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    async def read(self, request, *args, **kwargs):
+        """Run the async action the way APIView.dispatch runs the sync one, or return None to delegate."""
+        viewset = self.sync_view.cls(**self.sync_view.initkwargs)
+        viewset.action_map = {'head': self.sync_view.actions['get'], **self.sync_view.actions}
+        for method, action in viewset.action_map.items():
+            setattr(viewset, method, getattr(viewset, action))
+        viewset.args = args
+        viewset.kwargs = kwargs
+        drf_request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.action = viewset.action_map['get']
+        viewset.request = drf_request
+        viewset.headers = viewset.default_response_headers
+
+        try:
+            viewset.initial(drf_request, *args, **kwargs)
+            if drf_request.accepted_renderer.format != 'json' or not viewset.can_read_async(drf_request):
+                return None
+            response = await getattr(viewset, f'a{viewset.action}')(drf_request, *args, **kwargs)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+
+        response = viewset.finalize_response(drf_request, response, *args, **kwargs)
+        if not isinstance(response, Response):
+            return response
+        response.render()
+        # A plain response, so the handler has nothing left to render on a worker thread.
+        return HttpResponse(response.content, status=response.status_code, headers=dict(response.items()))
+
+
+def with_async_reads(patterns, names):
+    """
+    Return the router `patterns` with the routes named in `names` served by AsyncViewSetView; the
+    regexes, names and format suffixes stay exactly those of the router.
+    """
+    return [
+        URLPattern(pattern.pattern, AsyncViewSetView.as_view(sync_view=pattern.callback), pattern.default_args,
+                   pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in names else pattern
+        for pattern in patterns
+    ]
+
+
+class AsyncReadsASGIHandler(ASGIHandler):
+    """
+    Resolves requests with `urlconf`, by default `STORE_ASGI_URLCONF`, the URLconf whose catalog reads
+    are AsyncViewSetViews. Without one, requests are resolved with ROOT_URLCONF like under WSGI, where
+    the async views would only add an event loop to every request.
+    """
+
+    def __init__(self, urlconf=None):
+        super().__init__()
+        self.urlconf = urlconf or getattr(settings, 'STORE_ASGI_URLCONF', None)
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None and self.urlconf:
+            request.urlconf = self.urlconf
+        return request, error_response
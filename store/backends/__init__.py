@@ -0,0 +1,4 @@
+"""
+Database backends with connection pooling (store.pool): set ENGINE to `store.backends.mysql` or
+`store.backends.sqlite3` and `OPTIONS['pool']` to True or a dict of store.pool.DEFAULT_POOL_OPTIONS.
+"""
@@ -0,0 +1,13 @@
+from django.db.backends.mysql import base
+
+from store.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    @staticmethod
+    def check_pooled_connection(connection):
+        try:
+            connection.ping()
+        except base.Database.Error:
+            return False
+        return True
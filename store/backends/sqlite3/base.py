@@ -0,0 +1,13 @@
+from django.db.backends.sqlite3 import base
+
+from store.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    @staticmethod
+    def check_pooled_connection(connection):
+        try:
+            connection.execute('SELECT 1').close()
+        except base.Database.Error:
+            return False
+        return True
@@ -0,0 +1,102 @@
+import time
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .replicas import cache_timeout
+
+CART_CACHE_TIMEOUT = getattr(settings, 'STORE_CART_CACHE_TIMEOUT', 300)
+
+# Cart payloads embed the name and unit price of their products; changing them invalidates every payload.
+CART_PRODUCTS_GENERATION_KEY = 'store:generation:cart-products'
+
+
+def cart_cache_key(cart_id):
+    """Normalize `cart_id` so every spelling of the same UUID shares one key. Malformed ids give None."""
+    try:
+        return f'store:cart:{UUID(str(cart_id))}'
+    except ValueError:
+        return None
+
+
+def cart_generation_keys(key):
+    return [f'{key}:generation', CART_PRODUCTS_GENERATION_KEY]
+
+
+def mint_generation(generation_key, timeout):
+    """A new generation, unless another reader minted one first."""
+    generation = time.time_ns()
+    if cache.add(generation_key, generation, timeout):
+        return generation
+    return cache.get(generation_key, generation)
+
+
+async def amint_generation(generation_key, timeout):
+    generation = time.time_ns()
+    if await cache.aadd(generation_key, generation, timeout):
+        return generation
+    return await cache.aget(generation_key, generation)
+
+
+def generation_timeout(generation_key):
+    # A cart's generation may expire with its payloads: a new one is minted and the cart read again.
+    return None if generation_key == CART_PRODUCTS_GENERATION_KEY else CART_CACHE_TIMEOUT
+
+
+def get_cached_cart(cart_id):
+    """
+    The cached payload of the cart or None, and the key to cache it under once it is read.
+
+    Payloads are keyed on the generations of their cart and of the cart products, read before the cart
+    is. Writers move a generation on once they commit, so a payload read from the database before that
+    ends up under a key no reader asks for any more.
+    """
+    key = cart_cache_key(cart_id)
+    if key is None:
+        return None, None
+    generation_keys = cart_generation_keys(key)
+    generations = cache.get_many(generation_keys)
+    key = ':'.join([key] + [
+        str(generations.get(generation_key) or mint_generation(generation_key, generation_timeout(generation_key)))
+        for generation_key in generation_keys
+    ])
+    return cache.get(key), key
+
+
+async def aget_cached_cart(cart_id):
+    key = cart_cache_key(cart_id)
+    if key is None:
+        return None, None
+    generation_keys = cart_generation_keys(key)
+    generations = await cache.aget_many(generation_keys)
+    key = ':'.join([key] + [
+        str(generations.get(generation_key)
+            or await amint_generation(generation_key, generation_timeout(generation_key)))
+        for generation_key in generation_keys
+    ])
+    return await cache.aget(key), key
+
+
+def cache_cart(key, data):
+    cache.add(key, data, cache_timeout(CART_CACHE_TIMEOUT))
+
+
+async def acache_cart(key, data):
+    await cache.aadd(key, data, cache_timeout(CART_CACHE_TIMEOUT))
+
+
+def invalidate_carts(cart_ids):
+    """Move the generations of `cart_ids` on once the current transaction commits."""
+    keys = [f'{key}:generation' for key in map(cart_cache_key, cart_ids) if key]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, time.time_ns()), CART_CACHE_TIMEOUT))
+
+
+def invalidate_cart_products():
+    """
+    Move the generation of the cart products on once the current transaction commits: after a change to
+    the name or price of products, whichever carts hold them.
+    """
+    transaction.on_commit(lambda: cache.set(CART_PRODUCTS_GENERATION_KEY, time.time_ns(), None))
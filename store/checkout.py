@@ -0,0 +1,98 @@
+from django.db import connections, transaction
+from rest_framework import serializers
+
+from .cache import invalidate_carts
+from .models import Cart, CartItem, Customer, Order, OrderItem
+from .pricing import compute_prices, get_discount_rates
+from .signals import order_create
+
+
+class CheckoutPipeline:
+    """
+    Turns a cart into an order inside one transaction, with a fixed number of statements
+    whatever the cart size:
+
+    1. lock_cart_items: one SELECT ... FOR UPDATE that reads the items with their product prices,
+       doubling as the existence/emptiness check of the cart.
+    2. apply_discounts: one query for the discounts of the cart's products. Items are charged their
+       discounted price, read from the database rather than the price cache.
+    3. resolve_customer_id: the customer of the requesting user, unless the caller knows it (see
+       core.authentication.get_customer_id).
+    4. create_order / create_order_items: one INSERT for the order, with its stored totals, and one bulk
+       INSERT for its items. The order's post_save handler adds one UPDATE of the customer's stats.
+    5. delete_cart: the cart row is read, then its items and the cart are deleted with one DELETE each.
+    6. enqueue_side_effects: one INSERT of an outbox job per `order_create` receiver; they run after
+       the commit, on the job workers.
+    """
+
+    def __init__(self, cart_id, user_id, customer_id=None):
+        self.cart_id = cart_id
+        self.user_id = user_id
+        self.customer_id = customer_id
+
+    def run(self):
+        with transaction.atomic():
+            cart_items = self.apply_discounts(self.lock_cart_items())
+            customer_id = self.resolve_customer_id()
+            order = self.create_order(customer_id, cart_items)
+            self.create_order_items(order, cart_items)
+            self.delete_cart()
+            self.enqueue_side_effects(order)
+        return order
+
+    def lock_cart_items(self):
+        connection = connections[CartItem.objects.db]
+        # Only lock the cart rows; products stay free for concurrent checkouts.
+        of = ('self',) if connection.features.has_select_for_update_of else ()
+        cart_items = list(
+            CartItem.objects
+            .select_for_update(of=of)
+            .filter(cart_id=self.cart_id)
+            .values_list('product_id', 'quantity', 'product__unit_price')
+        )
+        if not cart_items:
+            if Cart.objects.filter(pk=self.cart_id).exists():
+                raise serializers.ValidationError({'cart_id': ['Your cart is empty']})
+            raise serializers.ValidationError({'cart_id': ['There is no cart with this cart id']})
+        return cart_items
+
+    @staticmethod
+    def apply_discounts(cart_items):
+        unit_prices = {product_id: unit_price for product_id, _, unit_price in cart_items}
+        prices = compute_prices(unit_prices, get_discount_rates(list(unit_prices)))
+        return [
+            (product_id, quantity, prices[product_id].discounted_price)
+            for product_id, quantity, _ in cart_items
+        ]
+
+    def resolve_customer_id(self):
+        if self.customer_id is not None:
+            return self.customer_id
+        return Customer.objects.values_list('pk', flat=True).get(user_id=self.user_id)
+
+    def create_order(self, customer_id, cart_items):
+        # The totals are frozen with the order, from the same prices its items are created with.
+        return Order.objects.create(
+            customer_id=customer_id,
+            total_amount=sum(quantity * unit_price for _, quantity, unit_price in cart_items),
+            items_count=len(cart_items),
+        )
+
+    def create_order_items(self, order, cart_items):
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=product_id,
+                quantity=quantity,
+                unit_price=unit_price,
+            ) for product_id, quantity, unit_price in cart_items
+        ])
+
+    def delete_cart(self):
+        # CartItem has no signals and nothing cascades from it, so the collector deletes the items with one
+        # DELETE instead of loading them.
+        Cart.objects.filter(pk=self.cart_id).delete()
+        invalidate_carts([self.cart_id])
+
+    def enqueue_side_effects(self, order):
+        order_create.send_deferred(self.__class__, order=order)
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Cache backends whose entries live in the memory of each process.
+PROCESS_LOCAL_CACHE_BACKENDS = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """The store's cached entries are invalidated by the process that writes; the others must see it."""
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    return [Error(
+        f'The default cache ({backend}) is local to each process.',
+        hint='Cart, price and identity invalidations and conditional GET generations would only reach the '
+             'process that made them. Configure a cache shared by every worker process in CACHES, e.g. '
+             'RedisCache or PyMemcacheCache.',
+        id='store.E001',
+    )]
@@ -0,0 +1,388 @@
+from types import SimpleNamespace
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.db import models
+from django.http import Http404
+from django.urls import get_script_prefix, get_urlconf
+from rest_framework import relations, serializers
+
+# Stands in for the lookup value when a link field reverses its URL once per request.
+LOOKUP_PLACEHOLDER = 'compiled-lookup-placeholder'
+
+# Serializer fields whose to_representation() returns the value of these model fields unchanged.
+IDENTITY_FIELDS = [
+    (serializers.CharField, (models.CharField, models.TextField)),
+    (serializers.IntegerField, (models.IntegerField,)),
+]
+
+
+class Row(SimpleNamespace):
+    """One fetched row, with the model's attribute names, as method fields, cursors and permissions read it."""
+
+
+class RowList(list):
+    """The rows of a reverse relation; `all()` keeps `obj.items.all()` working in method fields."""
+
+    def all(self):
+        return self
+
+
+def is_rows(instance):
+    return isinstance(instance, Row) or (isinstance(instance, list) and all(isinstance(i, Row) for i in instance))
+
+
+class CompiledSerializer:
+    """
+    The read side of a ModelSerializer, compiled into flat functions.
+
+    The serializer's readable fields are resolved once into the columns they need, so a queryset is
+    fetched with one `.values_list()` (plus one per nested `many=True` relation) and each row is
+    rendered by a generated function: no field objects, `get_attribute()` walks or `reverse()` per
+    row. The output is the same as `serializer.data`, down to the JSON bytes.
+
+    Supported fields: model fields (also through to-one relations, e.g. `source='user.email'`),
+    SerializerMethodField, PrimaryKeyRelatedField, HyperlinkedRelatedField and nested serializers,
+    single or `many=True` over a reverse foreign key. Method fields get a Row and may read the
+    attributes the other fields fetch; `obj.relation.all()` works for the nested `many=True` ones.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        serializer = serializer_class()
+        self.model = serializer.Meta.model
+        self.columns = {('pk',): 'pk'}
+        self.children = []
+        self.links = []
+        self.link_affixes = {}
+        self.builders = {}
+        self.factory, self.constants = self.compile_level(serializer, ())
+
+    # Compilation
+
+    def compile_level(self, serializer, path):
+        """Return the factory of the function rendering `serializer`, and the constants it takes."""
+        constants = {}
+        entries = []
+        for field in serializer._readable_fields:
+            if field.source == '*' and not isinstance(field, serializers.SerializerMethodField):
+                raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{field.field_name}: '
+                                           f"source='*' cannot be compiled.")
+            name = f'f{len(constants)}'
+            entries.append((field.field_name, self.compile_field(field, path, name, constants)))
+
+        body = ', '.join(f'{key!r}: {expression}' for key, expression in entries)
+        parameters = ', '.join(constants)
+        source = (f'def factory({parameters}):\n'
+                  f'    def represent(row):\n'
+                  f'        return {{{body}}}\n'
+                  f'    return represent\n')
+        namespace = {}
+        exec(compile(source, f'<compiled {type(serializer).__name__}>', 'exec'), namespace)
+        return namespace['factory'], constants
+
+    def compile_field(self, field, path, name, constants):
+        """Register what `field` needs and return the expression rendering it from `row`."""
+        if isinstance(field, serializers.SerializerMethodField):
+            constants[name] = ('method', field.method_name)
+            return f'{name}(row)'
+
+        attrs = tuple(field.source_attrs)
+        if isinstance(field, serializers.ListSerializer):
+            if path or len(attrs) != 1:
+                raise ImproperlyConfigured(f'{field.field_name}: only top-level reverse relations can be compiled.')
+            relation = self.model._meta.get_field(attrs[0])
+            if not relation.one_to_many:
+                raise ImproperlyConfigured(f'{field.field_name}: only reverse foreign keys can be compiled.')
+            child = compile_serializer(type(field.child))
+            self.children.append((attrs[0], relation.field.attname, child))
+            constants[name] = ('many', child)
+            return f'[{name}(item) for item in row.{attrs[0]}]'
+
+        if isinstance(field, serializers.BaseSerializer):
+            self.add_relation(path + attrs)
+            factory, nested_constants = self.compile_level(field, path + attrs)
+            constants[name] = ('nested', type(field), factory, nested_constants)
+            return self.guarded(attrs, f'{name}(value)')
+
+        if isinstance(field, relations.ManyRelatedField):
+            raise ImproperlyConfigured(f'{field.field_name}: many-to-many fields cannot be compiled.')
+
+        if isinstance(field, relations.RelatedField):
+            attrs = self.related_column(field, path, attrs)
+            if isinstance(field, relations.HyperlinkedRelatedField):
+                self.links.append(field)
+                constants[name] = ('link', len(self.links) - 1)
+                return self.guarded(attrs, f'{name}[0] + str(value) + {name}[1]')
+            if not isinstance(field, relations.PrimaryKeyRelatedField) or field.pk_field is not None:
+                raise ImproperlyConfigured(f'{field.field_name}: {type(field).__name__} cannot be compiled.')
+            return self.guarded(attrs, 'value')
+
+        self.add_relation(path + attrs[:-1])
+        self.add_column(path + attrs)
+        if self.is_identity(field, path + attrs):
+            return f'row.{".".join(attrs)}'
+        constants[name] = ('value', field.to_representation)
+        return self.guarded(attrs, f'{name}(value)')
+
+    def is_identity(self, field, path):
+        if isinstance(field, serializers.ReadOnlyField):
+            return True
+        model = self.model
+        for attr in path[:-1]:
+            model = model._meta.get_field(attr).related_model
+        try:
+            model_field = model._meta.get_field(path[-1])
+        except FieldDoesNotExist:
+            return False
+        return any(isinstance(field, field_class) and isinstance(model_field, model_fields)
+                   for field_class, model_fields in IDENTITY_FIELDS)
+
+    @staticmethod
+    def guarded(attrs, expression):
+        # Like Serializer.to_representation(), a None attribute is rendered as None without its field.
+        return f'(None if (value := row.{".".join(attrs)}) is None else {expression})'
+
+    def related_column(self, field, path, attrs):
+        """Fetch a to-one relation by its key, e.g. `category_id` for `category` linked by pk."""
+        *relation, last = attrs
+        self.add_relation(path + tuple(relation))
+        model = self.model
+        for attr in path + tuple(relation):
+            model = model._meta.get_field(attr).related_model
+        model_field = model._meta.get_field(last)
+        lookup_field = getattr(field, 'lookup_field', 'pk')
+        if lookup_field == 'pk' and model_field.many_to_one:
+            attrs = (*relation, model_field.attname)
+        else:
+            attrs = (*relation, last, lookup_field)
+            self.add_relation(path + attrs[:-1])
+        self.add_column(path + attrs)
+        return attrs
+
+    def add_relation(self, path):
+        for i in range(1, len(path) + 1):
+            self.add_column(path[:i] + ('pk',))
+
+    def add_column(self, path):
+        self.columns.setdefault(path, '__'.join(path))
+
+    # Fetching
+
+    def get_builder(self, extra):
+        """Return the lookups to fetch and the function turning their tuples into Rows."""
+        if extra not in self.builders:
+            columns = dict(self.columns)
+            for lookup in extra:
+                columns.setdefault(tuple(lookup.split('__')), lookup)
+            tree = {}
+            for i, path in enumerate(columns):
+                node = tree
+                for attr in path[:-1]:
+                    node = node.setdefault(attr, {})
+                node[path[-1]] = i
+
+            def expression(node):
+                items = ', '.join(f'{attr}={expression(value) if isinstance(value, dict) else f"t[{value}]"}'
+                                  for attr, value in node.items())
+                if node is tree:
+                    return f'Row({items})'
+                return f'(None if t[{node["pk"]}] is None else Row({items}))'
+
+            namespace = {'Row': Row}
+            exec(f'def build(t):\n    return {expression(tree)}\n', namespace)
+            self.builders[extra] = list(columns.values()), namespace['build']
+        return self.builders[extra]
+
+    def get_values_queryset(self, queryset, extra):
+        lookups, build = self.get_builder(tuple(extra))
+        return queryset.prefetch_related(None).values_list(*lookups), build
+
+    def get_children_queryset(self, fk_attname, child, rows):
+        return child.model._default_manager.filter(**{f'{fk_attname}__in': [row.pk for row in rows]})
+
+    def fetch(self, queryset, extra=()):
+        """Evaluate `queryset` into Rows; `extra` are further lookups to fetch, e.g. an ordering annotation."""
+        values, build = self.get_values_queryset(queryset, extra)
+        rows = [build(values_row) for values_row in values]
+        for attr, fk_attname, child in self.children if rows else ():
+            self.attach_children(rows, attr, fk_attname,
+                                 child.fetch(self.get_children_queryset(fk_attname, child, rows), (fk_attname,)))
+        return rows
+
+    async def afetch(self, queryset, extra=()):
+        values, build = self.get_values_queryset(queryset, extra)
+        rows = [build(values_row) async for values_row in values]
+        for attr, fk_attname, child in self.children if rows else ():
+            self.attach_children(rows, attr, fk_attname,
+                                 await child.afetch(self.get_children_queryset(fk_attname, child, rows), (fk_attname,)))
+        return rows
+
+    @staticmethod
+    def attach_children(rows, attr, fk_attname, children):
+        by_parent = {row.pk: RowList() for row in rows}
+        for child in children:
+            by_parent[getattr(child, fk_attname)].append(child)
+        for row in rows:
+            setattr(row, attr, by_parent[row.pk])
+
+    # Rendering
+
+    def get_representer(self, context):
+        """Return the function rendering one Row, bound to `context` like a serializer instance would be."""
+        return self.bind_level(self.factory, self.constants, self.serializer_class(context=context), context)
+
+    def bind_level(self, factory, constants, serializer, context):
+        arguments = []
+        for constant in constants.values():
+            kind = constant[0]
+            if kind == 'method':
+                arguments.append(getattr(serializer, constant[1]))
+            elif kind == 'value':
+                arguments.append(constant[1])
+            elif kind == 'link':
+                arguments.append(self.get_link_affixes(constant[1], context))
+            elif kind == 'nested':
+                _, serializer_class, nested_factory, nested_constants = constant
+                arguments.append(self.bind_level(nested_factory, nested_constants,
+                                                 serializer_class(context=context), context))
+            else:
+                arguments.append(constant[1].get_representer(context))
+        return factory(*arguments)
+
+    def get_link_affixes(self, index, context):
+        """
+        The URL of a link field around its lookup value. Reversing is the same for every row of a request,
+        so the URL is reversed once, with a placeholder, and cached per host, script prefix and format.
+        """
+        field = self.links[index]
+        request = context['request']
+        format = context.get('format')
+        if format and field.format and field.format != format:
+            format = field.format
+        key = (index, request.scheme, request.get_host(), get_script_prefix(), get_urlconf(), format)
+        affixes = self.link_affixes.get(key)
+        if affixes is None:
+            url = field.get_url(SimpleNamespace(**{field.lookup_field: LOOKUP_PLACEHOLDER}), field.view_name,
+                                request, format)
+            prefix, _, suffix = url.rpartition(LOOKUP_PLACEHOLDER)
+            affixes = (prefix, suffix)
+            if len(self.link_affixes) > 100:
+                self.link_affixes.clear()
+            self.link_affixes[key] = affixes
+        return affixes
+
+    def bind(self, instance, many=False, context=None):
+        return CompiledData(self, instance, many, context or {})
+
+
+class CompiledData:
+    """
+    What a compiled serializer bound to Rows offers in place of a serializer instance: `.data`. Like
+    PreloadListSerializer, it runs the serializer's `preload()` on all rows first, if it has one.
+    """
+
+    def __init__(self, compiled, instance, many, context):
+        self.compiled = compiled
+        self.instance = instance
+        self.many = many
+        self.context = context
+
+    @property
+    def rows(self):
+        return self.instance if self.many else [self.instance]
+
+    def preload(self):
+        serializer = self.compiled.serializer_class(context=self.context)
+        if hasattr(serializer, 'preload'):
+            serializer.preload(self.rows)
+
+    async def aload(self):
+        """Run the serializer's `apreload()` on the rows, for rendering from async views."""
+        serializer = self.compiled.serializer_class(context=self.context)
+        if hasattr(serializer, 'apreload'):
+            await serializer.apreload(self.rows)
+
+    @property
+    def data(self):
+        self.preload()
+        represent = self.compiled.get_representer(self.context)
+        if self.many:
+            return [represent(row) for row in self.instance]
+        return represent(self.instance)
+
+
+_compiled = {}
+
+
+def compile_serializer(serializer_class):
+    """Compile `serializer_class` once per process."""
+    compiled = _compiled.get(serializer_class)
+    if compiled is None:
+        compiled = _compiled[serializer_class] = CompiledSerializer(serializer_class)
+    return compiled
+
+
+class CompiledReadMixin:
+    """
+    Serves the actions in `compiled_actions` from rows rendered by the compiled form of the action's
+    serializer (see CompiledSerializer) instead of model instances and serializer fields. Only JSON
+    responses are compiled; the browsable API builds its forms from real instances.
+    """
+    compiled_actions = ('list', 'retrieve')
+
+    def get_compiled_serializer(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if self.action not in self.compiled_actions or renderer is None or renderer.format != 'json':
+            return None
+        return compile_serializer(self.get_serializer_class())
+
+    def fetch_rows(self, queryset, fields=()):
+        """Evaluate a page for the paginator, which reads its cursor from `fields` of the rows."""
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return list(queryset)
+        return compiled.fetch(queryset, fields)
+
+    async def afetch_rows(self, queryset, fields=()):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return [obj async for obj in queryset]
+        return await compiled.afetch(queryset, fields)
+
+    def get_object_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+
+    def get_object(self):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().get_object()
+        try:
+            rows = compiled.fetch(self.get_object_queryset())
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        return self.check_row(rows)
+
+    async def aget_object(self):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return await super().aget_object()
+        try:
+            rows = await compiled.afetch(self.get_object_queryset())
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        return self.check_row(rows)
+
+    def check_row(self, rows):
+        if not rows:
+            raise Http404
+        self.check_object_permissions(self.request, rows[0])
+        return rows[0]
+
+    def get_serializer(self, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        instance = args[0] if args else kwargs.get('instance')
+        if compiled is not None and is_rows(instance):
+            return compiled.bind(instance, kwargs.get('many', False), self.get_serializer_context())
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,139 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def generation_cache_key(model):
+    return f'store:generation:{model._meta.label_lower}'
+
+
+def get_generation(model):
+    """
+    A token that changes whenever a row of `model` is deleted. MAX(datetime_modified) cannot see
+    deletions, so list validators mix this in. It lives in the shared cache; if it is evicted a new
+    token is minted, which only costs clients one full response.
+    """
+    return cache.get_or_set(generation_cache_key(model), time.time_ns, None)
+
+
+async def aget_generation(model):
+    return await cache.aget_or_set(generation_cache_key(model), time.time_ns, None)
+
+
+def bump_generation(model):
+    cache.set(generation_cache_key(model), time.time_ns(), None)
+
+
+class ConditionalGetMixin:
+    """
+    Answers conditional GETs with `304 Not Modified` before any serialization runs.
+
+    - retrieve: ETag and Last-Modified come from the object's `last_modified_field`.
+    - list: the ETag hashes MAX(`last_modified_field`) over the whole table, the deletion generation
+      of the model and the query parameters. The filtered rows alone would miss rows that changed
+      out of the filter, e.g. a product whose inventory went above `inventory__lt`.
+
+    Writers that bypass save(), such as QuerySet.update(), must set `last_modified_field` themselves.
+
+    `alist` and `aretrieve` are the same for the async read views (see store.async_views).
+    """
+    last_modified_field = 'datetime_modified'
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        last_modified = self.get_queryset().order_by().aggregate(
+            last_modified=Max(self.last_modified_field))['last_modified']
+        etag = self.get_list_etag(request, get_generation(queryset.model), last_modified)
+
+        not_modified = self.get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        else:
+            serializer = self.get_serializer(queryset, many=True)
+            response = Response(serializer.data)
+        response.headers['ETag'] = etag
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        aggregate = await self.get_queryset().order_by().aaggregate(last_modified=Max(self.last_modified_field))
+        etag = self.get_list_etag(request, await aget_generation(queryset.model), aggregate['last_modified'])
+
+        not_modified = self.get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = await super().alist(request, *args, **kwargs)
+        response.headers['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        last_modified = self.get_last_modified_queryset(kwargs).first()
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag, timestamp = self.get_object_validators(request, kwargs, last_modified)
+        not_modified = self.get_not_modified_response(request, etag, timestamp)
+        if not_modified is not None:
+            return not_modified
+
+        response = super().retrieve(request, *args, **kwargs)
+        return self.set_object_validators(response, etag, timestamp)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        last_modified = await self.get_last_modified_queryset(kwargs).afirst()
+        if last_modified is None:
+            return await super().aretrieve(request, *args, **kwargs)
+
+        etag, timestamp = self.get_object_validators(request, kwargs, last_modified)
+        not_modified = self.get_not_modified_response(request, etag, timestamp)
+        if not_modified is not None:
+            return not_modified
+
+        response = await super().aretrieve(request, *args, **kwargs)
+        return self.set_object_validators(response, etag, timestamp)
+
+    def get_last_modified_queryset(self, kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return (
+            self.get_queryset()
+            .filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+            .values_list(self.last_modified_field, flat=True)
+        )
+
+    def get_object_validators(self, request, kwargs, last_modified):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        etag = self.get_etag(request, kwargs[lookup_url_kwarg], last_modified.isoformat())
+        return etag, int(last_modified.timestamp())
+
+    @staticmethod
+    def set_object_validators(response, etag, timestamp):
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(timestamp)
+        return response
+
+    @staticmethod
+    def get_not_modified_response(request, etag, last_modified=None):
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified.headers['ETag'] = etag
+        return not_modified
+
+    def get_list_etag(self, request, generation, last_modified):
+        params = sorted(request.query_params.lists())
+        return self.get_etag(request, generation, last_modified.isoformat() if last_modified else '', params)
+
+    def get_etag(self, request, *parts):
+        # The representation also depends on the negotiated format (JSON vs. browsable API).
+        parts = (request.accepted_renderer.format, request.path, *parts)
+        return quote_etag(hashlib.md5(repr(parts).encode('utf-8')).hexdigest())
@@ -0,0 +1,118 @@
+from django.db import connections
+
+
+def bulk_upsert_increment(model, rows, unique_fields, increment_fields, using='default', batch_size=500,
+                          max_values=None, returning=None):
+    """
+    Insert `rows` (dicts keyed by column attname) into `model`'s table, and for rows that collide on
+    `unique_fields` add their `increment_fields` to the stored values instead, in one statement per batch:
+
+    - MySQL: INSERT ... ON DUPLICATE KEY UPDATE f = f + VALUES(f)
+    - SQLite/PostgreSQL: INSERT ... ON CONFLICT (...) DO UPDATE SET f = f + EXCLUDED.f
+
+    The increment happens inside the database, so concurrent upserts of the same key never lose updates.
+    Sums are capped at `max_values[f]` for the fields it has. With `returning` attnames, the statements
+    return those columns of the inserted and updated rows where the database supports it, as a list of
+    tuples; MySQL cannot and gets None, like calls without `returning`.
+    """
+    if not rows:
+        return [] if returning else None
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    columns = ', '.join(quote_name(field.column) for field in fields)
+    max_values = max_values or {}
+
+    def increment(name, stored, added):
+        total = f'{stored} + {added}'
+        if name not in max_values:
+            return total
+        least = 'MIN' if connection.vendor == 'sqlite' else 'LEAST'
+        return f'{least}({total}, {int(max_values[name])})'
+
+    if connection.vendor == 'mysql':
+        assignments = ', '.join(
+            f'{quote_name(column)} = {increment(name, quote_name(column), f"VALUES({quote_name(column)})")}'
+            for name, column in ((name, model._meta.get_field(name).column) for name in increment_fields)
+        )
+        conflict_clause = f'ON DUPLICATE KEY UPDATE {assignments}'
+    else:
+        target = ', '.join(quote_name(model._meta.get_field(name).column) for name in unique_fields)
+        assignments = ', '.join(
+            f'{quote_name(column)} = '
+            f'{increment(name, f"{table}.{quote_name(column)}", f"EXCLUDED.{quote_name(column)}")}'
+            for name, column in ((name, model._meta.get_field(name).column) for name in increment_fields)
+        )
+        conflict_clause = f'ON CONFLICT ({target}) DO UPDATE SET {assignments}'
+
+    returned = None
+    if returning and connection.vendor != 'mysql' and connection.features.can_return_rows_from_bulk_insert:
+        returned = []
+        conflict_clause += ' RETURNING ' + ', '.join(
+            quote_name(model._meta.get_field(name).column) for name in returning)
+
+    placeholder = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = [
+                field.get_db_prep_save(row[field.attname], connection)
+                for row in batch
+                for field in fields
+            ]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([placeholder] * len(batch))} {conflict_clause}',
+                params,
+            )
+            if returned is not None:
+                returned += cursor.fetchall()
+    return returned
+
+
+def bulk_update_rows(model, rows, fields, using='default', batch_size=500):
+    """
+    Set `fields` of the rows of `model` whose pk is in `rows` (dicts keyed by attname, with the pk) in
+    one statement per batch, joining the table to the new values:
+
+    - MySQL: UPDATE t JOIN (SELECT ... UNION ALL SELECT ...) v ON t.pk = v.pk SET t.f = v.f
+    - SQLite/PostgreSQL: UPDATE t SET f = v.columnN FROM (VALUES ...) v WHERE t.pk = v.column1
+
+    Unlike QuerySet.bulk_update(), which builds a CASE WHEN per field and row, the cost in Python stays
+    flat per row. No signals are sent and auto_now fields are not set.
+    """
+    if not rows:
+        return
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    pk = model._meta.pk
+    fields = [pk] + [model._meta.get_field(name) for name in fields]
+
+    if connection.vendor == 'mysql':
+        first_row = 'SELECT ' + ', '.join(f'%s AS {quote_name(field.column)}' for field in fields)
+        other_row = 'SELECT ' + ', '.join(['%s'] * len(fields))
+        join = f'{table}.{quote_name(pk.column)} = v.{quote_name(pk.column)}'
+        assignments = ', '.join(f'{table}.{quote_name(field.column)} = v.{quote_name(field.column)}'
+                                for field in fields[1:])
+
+        def statement(size):
+            values = ' UNION ALL '.join([first_row] + [other_row] * (size - 1))
+            return f'UPDATE {table} JOIN ({values}) AS v ON {join} SET {assignments}'
+    else:
+        placeholder = '(' + ', '.join(['%s'] * len(fields)) + ')'
+        assignments = ', '.join(f'{quote_name(field.column)} = v.column{i}' for i, field in enumerate(fields[1:], 2))
+
+        def statement(size):
+            return (f'UPDATE {table} SET {assignments} FROM (VALUES {", ".join([placeholder] * size)}) AS v '
+                    f'WHERE {table}.{quote_name(pk.column)} = v.column1')
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = [
+                field.get_db_prep_save(row[field.attname], connection)
+                for row in batch
+                for field in fields
+            ]
+            cursor.execute(statement(len(batch)), params)
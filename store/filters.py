@@ -8,3 +8,22 @@ class ProductFilter(FilterSet):
         fields = {
             'inventory': ['lt', 'gt'],
         }
+
+
+class OrderFilter(FilterSet):
+    class Meta:
+        model = Order
+        fields = {
+            'status': ['exact'],
+            'total_amount': ['gte', 'lte'],
+        }
+
+
+class CustomerFilter(FilterSet):
+    class Meta:
+        model = Customer
+        fields = {
+            'orders_count': ['gte', 'lte'],
+            'paid_total': ['gte', 'lte'],
+            'last_order_at': ['gte', 'lte'],
+        }
@@ -0,0 +1,238 @@
+import codecs
+import csv
+import json
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework import serializers
+
+from .cache import invalidate_cart_products
+from .db import bulk_update_rows
+from .models import Category, Product
+from .search import get_search_backend
+from .serializers import ProductImportSerializer
+
+CSV_MEDIA_TYPES = ('text/csv',)
+NDJSON_MEDIA_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+
+
+def read_csv(lines):
+    """Yield `(line, row, error)` for the rows of a CSV stream of byte lines; the first row names the columns."""
+    reader = csv.reader(codecs.iterdecode(lines, 'utf-8-sig'))
+    header = None
+    for values in reader:
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) > len(header):
+            yield reader.line_num, None, f'Expected {len(header)} columns, got {len(values)}'
+            continue
+        # An empty cell leaves the field as it is.
+        yield reader.line_num, {name: value for name, value in zip(header, values) if value != ''}, None
+
+
+def read_ndjson(lines):
+    """Yield `(line, row, error)` for a stream of byte lines holding one JSON object each."""
+    for line_number, line in enumerate(codecs.iterdecode(lines, 'utf-8-sig'), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f'Invalid JSON: {exc}'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'Expected a JSON object'
+            continue
+        yield line_number, row, None
+
+
+def get_reader(media_type):
+    media_type = media_type.split(';')[0].strip().lower()
+    if media_type in CSV_MEDIA_TYPES:
+        return read_csv
+    if media_type in NDJSON_MEDIA_TYPES:
+        return read_ndjson
+    return None
+
+
+class ImportReport:
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+        }
+
+
+class ProductImporter:
+    """
+    Creates and updates products from a stream of rows (see ProductImportSerializer), `chunk_size`
+    rows at a time with a fixed number of statements per chunk:
+
+    1. Rows are validated with the fields of one serializer instance, not one serializer per row.
+    2. The categories and the current values of the products to update are read with one query each.
+    3. New products are written with bulk INSERTs and changed ones with bulk UPDATEs of the changed
+       columns only (store.db.bulk_update_rows); rows that change nothing are not written.
+    4. What the product signals do on save is done once for the chunk: category product counts,
+       cached carts and the search index, for backends that `needs_reindex`.
+
+    A row that fails validation is reported with its line and skipped; the rest of the chunk is written.
+    Each chunk is its own transaction, so an interrupted import keeps the chunks written so far.
+    """
+    # Fields whose change must reach the search index and the cached carts.
+    indexed_fields = ('name', 'category_id')
+    cart_fields = ('name', 'unit_price')
+
+    def __init__(self, chunk_size=1000, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.report = ImportReport(max_errors)
+        self.create_serializer = ProductImportSerializer()
+        self.update_serializer = ProductImportSerializer(partial=True)
+        self.rebuild_index = False
+
+    def run(self, rows):
+        """Import `(line, row, error)` tuples as yielded by read_csv()/read_ndjson(); return the report."""
+        chunk = []
+        for line, row, error in rows:
+            self.report.rows += 1
+            if error is not None:
+                self.report.add_error(line, {'non_field_errors': [error]})
+                continue
+            data = self.validate(line, row)
+            if data is None:
+                continue
+            chunk.append((line, data))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        if self.rebuild_index:
+            get_search_backend().rebuild()
+        return self.report
+
+    def validate(self, line, row):
+        serializer = self.update_serializer if row.get('id') not in (None, '') else self.create_serializer
+        try:
+            return serializer.to_internal_value(row)
+        except serializers.ValidationError as exc:
+            self.report.add_error(line, exc.detail)
+            return None
+
+    def import_chunk(self, chunk):
+        category_ids = {data['category_id'] for _, data in chunk if 'category_id' in data}
+        known_category_ids = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+        existing = self.load_products(chunk)
+
+        created = []
+        changed = {}
+        changed_fields = set()
+        category_deltas = Counter()
+        for line, data in chunk:
+            if 'category_id' in data and data['category_id'] not in known_category_ids:
+                self.report.add_error(line, {'category': [f'There is no category with id {data["category_id"]}']})
+                continue
+            product_id = data.pop('id', None)
+            if product_id is None:
+                created.append(Product(slug=slugify(data['name']), **data))
+                category_deltas[data['category_id']] += 1
+                continue
+            product = existing.get(product_id)
+            if product is None:
+                self.report.add_error(line, {'id': [f'There is no product with id {product_id}']})
+                continue
+            fields = [name for name, value in data.items() if product[name] != value]
+            if not fields:
+                self.report.unchanged += 1
+                continue
+            if 'category_id' in fields:
+                category_deltas[product['category_id']] -= 1
+                category_deltas[data['category_id']] += 1
+            product.update((name, data[name]) for name in fields)
+            changed.setdefault(product_id, (product, set()))[1].update(fields)
+            changed_fields.update(fields)
+
+        self.report.created += len(created)
+        self.report.updated += len(changed)
+
+        with transaction.atomic():
+            Product.objects.bulk_create(created)
+            if changed:
+                # Like QuerySet.update(), this does not run auto_now.
+                now = timezone.now()
+                rows = [dict(product, datetime_modified=now) for product, _ in changed.values()]
+                bulk_update_rows(Product, rows, [*sorted(changed_fields), 'datetime_modified'], Product.objects.db)
+            self.update_category_counts(category_deltas)
+            if any(fields & set(self.cart_fields) for _, fields in changed.values()):
+                invalidate_cart_products()
+            reindexed = created + [
+                Product(id=product['id'], name=product['name'], category_id=product['category_id'])
+                for product, fields in changed.values() if fields & set(self.indexed_fields)
+            ]
+            if reindexed:
+                self.reindex(reindexed)
+
+    def load_products(self, chunk):
+        """The current values of the products the chunk updates, as dicts keyed by attname."""
+        updates = [data for _, data in chunk if 'id' in data]
+        if not updates:
+            return {}
+        # The search index and the category counts need the name and category of every changed product.
+        fields = ['id', 'name', 'category_id']
+        fields += sorted({name for data in updates for name in data} - set(fields))
+        products = Product.objects.filter(pk__in={data['id'] for data in updates}).values_list(*fields)
+        return {values[0]: dict(zip(fields, values)) for values in products}
+
+    @staticmethod
+    def update_category_counts(deltas):
+        deltas = {category_id: delta for category_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        whens = []
+        for category_id, delta in deltas.items():
+            if delta < 0:
+                # A drifted count must not go below zero: MySQL rejects it on the unsigned column.
+                whens.append(When(pk=category_id, products_count__lt=-delta, then=Value(0)))
+            whens.append(When(pk=category_id, then=F('products_count') + delta))
+        Category.objects.filter(pk__in=deltas).update(
+            products_count=Case(*whens, default=F('products_count'), output_field=IntegerField()),
+            datetime_modified=Now(),
+        )
+
+    def reindex(self, products):
+        """Index the products of the chunk the way the product signals would, in one call for the chunk."""
+        backend = get_search_backend()
+        if not backend.needs_reindex:
+            return
+        if any(product.pk is None for product in products):
+            # The database did not return the ids of the inserted rows (MySQL): run() rebuilds the index
+            # once, after the last chunk.
+            self.rebuild_index = True
+        elif backend.transactional:
+            backend.index_products(products)
+        else:
+            transaction.on_commit(lambda: backend.index_products(products))
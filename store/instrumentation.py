@@ -0,0 +1,186 @@
+import logging
+import re
+import time
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('store.queries')
+
+
+@dataclass
+class QueryRecord:
+    alias: str
+    sql: str
+    duration: float
+    stack: list = field(default_factory=list)
+    params: tuple = ()
+
+
+class QueryRecorder:
+    """
+    A `connection.execute_wrapper` that records every SQL statement with its duration and, optionally,
+    the project frames of the stack that issued it.
+
+    Statements are recorded with their placeholders, so the same query run for different parameters
+    shares one shape; a shape that repeats within one request is the signature of an N+1.
+    """
+
+    def __init__(self, capture_stacks=False):
+        self.capture_stacks = capture_stacks
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            stack = self.get_stack() if self.capture_stacks else []
+            self.queries.append(QueryRecord(context['connection'].alias, sql, duration, stack, params))
+
+    @staticmethod
+    def get_stack():
+        base_dir = str(settings.BASE_DIR)
+        return [
+            frame for frame in traceback.extract_stack()[:-2]
+            if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename
+        ]
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(query.duration for query in self.queries)
+
+    def repeated_shapes(self, threshold=2):
+        """Return `{sql: [QueryRecord, ...]}` for every statement shape issued at least `threshold` times."""
+        shapes = defaultdict(list)
+        for query in self.queries:
+            shapes[query.sql].append(query)
+        return {sql: queries for sql, queries in shapes.items() if len(queries) >= threshold}
+
+    def report(self, threshold=2):
+        lines = [f'{self.count} queries in {self.total_time * 1000:.1f} ms']
+        for sql, queries in self.repeated_shapes(threshold).items():
+            lines.append(f'{len(queries)}x {sql}')
+            if queries[0].stack:
+                lines.append(''.join(traceback.format_list(queries[0].stack)).rstrip())
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries(using=None, capture_stacks=False):
+    """Record the queries run on `using` (all configured databases by default) inside the block."""
+    recorder = QueryRecorder(capture_stacks=capture_stacks)
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+@dataclass
+class QueryPlan:
+    """The plan of one statement: the lines of its EXPLAIN, the tables it reads whole and whether it sorts."""
+    lines: list
+    full_scans: list
+    filesort: bool
+
+
+def explain(query):
+    """The QueryPlan of a recorded SELECT on its database. Supports SQLite and MySQL."""
+    connection = connections[query.alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {query.sql}', query.params)
+            return sqlite_plan(query.sql, [row[-1] for row in cursor.fetchall()])
+        if connection.vendor == 'mysql':
+            cursor.execute(f'EXPLAIN {query.sql}', query.params)
+            columns = [column[0] for column in cursor.description]
+            return mysql_plan([dict(zip(columns, row)) for row in cursor.fetchall()])
+    raise NotImplementedError(f'Query plans are not read on {connection.vendor}.')
+
+
+def sqlite_plan(sql, details):
+    full_scans = []
+    for detail in details:
+        match = re.fullmatch(r'SCAN (?:TABLE )?(\w+)', detail)
+        # Walking a table in primary key order up to a LIMIT is what an index scan of the key would do.
+        if match and not walks_primary_key(sql, match[1]):
+            full_scans.append(match[1])
+    # 'USE TEMP B-TREE FOR RIGHT PART OF ORDER BY' only sorts the rows that tie on the index-ordered terms.
+    sorts = [detail for detail in details if detail.startswith('USE TEMP B-TREE FOR') and 'RIGHT PART' not in detail]
+    return QueryPlan(details, full_scans, bool(sorts))
+
+
+def walks_primary_key(sql, table):
+    # SQLite reports a walk of a rowid table's key as a SCAN; MySQL's EXPLAIN says `index` on PRIMARY.
+    pk_columns = {model._meta.pk.column for model in apps.get_models() if model._meta.db_table == table}
+    return any(re.search(rf'ORDER BY "{table}"."{column}" (ASC|DESC) LIMIT', sql) for column in pk_columns)
+
+
+def mysql_plan(rows):
+    return QueryPlan(
+        [' '.join(f'{key}={value}' for key, value in row.items()) for row in rows],
+        [row['table'] for row in rows if row['type'] == 'ALL'],
+        any('Using filesort' in (row['Extra'] or '') for row in rows),
+    )
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the SQL of every request when `STORE_QUERY_INSTRUMENTATION` is on. The count and total
+    database time are returned in the `X-DB-Query-Count` and `X-DB-Time-Ms` headers, and statement
+    shapes repeated `STORE_N_PLUS_ONE_THRESHOLD` times or more are logged to `store.queries` with the
+    stack that issued them.
+
+    Under ASGI the request stays on the event loop. Connections belong to the request's thread-sensitive
+    thread, where the async ORM and the sync views run their queries, so only installing and removing
+    the recorder hops to that thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'STORE_QUERY_INSTRUMENTATION', False)
+        self.threshold = getattr(settings, 'STORE_N_PLUS_ONE_THRESHOLD', 3)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        with record_queries(capture_stacks=True) as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        stack = ExitStack()
+        recorder = await sync_to_async(stack.enter_context)(record_queries(capture_stacks=True))
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        response['X-DB-Query-Count'] = str(recorder.count)
+        response['X-DB-Time-Ms'] = f'{recorder.total_time * 1000:.2f}'
+        if recorder.repeated_shapes(self.threshold):
+            logger.warning('Repeated queries on %s %s\n%s', request.method, request.path,
+                           recorder.report(self.threshold))
+        return response
@@ -0,0 +1,234 @@
+import logging
+import random
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger('store.jobs')
+
+
+def object_path(obj):
+    return f'{obj.__module__}.{obj.__qualname__}'
+
+
+def dump_kwargs(kwargs):
+    """Model instances are stored as references and loaded again when the job runs; other values must be JSON."""
+    return {
+        key: {'model': value._meta.label_lower, 'pk': value.pk} if isinstance(value, models.Model) else {'value': value}
+        for key, value in kwargs.items()
+    }
+
+
+def enqueue_receivers(signal, sender, **kwargs):
+    """
+    Write one job per live receiver of `signal` in a single INSERT, so the cost to the sender does not
+    grow with the number of receivers. Call it inside the transaction of the change the signal is
+    about: the jobs commit, or roll back, with it.
+    """
+    receivers = signal._live_receivers(sender)
+    if not receivers:
+        return []
+
+    payload = dump_kwargs(kwargs)
+    jobs = [
+        Job(signal=signal.name, sender=object_path(sender), receiver=object_path(receiver), payload=payload)
+        for receiver in receivers
+    ]
+    Job.objects.bulk_create(jobs)
+    transaction.on_commit(wake_workers)
+    return jobs
+
+
+class LeaseExpired(Exception):
+    pass
+
+
+class JobRunner:
+    """
+    Claims due jobs in batches and calls their receivers, each in its own transaction.
+
+    Claiming pushes `run_after` one lease ahead, so a job whose worker died is picked up again once
+    the lease expires; delivery is therefore at least once and receivers should be idempotent. A job
+    is deleted in the transaction of its receiver, which rolls back if the job was claimed again.
+    A failed job is retried with exponential backoff until it has run `max_attempts` times, after
+    which it is marked failed and kept with its last error.
+    """
+    lease = timedelta(minutes=5)
+
+    def __init__(self, batch_size=100, max_attempts=None, retry_delay=None):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts or getattr(settings, 'STORE_JOB_MAX_ATTEMPTS', 5)
+        self.retry_delay = retry_delay or getattr(settings, 'STORE_JOB_RETRY_DELAY', 10)
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            queryset = Job.objects.filter(status=Job.STATUS_PENDING, run_after__lte=now).order_by('run_after')
+            if connections[Job.objects.db].features.has_select_for_update_skip_locked:
+                # Concurrent workers skip each other's rows instead of queueing on them.
+                queryset = queryset.select_for_update(skip_locked=True)
+            jobs = list(queryset[:self.batch_size])
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                run_after=now + self.lease,
+                attempts=models.F('attempts') + 1,
+            )
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    def run_batch(self):
+        """Run one batch of due jobs and return how many were claimed."""
+        jobs = self.claim()
+        if not jobs:
+            return 0
+
+        instances = self.load_instances(jobs)
+        for job in jobs:
+            try:
+                with transaction.atomic():
+                    self.run_job(job, instances)
+                    # Deleted with the receiver's writes: they commit, or roll back, together.
+                    self.finish(job)
+            except LeaseExpired:
+                logger.warning('Job %s (%s) was claimed again after its lease expired', job.pk, job.receiver)
+            except Exception:
+                logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.receiver, job.attempts)
+                self.fail(job, traceback.format_exc())
+        return len(jobs)
+
+    @staticmethod
+    def claimed(job):
+        """The job while it is still held by this claim, i.e. no other worker claimed it since."""
+        return Job.objects.filter(pk=job.pk, attempts=job.attempts)
+
+    def finish(self, job):
+        if not self.claimed(job).delete()[0]:
+            raise LeaseExpired(job.pk)
+
+    def fail(self, job, error):
+        if job.attempts >= self.max_attempts:
+            self.claimed(job).update(status=Job.STATUS_FAILED, last_error=error)
+        else:
+            self.claimed(job).update(run_after=timezone.now() + self.get_retry_delay(job.attempts), last_error=error)
+
+    def run_job(self, job, instances):
+        kwargs = {
+            key: instances[value['model'], value['pk']] if 'model' in value else value['value']
+            for key, value in job.payload.items()
+        }
+        receiver = import_string(job.receiver)
+        receiver(signal=import_string(job.signal), sender=import_string(job.sender), **kwargs)
+
+    @staticmethod
+    def load_instances(jobs):
+        """Load the model instances referenced by a batch of jobs with one query per model."""
+        pks_by_model = {}
+        for job in jobs:
+            for value in job.payload.values():
+                if 'model' in value:
+                    pks_by_model.setdefault(value['model'], set()).add(value['pk'])
+
+        instances = {}
+        for label, pks in pks_by_model.items():
+            model = apps.get_model(label)
+            for pk, instance in model._default_manager.in_bulk(pks).items():
+                instances[label, pk] = instance
+        return instances
+
+    def get_retry_delay(self, attempts):
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        return timedelta(seconds=delay + random.uniform(0, self.retry_delay))
+
+    @staticmethod
+    def next_run_after():
+        return Job.objects.filter(status=Job.STATUS_PENDING).aggregate(next=Min('run_after'))['next']
+
+
+class JobWorkerPool:
+    """
+    In-process workers: `wake()` drains the due jobs on up to `threads` background threads, and a
+    timer wakes the pool again when the earliest retry is due. Jobs left over by a stopped process
+    are drained by the next wake-up or by `manage.py run_jobs`.
+    """
+
+    def __init__(self, threads):
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='store-jobs')
+        self.lock = threading.Lock()
+        self.running = 0
+        self.woken = False
+        self.timer = None
+
+    def wake(self):
+        with self.lock:
+            self.woken = True
+            if self.running >= self.threads:
+                return
+            self.running += 1
+        self.executor.submit(self.drain)
+
+    def drain(self):
+        runner = JobRunner()
+        finished = False
+        try:
+            while not finished:
+                with self.lock:
+                    self.woken = False
+                while runner.run_batch():
+                    pass
+                with self.lock:
+                    # Jobs enqueued while this thread was draining would otherwise wait for the next wake-up.
+                    if not self.woken:
+                        self.running -= 1
+                        finished = True
+            next_run_after = runner.next_run_after()
+        except Exception:
+            logger.exception('Job worker stopped')
+            next_run_after = None
+            if not finished:
+                with self.lock:
+                    self.running -= 1
+        finally:
+            connections.close_all()
+        if next_run_after is not None:
+            self.schedule(next_run_after)
+
+    def schedule(self, when):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(max((when - timezone.now()).total_seconds(), 0), self.wake)
+            self.timer.daemon = True
+            self.timer.start()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """The process-wide pool, or None when `STORE_JOB_WORKER_THREADS` is 0 and only `run_jobs` drains jobs."""
+    global _pool
+    threads = getattr(settings, 'STORE_JOB_WORKER_THREADS', 0)
+    if not threads:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = JobWorkerPool(threads)
+    return _pool
+
+
+def wake_workers():
+    pool = get_worker_pool()
+    if pool is not None:
+        pool.wake()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored total amount and number of items of every order"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of orders updated per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(Order.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                updated += Order.objects.filter(pk__in=ids).recalculate_totals()
+            last_id = ids[-1]
+
+        self.stdout.write(f"Updated totals of {updated} orders.")
@@ -0,0 +1,77 @@
+import time
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+
+from store.instrumentation import record_queries
+from store.models import Comment, Order, Product
+
+CASES = [
+    (Product, 'first page', {}),
+    (Product, 'filtered', {'inventory': '<3'}),
+    (Order, 'first page', {}),
+    (Order, 'filtered', {'status__exact': Order.ORDER_STATUS_UNPAID}),
+    (Comment, 'first page', {}),
+    (Comment, 'filtered', {'status__exact': Comment.COMMENT_STATUS_APPROVED}),
+]
+
+
+class Command(BaseCommand):
+    help = ("Renders the product, order and comment admin changelists with Django's exact counts and with "
+            "the store admins' estimated counts (store.pagination.EstimatedCountPaginator), and reports "
+            "render time and SQL queries of each. Run it on a large dataset, e.g. after "
+            "`setup_fake_data --products 1000000`.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Renders per measurement; the best run is kept.')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Refresh the table statistics the estimates are read from first.')
+
+    def handle(self, *args, **options):
+        if options['analyze']:
+            self.analyze([Product, Order, Comment])
+        user = get_user_model()(username='changelist-benchmark', is_active=True, is_staff=True, is_superuser=True)
+
+        self.stdout.write(f"{'changelist':<24} {'rows':>9} {'exact ms':>9} {'queries':>8} "
+                          f"{'estimated ms':>13} {'queries':>8} {'speedup':>8}")
+        for model, name, params in CASES:
+            model_admin = admin.site._registry[model]
+            request = RequestFactory().get(reverse(f'admin:store_{model._meta.model_name}_changelist'), params)
+            request.user = user
+
+            exact_ms, exact_queries, _ = self.measure(model_admin, request, options['repeat'], exact=True)
+            estimated_ms, estimated_queries, rows = self.measure(model_admin, request, options['repeat'])
+            self.stdout.write(f"{f'{model.__name__} {name}':<24} {rows:>9} {exact_ms:>9.1f} {exact_queries:>8} "
+                              f"{estimated_ms:>13.1f} {estimated_queries:>8} {exact_ms / estimated_ms:>7.1f}x")
+
+    @staticmethod
+    def measure(model_admin, request, repeat, exact=False):
+        """Best render time in ms, queries and result count of the changelist; `exact` uses Django's defaults."""
+        overrides = {'paginator': Paginator, 'show_full_result_count': True} if exact else {}
+        for name, value in overrides.items():
+            setattr(model_admin, name, value)
+        try:
+            timings = []
+            for _ in range(repeat):
+                with record_queries(using=model_admin.model.objects.db) as recorder:
+                    start = time.perf_counter()
+                    response = model_admin.changelist_view(request)
+                    response.render()
+                    timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            for name in overrides:
+                delattr(model_admin, name)
+        return min(timings), recorder.count, response.context_data['cl'].result_count
+
+    @staticmethod
+    def analyze(models):
+        for model in models:
+            connection = connections[model.objects.db]
+            table = connection.ops.quote_name(model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE TABLE {table}' if connection.vendor == 'mysql' else f'ANALYZE {table}')
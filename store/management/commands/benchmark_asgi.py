@@ -0,0 +1,135 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from store.async_views import AsyncReadsASGIHandler
+from store.models import Cart, Category, Product
+
+HOST = '127.0.0.1'
+
+
+class Command(BaseCommand):
+    help = ("Compares the throughput of concurrent catalog reads served through the WSGI handler (one thread "
+            "per request) and the ASGI handler (async views on one event loop), in process and without a server. "
+            "Run it against a seeded database with DEBUG off.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 100],
+                            help='Requests in flight at once.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests measured per concurrency level.')
+        parser.add_argument('--paths', nargs='+', default=None,
+                            help='Paths to request in turn. Defaults to the catalog read endpoints.')
+        parser.add_argument('--urlconf', default='config.asgi_urls',
+                            help='URLconf of the ASGI handler, whatever STORE_ASGI_URLCONF is.')
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write("DEBUG is on: the sync-only debug toolbar middleware puts every ASGI request on a "
+                              "thread, so the numbers will not be representative.")
+        paths = options['paths'] or self.get_default_paths()
+        wsgi = WSGIHandler()
+        asgi = AsyncReadsASGIHandler(urlconf=options['urlconf'])
+
+        self.stdout.write(f"paths: {', '.join(paths)}")
+        self.stdout.write(f"{'concurrency':>11} {'wsgi req/s':>11} {'asgi req/s':>11} "
+                          f"{'wsgi p50 ms':>12} {'asgi p50 ms':>12}")
+        for concurrency in options['concurrency']:
+            wsgi_rate, wsgi_latencies = self.run_wsgi(wsgi, paths, options['requests'], concurrency)
+            asgi_rate, asgi_latencies = asyncio.run(self.run_asgi(asgi, paths, options['requests'], concurrency))
+            self.stdout.write(
+                f"{concurrency:>11} {wsgi_rate:>11.0f} {asgi_rate:>11.0f} "
+                f"{statistics.median(wsgi_latencies):>12.2f} {statistics.median(asgi_latencies):>12.2f}"
+            )
+
+    @staticmethod
+    def get_default_paths():
+        paths = [reverse('product-list'), reverse('category-list')]
+        product_id = Product.objects.values_list('pk', flat=True).first()
+        if product_id is not None:
+            paths.append(reverse('product-detail', kwargs={'pk': product_id}))
+        category_id = Category.objects.values_list('pk', flat=True).first()
+        if category_id is not None:
+            paths.append(reverse('category-detail', kwargs={'pk': category_id}))
+        cart_id = Cart.objects.values_list('pk', flat=True).first()
+        if cart_id is not None:
+            paths.append(reverse('cart-detail', kwargs={'pk': cart_id}))
+        return paths
+
+    def run_wsgi(self, handler, paths, requests, concurrency):
+        def request(i):
+            path, _, query_string = paths[i % len(paths)].partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query_string,
+                'SCRIPT_NAME': '',
+                'SERVER_NAME': HOST,
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': HOST,
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': self.stderr,
+                'wsgi.url_scheme': 'http',
+            }
+            start = time.perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(request, range(requests)))
+        return requests / (time.perf_counter() - start), latencies
+
+    async def run_asgi(self, handler, paths, requests, concurrency):
+        latencies = []
+        counter = iter(range(requests))
+
+        async def request(i):
+            path, _, query_string = paths[i % len(paths)].partition('?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query_string.encode(),
+                'root_path': '',
+                'headers': [(b'host', HOST.encode())],
+                'client': (HOST, 50000),
+                'server': (HOST, 80),
+            }
+            body_sent = False
+
+            async def receive():
+                nonlocal body_sent
+                if body_sent:
+                    # Nothing more to send; only a disconnect could follow.
+                    await asyncio.Future()
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                pass
+
+            start = time.perf_counter()
+            await handler(scope, receive, send)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        async def client():
+            for i in counter:
+                await request(i)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start), latencies
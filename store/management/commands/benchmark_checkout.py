@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Cart, CartItem, Category, Product
+from store.serializers import OrderCreateSerializer
+
+
+class Command(BaseCommand):
+    help = "Reports SQL queries and latency per checkout for growing cart sizes. All data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 100, 500],
+                            help='Cart sizes (number of distinct products) to check out.')
+        parser.add_argument('--repeat', type=int, default=5, help='Checkouts measured per cart size.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'cart size':>10} {'queries':>8} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+        for size in options['sizes']:
+            queries, timings = self.measure(size, options['repeat'])
+            self.stdout.write(
+                f"{size:>10} {queries:>8} {statistics.median(timings):>10.2f} "
+                f"{min(timings):>8.2f} {max(timings):>8.2f}"
+            )
+
+    def measure(self, size, repeat):
+        timings = []
+        queries = 0
+        with transaction.atomic():
+            user = get_user_model().objects.create(username='checkout-benchmark', email='checkout@benchmark.local')
+            category = Category.objects.create(title='Checkout benchmark')
+            products = Product.objects.bulk_create([
+                Product(name=f'Benchmark product {i}', slug=f'benchmark-product-{i}', description='',
+                        category=category, unit_price=i % 100 + 1, inventory=100)
+                for i in range(size)
+            ])
+            if products[0].pk is None:
+                products = list(Product.objects.filter(category=category))
+
+            for _ in range(repeat):
+                cart = Cart.objects.create()
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=product, quantity=2) for product in products
+                ])
+                serializer = OrderCreateSerializer(data={'cart_id': str(cart.id)}, context={'user_id': user.id})
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries = len(captured)
+
+            transaction.set_rollback(True)
+        return queries, timings
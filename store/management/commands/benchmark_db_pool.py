@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+
+from store.models import Product
+from store.pool import PooledDatabaseWrapperMixin, pool_stats, reset_pool
+
+HOST = '127.0.0.1'
+
+
+class Command(BaseCommand):
+    help = ("Compares the throughput of concurrent requests served through the WSGI handler with a new database "
+            "connection per request and with connections checked out of the pool (store.pool), in process and "
+            "without a server. The database must use a store.backends engine; run it with DEBUG off.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50],
+                            help='Requests in flight at once.')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests measured per run.')
+        parser.add_argument('--pool-size', type=int, default=None,
+                            help="Pool max_size; defaults to the database's OPTIONS['pool'].")
+        parser.add_argument('--paths', nargs='+', default=None,
+                            help='Paths to request in turn. Defaults to catalog read endpoints.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if not isinstance(connections[alias], PooledDatabaseWrapperMixin):
+            raise CommandError(f"DATABASES['{alias}'] must use a store.backends engine, "
+                               f"e.g. store.backends.mysql.")
+        paths = options['paths'] or self.get_default_paths()
+        settings_dict = connections.settings[alias]
+        pool = settings_dict['OPTIONS'].get('pool')
+        pool = {**(pool if isinstance(pool, dict) else {})}
+        if options['pool_size']:
+            pool['max_size'] = options['pool_size']
+
+        handler = WSGIHandler()
+        self.stdout.write(f"paths: {', '.join(paths)}")
+        self.stdout.write(f"{'concurrency':>11} {'unpooled req/s':>15} {'pooled req/s':>13} {'speedup':>8} "
+                          f"{'connections':>12} {'waits':>6} {'wait ms':>8}")
+        try:
+            for concurrency in options['concurrency']:
+                self.configure(alias, settings_dict, False)
+                unpooled_rate = self.run(handler, paths, options['requests'], concurrency)
+
+                self.configure(alias, settings_dict, pool or True)
+                pooled_rate = self.run(handler, paths, options['requests'], concurrency)
+                stats = pool_stats()[alias]
+                self.stdout.write(
+                    f"{concurrency:>11} {unpooled_rate:>15.0f} {pooled_rate:>13.0f} "
+                    f"{pooled_rate / unpooled_rate:>7.2f}x {stats['created']:>12} {stats['waits']:>6} "
+                    f"{stats['wait_time_ms']:>8.1f}"
+                )
+        finally:
+            self.configure(alias, settings_dict, settings_dict['OPTIONS'].get('pool'))
+
+    @staticmethod
+    def configure(alias, settings_dict, pool):
+        """Open the connections of the next run's threads with `pool` as OPTIONS['pool'], on a fresh pool."""
+        reset_pool(alias)
+        connections.settings[alias] = {**settings_dict, 'OPTIONS': {**settings_dict['OPTIONS'], 'pool': pool}}
+
+    @staticmethod
+    def get_default_paths():
+        paths = [reverse('product-list'), reverse('category-list')]
+        product_id = Product.objects.values_list('pk', flat=True).first()
+        if product_id is not None:
+            paths.append(reverse('product-detail', kwargs={'pk': product_id}))
+        return paths
+
+    def run(self, handler, paths, requests, concurrency):
+        """Requests per second; every request runs on a fresh thread-local connection, closed at its end."""
+        def request(i):
+            path, _, query_string = paths[i % len(paths)].partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query_string,
+                'SCRIPT_NAME': '',
+                'SERVER_NAME': HOST,
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': HOST,
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': self.stderr,
+                'wsgi.url_scheme': 'http',
+            }
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(request, range(requests)))
+        return requests / (time.perf_counter() - start)
@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from store.compiled import compile_serializer
+from store.models import Cart, Order, Product
+from store.serializers import CartSerializer, OrderForAdminSerializer, OrderSerializer, ProductSerializer
+
+HOST = '127.0.0.1'
+
+
+class Command(BaseCommand):
+    help = ("Compares DRF serializers with their compiled form (store.compiled) on a product page, the largest "
+            "cart and the largest order: fetch + serialize, and serialization alone. Checks that both render "
+            "the same JSON bytes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Products per page.')
+        parser.add_argument('--repeat', type=int, default=200, help='Runs per measurement; the best run is kept.')
+
+    def handle(self, *args, **options):
+        context = {'request': Request(RequestFactory().get('/', HTTP_HOST=HOST))}
+        cases = [
+            ('product page', ProductSerializer, Product.objects.order_by('id')[:options['rows']], True),
+        ]
+        cart_id = Cart.objects.annotate(n=Count('items')).order_by('-n').values_list('pk', flat=True).first()
+        if cart_id is not None:
+            cases.append(('cart', CartSerializer, Cart.objects.prefetch_related('items__product')
+                          .filter(pk=cart_id), False))
+        order_id = Order.objects.order_by('-items_count').values_list('pk', flat=True).first()
+        if order_id is not None:
+            orders = (Order.objects.prefetch_related('items__product').select_related('customer__user')
+                      .filter(pk=order_id))
+            cases.append(('order', OrderSerializer, orders, False))
+            cases.append(('order (staff)', OrderForAdminSerializer, orders, False))
+
+        self.stdout.write(f"{'case':<14} {'drf ms':>8} {'compiled ms':>12} {'speedup':>8} "
+                          f"{'drf render':>11} {'compiled render':>16} {'speedup':>8}")
+        for name, serializer_class, queryset, many in cases:
+            self.run_case(name, serializer_class, queryset, many, context, options['repeat'])
+
+    def run_case(self, name, serializer_class, queryset, many, context, repeat):
+        compiled = compile_serializer(serializer_class)
+
+        def fetch_instances():
+            instances = list(queryset.all())
+            return instances if many else instances[0]
+
+        def fetch_rows():
+            rows = compiled.fetch(queryset.all())
+            return rows if many else rows[0]
+
+        def drf(instance):
+            return serializer_class(instance, many=many, context=context).data
+
+        def fast(rows):
+            return compiled.bind(rows, many, context).data
+
+        instances, rows = fetch_instances(), fetch_rows()
+        if JSONRenderer().render(drf(instances)) != JSONRenderer().render(fast(rows)):
+            raise CommandError(f'{name}: the compiled serializer does not render the same JSON.')
+
+        drf_total = self.best(lambda: drf(fetch_instances()), repeat)
+        fast_total = self.best(lambda: fast(fetch_rows()), repeat)
+        drf_render = self.best(lambda: drf(instances), repeat)
+        fast_render = self.best(lambda: fast(rows), repeat)
+        self.stdout.write(f"{name:<14} {drf_total:>8.3f} {fast_total:>12.3f} {drf_total / fast_total:>7.1f}x "
+                          f"{drf_render:>11.3f} {fast_render:>16.3f} {drf_render / fast_render:>7.1f}x")
+
+    @staticmethod
+    def best(function, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
@@ -0,0 +1,57 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from store.cache import invalidate_carts
+from store.models import Cart
+
+
+class Command(BaseCommand):
+    help = ("Deletes the carts (and their items) without activity for STORE_CART_EXPIRY_DAYS days, a batch per "
+            "transaction, oldest first")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Days without activity after which a cart expires (default: STORE_CART_EXPIRY_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of carts deleted per transaction.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches, e.g. to let replicas catch up.')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else getattr(settings, 'STORE_CART_EXPIRY_DAYS', 30)
+        cutoff = timezone.now() - timedelta(days=days)
+
+        deleted = 0
+        while True:
+            count = self.delete_batch(cutoff, options['batch_size'])
+            deleted += count
+            if count < options['batch_size']:
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(f"Deleted {deleted} carts without activity since {cutoff:%Y-%m-%d %H:%M}.")
+
+    @staticmethod
+    def delete_batch(cutoff, batch_size):
+        with transaction.atomic():
+            # The batch is read off the last_activity index and locked: writes to its carts wait for the
+            # delete instead of interleaving with it, and parallel runs skip each other's batches.
+            queryset = Cart.objects.filter(last_activity__lt=cutoff).order_by('last_activity')
+            if connections[Cart.objects.db].features.has_select_for_update_skip_locked:
+                queryset = queryset.select_for_update(skip_locked=True)
+            else:
+                queryset = queryset.select_for_update()
+            cart_ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not cart_ids:
+                return 0
+            # CartItem has no signals and nothing cascades from it, so the collector deletes the items of
+            # the batch with one DELETE instead of loading them.
+            Cart.objects.filter(pk__in=cart_ids).delete()
+            invalidate_carts(cart_ids)
+        return len(cart_ids)
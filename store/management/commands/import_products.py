@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.imports import ProductImporter, read_csv, read_ndjson
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+class Command(BaseCommand):
+    help = ("Creates and updates products from a CSV or NDJSON file (or stdin), streamed and written in chunks. "
+            "Rows with an id update that product; rows that fail validation are reported and skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for stdin.')
+        parser.add_argument('--format', choices=sorted(READERS), default=None,
+                            help='Input format. Defaults to the extension of the file.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of rows validated and written per transaction.')
+        parser.add_argument('--max-errors', type=int, default=100, help='Number of row errors to print.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or path.rpartition('.')[2].lower()
+        if input_format not in READERS:
+            raise CommandError('Cannot tell the format of the input, use --format.')
+
+        importer = ProductImporter(chunk_size=options['chunk_size'], max_errors=options['max_errors'])
+        if path == '-':
+            report = importer.run(READERS[input_format](sys.stdin.buffer))
+        else:
+            with open(path, 'rb') as stream:
+                report = importer.run(READERS[input_format](stream))
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(f"{report.rows} rows: {report.created} created, {report.updated} updated, "
+                          f"{report.unchanged} unchanged, {report.error_count} errors.")
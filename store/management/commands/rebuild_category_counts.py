@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+from store.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored number of products of every category"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of categories updated per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        products_count = Subquery(
+            Product.objects.filter(category_id=OuterRef('pk'))
+            .order_by()
+            .values('category_id')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(Category.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Only counts that drifted are written, with the modification time conditional GETs compare.
+                count = Coalesce(products_count, 0)
+                updated += Category.objects.filter(pk__in=ids).exclude(products_count=count).update(
+                    products_count=count,
+                    datetime_modified=Now(),
+                )
+            last_id = ids[-1]
+
+        self.stdout.write(f"Updated products count of {updated} categories.")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+from store.models import Comment, Product
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored number of approved comments of every product"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of products updated per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        approved_comments_count = Subquery(
+            Comment.objects.filter(product_id=OuterRef('pk'), status=Comment.COMMENT_STATUS_APPROVED)
+            .order_by()
+            .values('product_id')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(Product.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Only counts that drifted are written, with the modification time conditional GETs compare.
+                count = Coalesce(approved_comments_count, 0)
+                updated += Product.objects.filter(pk__in=ids).exclude(approved_comments_count=count).update(
+                    approved_comments_count=count,
+                    datetime_modified=Now(),
+                )
+            last_id = ids[-1]
+
+        self.stdout.write(f"Updated approved comments count of {updated} products.")
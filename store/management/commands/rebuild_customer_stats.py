@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.analytics import rebuild_customer_stats
+from store.models import Customer
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the stored lifetime stats (orders count, paid total, last order time) of every customer. "
+            "Paid totals are summed from the stored order totals: run backfill_order_totals first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of customers updated per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(Customer.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                updated += rebuild_customer_stats(Customer.objects.filter(pk__in=ids))
+            last_id = ids[-1]
+
+        self.stdout.write(f"Updated lifetime stats of {updated} customers.")
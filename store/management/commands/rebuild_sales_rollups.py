@@ -0,0 +1,21 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from store.analytics import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes the daily product and category sales rollups from the order items"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, default=None,
+                            help='First day to rebuild (YYYY-MM-DD). Defaults to the day of the first order.')
+        parser.add_argument('--end', type=date.fromisoformat, default=None,
+                            help='Last day to rebuild (YYYY-MM-DD). Defaults to the day of the last order.')
+        parser.add_argument('--days-per-batch', type=int, default=31,
+                            help='Number of days rebuilt per transaction.')
+
+    def handle(self, *args, **options):
+        days = rebuild_sales_rollups(options['start'], options['end'], options['days_per_batch'])
+        self.stdout.write(f"Rebuilt sales rollups of {days} days.")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the product search index of the configured search backend"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f"Rebuilding search index with {backend.__class__.__name__}...")
+        backend.rebuild()
+        self.stdout.write("DONE")
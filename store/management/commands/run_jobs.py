@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.jobs import JobRunner
+
+
+class Command(BaseCommand):
+    help = "Runs the background jobs of the outbox (e.g. order_create receivers) until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Jobs claimed per batch.')
+        parser.add_argument('--poll-interval', type=float, default=2,
+                            help='Seconds to wait before polling again when no job is due.')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as no job is due.')
+
+    def handle(self, *args, **options):
+        runner = JobRunner(batch_size=options['batch_size'])
+        processed = 0
+        try:
+            while True:
+                claimed = runner.run_batch()
+                processed += claimed
+                if not claimed:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Ran {processed} jobs.")
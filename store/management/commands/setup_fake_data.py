@@ -1,28 +1,29 @@
 # setup_test_data.py
 import random
-from faker import Faker
-from datetime import datetime, timedelta
+import time
+import uuid
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 
-from django.db import transaction
+from faker import Faker
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
 
-from store.models import Address, Cart, CartItem, Category, Comment, Order, OrderItem, Product, Discount, Customer
-from store.factories import (
-    CartFactory,
-    CategoryFactory,
-    CommentFactory,
-    OrderItemFactory,
-    ProductFactory,
-    DiscountFactory,
-    CustomerFactory,
-    AddressFactory,
-    OrderFactory,
-    CartItemFactory,
-)
+from store.models import (Address, Cart, CartItem, Category, CategorySearchToken, Comment, Customer, DailyCategorySales,
+                          DailyProductSales, Discount, Job, Order, OrderItem, OrderSales, Product, ProductSearchToken)
+from store.search import get_search_backend
+from store.signals import order_create
 
-faker = Faker()
-
-list_of_models = [CartItem, Cart, OrderItem, Order, Product, Category, Comment, Discount, Address, Customer]
+# The catalog and everything referencing it is replaced; customers only those of the fake users.
+list_of_models = [DailyProductSales, DailyCategorySales, CartItem, Cart, OrderItem, OrderSales, Order, Comment,
+                  ProductSearchToken, CategorySearchToken, Product.discounts.through, Product, Category, Discount]
 
 NUM_CATEGORIES = 100
 NUM_DISCOUNTS = 10
@@ -31,95 +32,310 @@ NUM_CUSTOMERS = 100
 NUM_ORDERS = 30
 NUM_CARTS = 100
 
+FAKE_USERNAME_PREFIX = 'fake_'
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create() persist the given auto_now/auto_now_add fields instead of overwriting them."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
 class Command(BaseCommand):
     help = "Generates fake data"
 
-    @transaction.atomic
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=NUM_CATEGORIES)
+        parser.add_argument('--discounts', type=int, default=NUM_DISCOUNTS)
+        parser.add_argument('--products', type=int, default=NUM_PRODUCTS)
+        parser.add_argument('--customers', type=int, default=NUM_CUSTOMERS)
+        parser.add_argument('--orders', type=int, default=NUM_ORDERS)
+        parser.add_argument('--carts', type=int, default=NUM_CARTS)
+        parser.add_argument('--max-items-per-order', type=int, default=10,
+                            help='Order items per order are uniform in [1, max]; the mean is about (max + 1) / 2.')
+        parser.add_argument('--max-items-per-cart', type=int, default=10)
+        parser.add_argument('--max-comments-per-product', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=None, help='Seed for a reproducible dataset.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk INSERT.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.faker = Faker()
+        self.faker.seed_instance(options['seed'])
+        self.chunk_size = options['chunk_size']
+
         self.stdout.write("Deleting old data...")
-        models = list_of_models
-        for m in models:
-            m.objects.all().delete()
+        self.delete_old_data()
 
         self.stdout.write("Creating new data...\n")
+        self.build_pools()
+        self.step(f"Adding {options['categories']} categories", self.create_categories, options['categories'])
+        self.step(f"Adding {options['discounts']} discounts", self.create_discounts, options['discounts'])
+        self.step(f"Adding {options['products']} products", self.create_products, options['products'])
+        self.step("Adding product discounts", self.create_product_discounts)
+        self.step("Choosing top products", self.set_top_products)
+        self.step(f"Adding {options['customers']} customers", self.create_customers, options['customers'])
+        self.step(f"Adding {options['orders']} orders", self.create_orders, options['orders'],
+                  options['max_items_per_order'])
+        self.step("Adding product comments", self.create_comments, options['max_comments_per_product'])
+        self.step(f"Adding {options['carts']} carts", self.create_carts, options['carts'],
+                  options['max_items_per_cart'])
+        self.reset_sequences()
+        call_command('rebuild_category_counts', stdout=self.stdout)
+        call_command('rebuild_comment_counts', stdout=self.stdout)
+        call_command('rebuild_customer_stats', stdout=self.stdout)
+        call_command('rebuild_sales_rollups', stdout=self.stdout)
+        if get_search_backend().needs_reindex:
+            call_command('rebuild_search_index', stdout=self.stdout)
+
+    def step(self, description, function, *args):
+        self.stdout.write(f"{description}...", ending='')
+        self.stdout.flush()
+        start = time.perf_counter()
+        function(*args)
+        self.stdout.write(f"DONE ({time.perf_counter() - start:.1f}s)")
+
+    def delete_old_data(self):
+        # Plain DELETE statements, children first: the ORM collector would load every row into memory first.
+        User = get_user_model()
+        quote_name = connection.ops.quote_name
+
+        def table(model):
+            return quote_name(model._meta.db_table)
+
+        def column(model, field_name):
+            return quote_name(model._meta.get_field(field_name).column)
+
+        fake_users = f'SELECT {column(User, "id")} FROM {table(User)} WHERE {column(User, "username")} LIKE %s'
+        fake_customers = (f'SELECT {column(Customer, "id")} FROM {table(Customer)} '
+                          f'WHERE {column(Customer, "user")} IN ({fake_users})')
+        fake_username = [f'{FAKE_USERNAME_PREFIX}%']
+        with transaction.atomic(), connection.cursor() as cursor:
+            Category.objects.update(top_product=None)
+            # The deferred order_create jobs of the deleted orders would fail once they run.
+            cursor.execute(f'DELETE FROM {table(Job)} WHERE {column(Job, "signal")} = %s', [order_create.name])
+            for model in list_of_models:
+                cursor.execute(f'DELETE FROM {table(model)}')
+            cursor.execute(f'DELETE FROM {table(Address)} WHERE {column(Address, "customer")} IN ({fake_customers})',
+                           fake_username)
+            cursor.execute(f'DELETE FROM {table(Customer)} WHERE {column(Customer, "user")} IN ({fake_users})',
+                           fake_username)
+            cursor.execute(f'DELETE FROM {table(User)} WHERE {column(User, "username")} LIKE %s', fake_username)
+
+    def build_pools(self):
+        # Faker is slow per call, so draw text from fixed pools of fake values instead.
+        self.words = sorted({word.capitalize() for word in self.faker.words(2000)})
+        self.sentences = [self.faker.sentence(nb_words=5, variable_nb_words=True) for _ in range(500)]
+        self.paragraphs = [self.faker.paragraph(nb_sentences=5, variable_nb_sentences=True) for _ in range(500)]
+        self.first_names = [self.faker.first_name() for _ in range(500)]
+        self.last_names = [self.faker.last_name() for _ in range(500)]
+        self.cities = [self.faker.city() for _ in range(200)]
+
+    def random_datetime(self, start, end):
+        span = int((end - start).total_seconds())
+        return start + timedelta(seconds=self.rng.randint(0, span))
+
+    def chunks(self, total):
+        for start in range(0, total, self.chunk_size):
+            yield start, min(start + self.chunk_size, total)
+
+    def next_id(self, model):
+        return (model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+
+    def create_categories(self, count):
+        first_id = self.next_id(Category)
+        self.category_ids = list(range(first_id, first_id + count))
+        for start, end in self.chunks(count):
+            Category.objects.bulk_create([
+                Category(id=first_id + i, title=self.rng.choice(self.sentences)[:255],
+                         description=self.rng.choice(self.sentences))
+                for i in range(start, end)
+            ])
+
+    def create_discounts(self, count):
+        first_id = self.next_id(Discount)
+        self.discount_ids = list(range(first_id, first_id + count))
+        Discount.objects.bulk_create([
+            Discount(id=first_id + i, discount=self.rng.randint(1, 80) / 100,
+                     description=self.rng.choice(self.sentences))
+            for i in range(count)
+        ], batch_size=self.chunk_size)
+
+    def create_products(self, count):
+        self.first_product_id = self.next_id(Product)
+        self.product_count = count
+        # Prices are kept in cents to hold millions of them in little memory.
+        self.product_prices = array('l')
+        created_start, created_end = datetime(2022, 1, 1, tzinfo=timezone.utc), datetime(2023, 1, 1, tzinfo=timezone.utc)
+        with explicit_timestamps(Product._meta.get_field('datetime_created'),
+                                 Product._meta.get_field('datetime_modified')):
+            for start, end in self.chunks(count):
+                products = []
+                for i in range(start, end):
+                    name = ' '.join(self.rng.sample(self.words, 3))
+                    cents = self.rng.randint(100, 99999)
+                    created = self.random_datetime(created_start, created_end)
+                    self.product_prices.append(cents)
+                    products.append(Product(
+                        id=self.first_product_id + i,
+                        name=name,
+                        slug='-'.join(name.split(' ')).lower(),
+                        description=self.rng.choice(self.paragraphs),
+                        category_id=self.rng.choice(self.category_ids),
+                        unit_price=Decimal(cents).scaleb(-2),
+                        inventory=self.rng.randint(1, 100),
+                        datetime_created=created,
+                        datetime_modified=created + timedelta(hours=self.rng.randint(1, 5000)),
+                    ))
+                Product.objects.bulk_create(products)
+
+    def random_product_ids(self, count):
+        offsets = self.rng.sample(range(self.product_count), min(count, self.product_count))
+        return [self.first_product_id + offset for offset in offsets]
+
+    def product_price(self, product_id):
+        return Decimal(self.product_prices[product_id - self.first_product_id]).scaleb(-2)
+
+    def create_product_discounts(self):
+        if not self.discount_ids:
+            return
+        ProductDiscount = Product.discounts.through
+        discounted = self.random_product_ids(self.product_count // 10)
+        for start, end in self.chunks(len(discounted)):
+            ProductDiscount.objects.bulk_create([
+                ProductDiscount(product_id=product_id, discount_id=self.rng.choice(self.discount_ids))
+                for product_id in discounted[start:end]
+            ])
+
+    def set_top_products(self):
+        if not self.product_count:
+            return
+        categories = list(Category.objects.filter(pk__in=self.category_ids).only('id'))
+        for category in categories:
+            category.top_product_id = self.first_product_id + self.rng.randrange(self.product_count)
+        Category.objects.bulk_update(categories, ['top_product'], batch_size=self.chunk_size)
+
+    def create_customers(self, count):
+        User = get_user_model()
+        first_user_id = self.next_id(User)
+        self.first_customer_id = self.next_id(Customer)
+        self.customer_count = count
+        password = make_password(None)
+        birth_start, birth_end = datetime(1990, 1, 1, tzinfo=timezone.utc), datetime(2015, 1, 1, tzinfo=timezone.utc)
+        for start, end in self.chunks(count):
+            users = []
+            customers = []
+            addresses = []
+            for i in range(start, end):
+                user_id, customer_id = first_user_id + i, self.first_customer_id + i
+                users.append(User(
+                    id=user_id,
+                    username=f'{FAKE_USERNAME_PREFIX}{user_id}',
+                    email=f'{FAKE_USERNAME_PREFIX}{user_id}@example.com',
+                    password=password,
+                    first_name=self.rng.choice(self.first_names),
+                    last_name=self.rng.choice(self.last_names),
+                ))
+                customers.append(Customer(
+                    id=customer_id,
+                    user_id=user_id,
+                    phone_number=f'09{self.rng.randint(0, 999999999):09d}',
+                    birth_date=self.random_datetime(birth_start, birth_end).date(),
+                ))
+                addresses.append(Address(
+                    customer_id=customer_id,
+                    province=self.rng.choice(self.cities),
+                    city=self.rng.choice(self.cities),
+                    street=f'street {self.rng.randint(1, 50)}',
+                ))
+            # Bulk inserts skip post_save, so customers are created here rather than by the user signal.
+            User.objects.bulk_create(users)
+            Customer.objects.bulk_create(customers)
+            Address.objects.bulk_create(addresses)
+
+    def create_orders(self, count, max_items_per_order):
+        if not self.customer_count or not self.product_count:
+            return
+        first_order_id = self.next_id(Order)
+        created_start, created_end = datetime(2022, 6, 1, tzinfo=timezone.utc), datetime(2023, 1, 1, tzinfo=timezone.utc)
+        statuses = [Order.ORDER_STATUS_PAID, Order.ORDER_STATUS_UNPAID, Order.ORDER_STATUS_CANCELED]
+        with explicit_timestamps(Order._meta.get_field('datetime_created')):
+            for start, end in self.chunks(count):
+                orders = []
+                order_items = []
+                for i in range(start, end):
+                    order = Order(
+                        id=first_order_id + i,
+                        customer_id=self.first_customer_id + self.rng.randrange(self.customer_count),
+                        status=self.rng.choice(statuses),
+                        datetime_created=self.random_datetime(created_start, created_end),
+                    )
+                    for product_id in self.random_product_ids(self.rng.randint(1, max_items_per_order)):
+                        order_item = OrderItem(
+                            order_id=order.id,
+                            product_id=product_id,
+                            quantity=self.rng.randint(1, 20),
+                            unit_price=self.product_price(product_id),
+                        )
+                        order.total_amount += order_item.quantity * order_item.unit_price
+                        order.items_count += 1
+                        order_items.append(order_item)
+                    orders.append(order)
+                with transaction.atomic():
+                    Order.objects.bulk_create(orders)
+                    OrderItem.objects.bulk_create(order_items, batch_size=self.chunk_size)
+
+    def create_comments(self, max_comments_per_product):
+        created_start, created_end = datetime(2015, 1, 1, tzinfo=timezone.utc), datetime(2023, 1, 1, tzinfo=timezone.utc)
+        statuses = [Comment.COMMENT_STATUS_WAITING, Comment.COMMENT_STATUS_APPROVED,
+                    Comment.COMMENT_STATUS_NOT_APPROVED]
+        with explicit_timestamps(Comment._meta.get_field('datetime_created')):
+            comments = []
+            for offset in range(self.product_count):
+                for _ in range(self.rng.randint(1, max_comments_per_product)):
+                    comments.append(Comment(
+                        product_id=self.first_product_id + offset,
+                        name=self.rng.choice(self.first_names),
+                        body=self.rng.choice(self.paragraphs),
+                        status=self.rng.choice(statuses),
+                        datetime_created=self.random_datetime(created_start, created_end),
+                    ))
+                if len(comments) >= self.chunk_size:
+                    Comment.objects.bulk_create(comments)
+                    comments = []
+            Comment.objects.bulk_create(comments)
+
+    def create_carts(self, count, max_items_per_cart):
+        if not self.product_count:
+            return
+        active_end = datetime.now(timezone.utc)
+        active_start = active_end - timedelta(days=60)
+        for start, end in self.chunks(count):
+            carts = [
+                Cart(id=uuid.UUID(int=self.rng.getrandbits(128), version=4),
+                     last_activity=self.random_datetime(active_start, active_end))
+                for _ in range(start, end)
+            ]
+            cart_items = [
+                CartItem(cart_id=cart.id, product_id=product_id, quantity=self.rng.randint(1, 20))
+                for cart in carts
+                for product_id in self.random_product_ids(self.rng.randint(1, max_items_per_cart))
+            ]
+            with transaction.atomic():
+                Cart.objects.bulk_create(carts)
+                CartItem.objects.bulk_create(cart_items, batch_size=self.chunk_size)
 
-        # Categories data
-        print(f"Adding {NUM_CATEGORIES} categories...", end='')
-        all_categories = [CategoryFactory(top_product=None) for _ in range(NUM_CATEGORIES)]
-        print('DONE')
-        
-        # Discounts data
-        print(f"Adding {NUM_DISCOUNTS} discounts...", end='')
-        all_discounts = [DiscountFactory() for _ in range(NUM_DISCOUNTS)]
-        print('DONE')
-
-        # Products data
-        print(f"Adding {NUM_PRODUCTS} product...", end='')
-        all_products = list()
-        for _ in range(NUM_PRODUCTS):
-            new_product = ProductFactory(category_id=random.choice(all_categories).id)
-            new_product.datetime_created = faker.date_time_ad(start_datetime=datetime(2022,1,1), end_datetime=datetime(2023,1,1))
-            new_product.datetime_modified = new_product.datetime_created + timedelta(hours=random.randint(1, 5000))
-            all_products.append(new_product)
-        print('DONE')
-
-        # Customers data
-        print(f"Adding {NUM_CUSTOMERS} customers...", end='')
-        all_customers = [CustomerFactory() for _ in range(NUM_CUSTOMERS)]
-        print('DONE')
-
-        # Addresses data
-        print(f"Adding customers addresses...", end='')
-        all_addresses = [
-            AddressFactory(customer_id=customer.id) for customer in all_customers
-        ]
-        print('DONE')
-
-        # Orders data
-        print(f"Adding {NUM_ORDERS} orders...", end='')
-        all_orders = [OrderFactory(
-            customer_id=random.choice(all_customers).id
-        ) for _ in range(NUM_ORDERS)]
-        for order in all_orders:
-            order.datetime_created = faker.date_time_ad(start_datetime=datetime(2022,6,1), end_datetime=datetime(2023,1,1))
-        print('DONE')
-
-        # OrderItems data
-        print(f"Adding order items...", end='')
-        all_order_items = list()
-        for order in all_orders:
-            products = random.sample(all_products, random.randint(1, 10))
-            for product in products:
-                order_item = OrderItemFactory(
-                    order_id=order.id,
-                    product_id=product.id,
-                    unit_price=product.unit_price,
-                )
-                all_order_items.append(order_item)
-        print('DONE')
-
-        # Comments data
-        print(f"Adding product comments...", end='')
-        for product in all_products:
-            for _ in range(random.randint(1, 5)):
-                comment = CommentFactory(product_id=product.id)
-                comment.datetime_created = faker.date_time_ad(start_datetime=datetime(2015,1,1), end_datetime=datetime(2023,1,1))
-        print('DONE')
-
-        # Carts data
-        print(f"Adding {NUM_CARTS} carts...", end='')
-        all_carts = [CartFactory() for _ in range(NUM_CARTS)]
-        print('DONE')
-
-        # CartItems data
-        print(f"Adding cart items...", end='')
-        all_cart_items = list()
-        for cart in all_carts:
-            products = random.sample(all_products, random.randint(1, 10))
-            for product in products:
-                cart_item = CartItemFactory(
-                    cart_id=cart.id,
-                    product_id=product.id,
-                )
-                all_cart_items.append(cart_item)
-        print('DONE')
+    def reset_sequences(self):
+        # Rows were inserted with explicit ids; databases with sequences (PostgreSQL) must catch up.
+        statements = connection.ops.sequence_reset_sql(no_style(), [Category, Discount, Product, Order,
+                                                                     get_user_model(), Customer])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_products_count(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+    products_count = Subquery(
+        Product.objects.filter(category_id=OuterRef('pk'))
+        .order_by()
+        .values('category_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Category.objects.update(products_count=Coalesce(products_count, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_products_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:02
+
+from django.db import migrations
+
+FULLTEXT_INDEXES = [
+    ('store_product', 'product_name_fulltext', 'name'),
+    ('store_category', 'category_title_fulltext', 'title'),
+]
+
+
+def add_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, index_name, column in FULLTEXT_INDEXES:
+        schema_editor.execute(f'ALTER TABLE `{table}` ADD FULLTEXT INDEX `{index_name}` (`{column}`)')
+
+
+def remove_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, index_name, column in FULLTEXT_INDEXES:
+        schema_editor.execute(f'ALTER TABLE `{table}` DROP INDEX `{index_name}`')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_category_products_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_indexes, remove_fulltext_indexes),
+    ]
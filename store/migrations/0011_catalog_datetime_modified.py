@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_product_search_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='datetime_modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='datetime_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
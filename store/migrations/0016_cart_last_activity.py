@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_job_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['last_activity'], name='cart_last_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_approved_comments_count(apps, schema_editor):
+    Comment = apps.get_model('store', 'Comment')
+    Product = apps.get_model('store', 'Product')
+    approved_comments_count = Subquery(
+        Comment.objects.filter(product_id=OuterRef('pk'), status='a')
+        .order_by()
+        .values('product_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Product.objects.update(approved_comments_count=Coalesce(approved_comments_count, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_cart_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='approved_comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['product', 'status', 'datetime_created'], name='comment_product_status_idx'),
+        ),
+        migrations.RunPython(populate_approved_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_comment_status_index_approved_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['datetime_created', 'id'], name='order_created_id_idx'),
+        ),
+    ]
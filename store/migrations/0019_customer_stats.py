@@ -0,0 +1,75 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:45
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_customer_stats(apps, schema_editor):
+    # Order.total_amount is only filled by `manage.py backfill_order_totals`, which may not have run yet,
+    # so paid totals are summed from the order items. One UPDATE per batch of customers keeps each short.
+    Customer = apps.get_model('store', 'Customer')
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    orders = Order.objects.filter(customer_id=OuterRef('pk')).order_by().values('customer_id')
+    paid_items = (
+        OrderItem.objects
+        .filter(order__customer_id=OuterRef('pk'), order__status='p')
+        .order_by()
+        .values('order__customer_id')
+    )
+    stats = {
+        'orders_count': Coalesce(Subquery(orders.annotate(count=Count('id')).values('count')), 0),
+        'paid_total': Coalesce(
+            Subquery(paid_items.annotate(total=Sum(F('quantity') * F('unit_price'))).values('total')),
+            Decimal(0),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+        'last_order_at': Subquery(orders.annotate(last=Max('datetime_created')).values('last')),
+    }
+    customer_ids = Customer.objects.order_by('pk').values_list('pk', flat=True)
+    last_id = 0
+    while batch := list(customer_ids.filter(pk__gt=last_id)[:1000]):
+        Customer.objects.filter(pk__in=batch).update(**stats)
+        last_id = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_order_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='orders_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='paid_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        # Before the indexes, so they are built once from the populated rows.
+        migrations.RunPython(populate_customer_stats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['orders_count', 'id'], name='customer_orders_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['paid_total', 'id'], name='customer_paid_total_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_order_at', 'id'], name='customer_last_order_at_id_idx'),
+        ),
+    ]
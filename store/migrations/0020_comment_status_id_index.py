@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_customer_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['status', 'id'], name='comment_status_id_idx'),
+        ),
+    ]
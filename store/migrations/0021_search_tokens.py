@@ -0,0 +1,70 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:14
+
+import re
+from itertools import islice
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return {token.lower()[:64] for token in TOKEN_RE.findall(text or '')}
+
+
+def populate_search_tokens(apps, schema_editor):
+    # MySQL searches its FULLTEXT indexes unless STORE_SEARCH_BACKEND says otherwise; rebuild_search_index
+    # fills the tables there when it does.
+    if schema_editor.connection.vendor == 'mysql':
+        return
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+    CategorySearchToken = apps.get_model('store', 'CategorySearchToken')
+    ProductSearchToken = apps.get_model('store', 'ProductSearchToken')
+    tokens = [
+        (CategorySearchToken(token=token, category_id=category.pk)
+         for category in Category.objects.only('id', 'title').iterator(chunk_size=2000)
+         for token in tokenize(category.title)),
+        (ProductSearchToken(token=token, product_id=product.pk)
+         for product in Product.objects.only('id', 'name').iterator(chunk_size=2000)
+         for token in tokenize(product.name)),
+    ]
+    for model, rows in zip([CategorySearchToken, ProductSearchToken], tokens):
+        while batch := list(islice(rows, 2000)):
+            model.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_comment_status_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategorySearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.category')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productsearchtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'product'), name='product_search_token_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='categorysearchtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'category'), name='category_search_token_key'),
+        ),
+        migrations.RunPython(populate_search_tokens, migrations.RunPython.noop),
+    ]
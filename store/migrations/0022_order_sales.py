@@ -0,0 +1,42 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+RECORD_SALES_RECEIVER = 'store.signals.handelers.record_sales_on_order_create'
+
+
+def populate_order_sales(apps, schema_editor):
+    # The rollups count every order but those whose order_create job is still pending, or failed.
+    Job = apps.get_model('store', 'Job')
+    Order = apps.get_model('store', 'Order')
+    OrderSales = apps.get_model('store', 'OrderSales')
+    uncounted = {
+        payload['order']['pk']
+        for payload in Job.objects.filter(receiver=RECORD_SALES_RECEIVER).values_list('payload', flat=True)
+    }
+    orders = Order.objects.order_by('pk').values_list('pk', 'status')
+    last_id = 0
+    while batch := list(orders.filter(pk__gt=last_id)[:2000]):
+        OrderSales.objects.bulk_create(
+            OrderSales(order_id=order_id, status=status) for order_id, status in batch if order_id not in uncounted
+        )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_search_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSales',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='store.order')),
+                ('status', models.CharField(choices=[('p', 'Paid'), ('u', 'Unpaid'), ('c', 'Canceled')], max_length=1)),
+            ],
+        ),
+        migrations.RunPython(populate_order_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_order_sales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('inventory__lt', 3)), fields=['id'], name='product_inventory_lt3_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(models.Q(('inventory__lt', 3), _negated=True), models.Q(('inventory__gt', 10), _negated=True)), fields=['id'], name='product_inventory_3_10_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('inventory__gt', 10)), fields=['id'], name='product_inventory_gt10_id_idx'),
+        ),
+    ]
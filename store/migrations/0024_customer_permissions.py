@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0023_product_inventory_status_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='customer',
+            options={'permissions': [('send_privet_email', 'can send email to user')]},
+        ),
+    ]
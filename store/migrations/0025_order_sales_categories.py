@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_customer_permissions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordersales',
+            name='categories',
+            field=models.JSONField(default=dict),
+        ),
+    ]
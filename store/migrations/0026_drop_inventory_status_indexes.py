@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:56
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0025_order_sales_categories'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_inventory_lt3_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_inventory_3_10_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_inventory_gt10_id_idx',
+        ),
+    ]
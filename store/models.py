@@ -1,13 +1,41 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 
 from uuid import uuid4
 
+from .db import bulk_upsert_increment
+
+
+class LoadedValuesMixin:
+    """
+    Remember the column values an instance was loaded with, so signal handlers can tell what a save changed.
+    Fields that were deferred when loading are reported as `DEFERRED`.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_loaded_value(self, field_name):
+        return getattr(self, '_loaded_values', {}).get(field_name, models.DEFERRED)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
 
 class Category(models.Model):
     title = models.CharField(max_length=255)
     description = models.CharField(max_length=500, blank=True)
     top_product = models.ForeignKey('Product', on_delete=models.SET_NULL, null=True, related_name='+')
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+    datetime_modified = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -18,7 +46,7 @@ class Discount(models.Model):
     description = models.CharField(max_length=255)
 
 
-class Product(models.Model):
+class Product(LoadedValuesMixin, models.Model):
     name = models.CharField(max_length=255)
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='products')
     slug = models.SlugField()
@@ -26,20 +54,52 @@ class Product(models.Model):
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     inventory = models.IntegerField()
     datetime_created = models.DateTimeField(auto_now_add=True)
-    datetime_modified = models.DateTimeField(auto_now=True)
+    datetime_modified = models.DateTimeField(auto_now=True, db_index=True)
     discounts = models.ManyToManyField(Discount, blank=True)
+    approved_comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f'{self.name}'
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            models.Index(fields=['unit_price', 'id'], name='product_unit_price_id_idx'),
+            models.Index(fields=['inventory', 'id'], name='product_inventory_id_idx'),
+        ]
+
+
+class ProductSearchToken(models.Model):
+    """A token of a product's name in the inverted index of store.search.InvertedIndexSearchBackend."""
+    token = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'product'], name='product_search_token_key'),
+        ]
+
+
+class CategorySearchToken(models.Model):
+    """A token of a category's title in the inverted index of store.search.InvertedIndexSearchBackend."""
+    token = models.CharField(max_length=64)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'category'], name='category_search_token_key'),
+        ]
 
 
 class Customer(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     phone_number = models.CharField(max_length=255)
     birth_date = models.DateField(null=True, blank=True)
+    # Lifetime stats, kept up to date by the order signal handlers (see store.analytics.rebuild_customer_stats).
+    orders_count = models.PositiveIntegerField(default=0, editable=False)
+    paid_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    last_order_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f'{self.user}'
@@ -48,6 +108,11 @@ class Customer(models.Model):
         permissions = [
             ('send_privet_email', 'can send email to user')
         ]
+        indexes = [
+            models.Index(fields=['orders_count', 'id'], name='customer_orders_count_id_idx'),
+            models.Index(fields=['paid_total', 'id'], name='customer_paid_total_id_idx'),
+            models.Index(fields=['last_order_at', 'id'], name='customer_last_order_at_id_idx'),
+        ]
 
 
 class Address(models.Model):
@@ -57,7 +122,25 @@ class Address(models.Model):
     street = models.CharField(max_length=255)
 
 
-class Order(models.Model):
+class OrderQuerySet(models.QuerySet):
+    def recalculate_totals(self):
+        """Recompute the stored `total_amount` and `items_count` of these orders from their items, in one UPDATE."""
+        items = OrderItem.objects.filter(order_id=models.OuterRef('pk')).order_by().values('order_id')
+        return self.update(
+            total_amount=Coalesce(
+                models.Subquery(items.annotate(total=models.Sum(models.F('quantity') * models.F('unit_price')))
+                                .values('total')),
+                Decimal(0),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            items_count=Coalesce(models.Subquery(items.annotate(count=models.Count('id')).values('count')), 0),
+        )
+
+
+OrderManager = models.Manager.from_queryset(OrderQuerySet)
+
+
+class Order(LoadedValuesMixin, models.Model):
     ORDER_STATUS_PAID = 'p'
     ORDER_STATUS_UNPAID = 'u'
     ORDER_STATUS_CANCELED = 'c'
@@ -70,6 +153,23 @@ class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='orders')
     datetime_created = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=1, choices=ORDER_STATUS, default=ORDER_STATUS_UNPAID)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    items_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = OrderManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'datetime_created'], name='order_customer_created_idx'),
+            models.Index(fields=['status', 'datetime_created'], name='order_status_created_idx'),
+            models.Index(fields=['total_amount', 'id'], name='order_total_amount_id_idx'),
+            # Admin changelist order: -datetime_created with -pk as tiebreaker.
+            models.Index(fields=['datetime_created', 'id'], name='order_created_id_idx'),
+        ]
+
+    def recalculate_totals(self):
+        Order.objects.filter(pk=self.pk).recalculate_totals()
+        self.refresh_from_db(fields=['total_amount', 'items_count'])
 
 
 class OrderItem(models.Model):
@@ -82,7 +182,7 @@ class OrderItem(models.Model):
         unique_together = [['order', 'product']]
 
 
-class Comment(models.Model):
+class Comment(LoadedValuesMixin, models.Model):
     COMMENT_STATUS_WAITING = 'w'
     COMMENT_STATUS_APPROVED = 'a'
     COMMENT_STATUS_NOT_APPROVED = 'na'
@@ -98,16 +198,166 @@ class Comment(models.Model):
     datetime_created = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=2, choices=COMMENT_STATUS, default=COMMENT_STATUS_WAITING)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'status', 'datetime_created'], name='comment_product_status_idx'),
+            # The admin's moderation queue: comments of one status, newest first.
+            models.Index(fields=['status', 'id'], name='comment_status_id_idx'),
+        ]
+
+
+class CartQuerySet(models.QuerySet):
+    def touch(self):
+        """Record activity on the carts, which pushes back their expiry (see `manage.py delete_expired_carts`)."""
+        return self.update(last_activity=timezone.now())
+
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    last_activity = models.DateTimeField(default=timezone.now)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_activity'], name='cart_last_activity_idx'),
+        ]
+
+
+class CartItemManager(models.Manager):
+    def add_quantities(self, cart_id, lines):
+        """
+        Add `(product_id, quantity)` lines to a cart in one upsert, summing onto existing items up to
+        CartItem.MAX_QUANTITY, and record activity on the cart. Return the `(id, product_id, quantity)`
+        of the stored items, or None when there is no cart `cart_id`.
+        """
+        lines = list(lines)
+        with transaction.atomic(using=self.db):
+            # Touching the cart first locks its row, so it cannot be deleted before the items are in.
+            if not Cart.objects.using(self.db).filter(pk=cart_id).touch():
+                return None
+            fields = ['id', 'product_id', 'quantity']
+            stored = bulk_upsert_increment(
+                self.model,
+                [{'cart_id': cart_id, 'product_id': product_id, 'quantity': quantity} for product_id, quantity in lines],
+                unique_fields=['cart_id', 'product_id'],
+                increment_fields=['quantity'],
+                using=self.db,
+                max_values={'quantity': self.model.MAX_QUANTITY},
+                returning=fields,
+            )
+            if stored is None:
+                # No INSERT ... RETURNING (MySQL): read the items back by their unique key.
+                stored = list(self.filter(cart_id=cart_id, product_id__in=[product_id for product_id, _ in lines])
+                              .values_list(*fields))
+        return stored
 
 
 class CartItem(models.Model):
+    # The largest quantity a PositiveSmallIntegerField holds on every backend.
+    MAX_QUANTITY = 32767
+
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
     quantity = models.PositiveSmallIntegerField()
 
+    objects = CartItemManager()
+
     class Meta:
         unique_together = [['cart', 'product']]
+
+
+class SalesRollupManager(models.Manager):
+    def add_sales(self, rows):
+        """Add the `units` and `revenue` of `rows` onto the stored rollup rows, creating missing ones, in one upsert."""
+        bulk_upsert_increment(
+            self.model,
+            rows,
+            unique_fields=self.model.rollup_key,
+            increment_fields=['units', 'revenue'],
+            using=self.db,
+        )
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    status = models.CharField(max_length=1, choices=Order.ORDER_STATUS)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    rollup_key = ['date', 'status', 'product_id']
+
+    objects = SalesRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status', 'product'], name='daily_product_sales_key'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'date'], name='daily_product_sales_idx'),
+        ]
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    status = models.CharField(max_length=1, choices=Order.ORDER_STATUS)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    rollup_key = ['date', 'status', 'category_id']
+
+    objects = SalesRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status', 'category'], name='daily_category_sales_key'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'date'], name='daily_category_sales_idx'),
+        ]
+
+
+class OrderSales(models.Model):
+    """
+    The status the items of an order are counted under in the daily sales rollups; orders without a
+    row are not counted yet. Kept apart from Order so saving a stale Order instance cannot overwrite it.
+    `categories` maps the id of each product of the order to the category its sales were counted in,
+    so they are taken out of that category even if the product moved since.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    status = models.CharField(max_length=1, choices=Order.ORDER_STATUS)
+    categories = models.JSONField(default=dict)
+
+
+class Job(models.Model):
+    """
+    An outbox row: one call of `receiver` for a signal sent with `payload` as its keyword arguments.
+    Pending jobs are claimed once `run_after` has passed; succeeded jobs are deleted.
+    """
+    STATUS_PENDING = 'p'
+    STATUS_FAILED = 'f'
+    STATUS = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    signal = models.CharField(max_length=255)
+    sender = models.CharField(max_length=255)
+    receiver = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=1, choices=STATUS, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    datetime_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return self.receiver
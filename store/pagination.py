@@ -1,5 +1,324 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import F, Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 10
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Return the row count the database keeps in its table statistics for `model`,
+    or None when the backend has no estimate (e.g. SQLite before an ANALYZE).
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 only exists once ANALYZE has run; every row of a table starts with its row count.
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            except DatabaseError:
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin changelist paginator that takes the row count of an unfiltered changelist from the table
+    statistics (see estimated_row_count()) once they estimate STORE_ADMIN_ESTIMATED_COUNT_THRESHOLD
+    rows or more, instead of running COUNT(*) over the whole table. Smaller tables and filtered or
+    searched changelists are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            threshold = getattr(settings, 'STORE_ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000)
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        return super().count
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over one of the view's `ordering_fields` with `id` as a tiebreaker.
+
+    Each page is fetched with `WHERE (field, id) > (last_value, last_id) ORDER BY field, id LIMIT n`,
+    so no OFFSET scan is needed and page N costs the same as page 1. Cursors are opaque base64 tokens.
+    The total count is only computed when asked for with `?count=exact` (cached) or `?count=estimate`.
+    """
+    page_size = 10
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering_param = api_settings.ORDERING_PARAM
+    default_ordering = 'id'
+    tiebreaker = 'id'
+    # Ordering fields that may be NULL; NULL sorts below every value.
+    nullable_ordering_fields = []
+    count_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.prepare(queryset, request, view)
+        self.count = self.get_count(queryset, request)
+        page_queryset = page_queryset[:self.page_size + 1]
+        fetch_rows = getattr(view, 'fetch_rows', None)
+        # Views may evaluate the page into something else than model instances, e.g. compiled serializer rows.
+        return self.set_page(list(page_queryset) if fetch_rows is None else fetch_rows(page_queryset, self.row_fields))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.prepare(queryset, request, view)
+        self.count = await self.aget_count(queryset, request)
+        page_queryset = page_queryset[:self.page_size + 1]
+        afetch_rows = getattr(view, 'afetch_rows', None)
+        if afetch_rows is None:
+            return self.set_page([item async for item in page_queryset])
+        return self.set_page(await afetch_rows(page_queryset, self.row_fields))
+
+    def prepare(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        return self.get_page_queryset(queryset)
+
+    @property
+    def row_fields(self):
+        """The fields the cursors are read from."""
+        field_name, _ = self.split_ordering(self.ordering)
+        return tuple(dict.fromkeys([field_name, self.tiebreaker]))
+
+    def set_page(self, results):
+        """Keep the page out of the `page_size + 1` rows fetched; the extra row only tells if there is more."""
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.cursor is not None and self.cursor['r']:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = results
+        return results
+
+    def get_ordering(self, request, queryset, view):
+        ordering_fields = getattr(view, 'ordering_fields', None) or []
+        field_name, descending = self.split_ordering(request.query_params.get(self.ordering_param, ''))
+        if field_name in ordering_fields:
+            return ('-' if descending else '') + field_name
+        # Otherwise keep the order a filter backend chose, e.g. search relevance.
+        if queryset.query.order_by:
+            field_name, descending = self.split_ordering(queryset.query.order_by[0])
+            if field_name in ordering_fields or field_name in queryset.query.annotations:
+                return ('-' if descending else '') + field_name
+        return self.default_ordering
+
+    @staticmethod
+    def split_ordering(ordering):
+        term = ordering.split(',')[0].strip()
+        return term.lstrip('-'), term.startswith('-')
+
+    def get_page_queryset(self, queryset):
+        field_name, descending = self.split_ordering(self.ordering)
+        # Walking backwards is the same seek with every direction flipped; results are reversed afterwards.
+        if self.cursor is not None and self.cursor['r']:
+            descending = not descending
+        prefix = '-' if descending else ''
+        lookup = 'lt' if descending else 'gt'
+        nullable = field_name in self.nullable_ordering_fields
+
+        if field_name == self.tiebreaker:
+            queryset = queryset.order_by(prefix + self.tiebreaker)
+        elif nullable:
+            # NULL sorts below every value, as MySQL orders it by default (so its index is still read in order).
+            order = F(field_name).desc(nulls_last=True) if descending else F(field_name).asc(nulls_first=True)
+            queryset = queryset.order_by(order, prefix + self.tiebreaker)
+        else:
+            queryset = queryset.order_by(prefix + field_name, prefix + self.tiebreaker)
+
+        if self.cursor is None:
+            return queryset
+
+        last_id = self.cursor['i']
+        if field_name == self.tiebreaker:
+            return queryset.filter(**{f'{self.tiebreaker}__{lookup}': last_id})
+
+        if nullable and self.cursor['v'] is None:
+            seek = Q(**{f'{field_name}__isnull': True, f'{self.tiebreaker}__{lookup}': last_id})
+            if not descending:
+                seek |= Q(**{f'{field_name}__isnull': False})
+            return queryset.filter(seek)
+
+        last_value = self.to_python(queryset, field_name, self.cursor['v'])
+        seek = (
+            Q(**{f'{field_name}__{lookup}': last_value})
+            | Q(**{field_name: last_value, f'{self.tiebreaker}__{lookup}': last_id})
+        )
+        if nullable and descending:
+            seek |= Q(**{f'{field_name}__isnull': True})
+        return queryset.filter(seek)
+
+    def to_python(self, queryset, field_name, value):
+        if field_name in queryset.query.annotations:
+            field = queryset.query.annotations[field_name].output_field
+        else:
+            try:
+                field = queryset.model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                raise NotFound('Invalid cursor')
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            raise NotFound('Invalid cursor')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            cursor = {'o': str(cursor['o']), 'v': cursor['v'], 'i': int(cursor['i']), 'r': bool(cursor['r'])}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound('Invalid cursor')
+        # A cursor only makes sense for the ordering it was issued for.
+        if cursor['o'] != self.ordering:
+            raise NotFound('Invalid cursor')
+        return cursor
+
+    def encode_cursor(self, item, reverse):
+        field_name, _ = self.split_ordering(self.ordering)
+        value = getattr(item, field_name)
+        cursor = {
+            'o': self.ordering,
+            'v': None if value is None else str(value),
+            'i': getattr(item, self.tiebreaker),
+            'r': reverse,
+        }
+        encoded = b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'estimate' and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None:
+                return estimate
+        if mode in ('exact', 'estimate'):
+            return self.get_cached_count(queryset)
+        return None
+
+    async def aget_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'estimate' and not queryset.query.where:
+            estimate = await sync_to_async(estimated_row_count)(queryset.model, queryset.db)
+            if estimate is not None:
+                return estimate
+        if mode in ('exact', 'estimate'):
+            key = self.get_count_cache_key(queryset)
+            count = await cache.aget(key)
+            if count is None:
+                count = await queryset.acount()
+                await cache.aset(key, count, self.count_cache_timeout)
+            return count
+        return None
+
+    def get_cached_count(self, queryset):
+        return cache.get_or_set(self.get_count_cache_key(queryset), queryset.count, self.count_cache_timeout)
+
+    @staticmethod
+    def get_count_cache_key(queryset):
+        sql, params = queryset.order_by().query.sql_with_params()
+        digest = hashlib.md5(f'{sql}{params!r}'.encode('utf-8')).hexdigest()
+        return f'store:count:{digest}'
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                    'example': 123,
+                },
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'previous': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+
+class OrderPagination(KeysetPagination):
+    default_ordering = '-datetime_created'
+
+
+class CommentPagination(KeysetPagination):
+    # Newest first, read backwards off the (product, status, datetime_created) index.
+    default_ordering = '-datetime_created'
+
+
+class CustomerPagination(KeysetPagination):
+    # Customers without orders have no `last_order_at`: they come last in `-last_order_at`, first in `last_order_at`.
+    nullable_ordering_fields = ['last_order_at']
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.db import OperationalError
+
+DEFAULT_POOL_OPTIONS = {
+    # Connections open at once, in use and idle; checkouts beyond it wait for a release.
+    'max_size': 10,
+    # Seconds a checkout waits for a connection before giving up with PoolTimeout.
+    'timeout': 5,
+    # Seconds an idle connection is kept; older ones are closed at the next checkout or release.
+    'max_idle': 300,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded pool of DB-API connections shared by the threads of one process.
+
+    `acquire()` hands out the most recently released idle connection that passes `check`, or opens one
+    with `connect` while fewer than `max_size` are open; otherwise it waits up to `timeout` seconds for a
+    release. Idle connections unused for `max_idle` seconds are closed. The counters of stats() are the
+    pool's since it was created, i.e. per worker process.
+    """
+
+    def __init__(self, check, max_size=10, timeout=5, max_idle=300):
+        self.check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.in_use = 0
+        self.created = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.evicted = 0
+        self.failed_checks = 0
+
+    def acquire(self, connect):
+        """A connection for exclusive use until it is released; `connect()` opens new ones."""
+        start = time.monotonic()
+        waited = False
+        stale = []
+        with self.condition:
+            while True:
+                stale += self.take_stale(time.monotonic())
+                if self.idle or self.in_use + len(self.idle) < self.max_size:
+                    break
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f'No database connection was released within {self.timeout}s '
+                                      f'({self.max_size} in use).')
+                waited = True
+                self.condition.wait(remaining)
+            connection = self.idle.pop()[0] if self.idle else None
+            self.in_use += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += time.monotonic() - start
+        close_all(stale)
+
+        try:
+            if connection is not None and not self.check(connection):
+                with self.condition:
+                    self.failed_checks += 1
+                close_all([connection])
+                connection = None
+            if connection is None:
+                connection = connect()
+                with self.condition:
+                    self.created += 1
+        except BaseException:
+            with self.condition:
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+        return connection
+
+    def release(self, connection, reusable=True):
+        """Return `connection` to the pool, or close it if it is not `reusable` in its current state."""
+        with self.condition:
+            self.in_use -= 1
+            if reusable:
+                self.idle.append((connection, time.monotonic()))
+            stale = self.take_stale(time.monotonic())
+            self.condition.notify()
+        close_all(stale if reusable else [*stale, connection])
+
+    def take_stale(self, now):
+        """Remove and return the idle connections past `max_idle`; the oldest are on the left."""
+        stale = []
+        while self.idle and now - self.idle[0][1] > self.max_idle:
+            stale.append(self.idle.popleft()[0])
+        self.evicted += len(stale)
+        return stale
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = self.idle, deque()
+        close_all(connection for connection, _ in idle)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'created': self.created,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 2),
+                'timeouts': self.timeouts,
+                'evicted': self.evicted,
+                'failed_checks': self.failed_checks,
+            }
+
+
+def close_all(connections):
+    for connection in connections:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_pool(wrapper):
+    """The pool of the database `wrapper` is a connection to, created on first use in each process."""
+    with _pools_lock:
+        pool = _pools.get(wrapper.alias)
+        # Connections are not shared with forked workers; each process opens its own.
+        if pool is None or pool.pid != os.getpid():
+            options = {**DEFAULT_POOL_OPTIONS, **get_pool_options(wrapper.settings_dict)}
+            pool = _pools[wrapper.alias] = ConnectionPool(wrapper.check_pooled_connection, **options)
+        return pool
+
+
+def get_pool_options(settings_dict):
+    """`OPTIONS['pool']` of a database: True or a dict of DEFAULT_POOL_OPTIONS to override pools it."""
+    options = settings_dict['OPTIONS'].get('pool')
+    if not options:
+        return None
+    return {} if options is True else options
+
+
+def reset_pool(alias):
+    """Close the idle connections of the pool of `alias` in this process and start its next one afresh."""
+    with _pools_lock:
+        pool = _pools.pop(alias, None)
+    if pool is not None and pool.pid == os.getpid():
+        pool.close()
+
+
+def pool_stats():
+    """`{alias: stats}` of the pools of this process."""
+    with _pools_lock:
+        pools = [(alias, pool) for alias, pool in _pools.items() if pool.pid == os.getpid()]
+    return {alias: pool.stats() for alias, pool in pools}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Makes a DatabaseWrapper check connections out of a ConnectionPool when its `OPTIONS['pool']` is set:
+    closing the connection, e.g. at the end of each request with the default CONN_MAX_AGE of 0,
+    returns it to the pool instead. Backends define `check_pooled_connection(connection)`, the health
+    check run on every checkout. See store.backends.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        if get_pool_options(self.settings_dict) is None:
+            return super().get_new_connection(conn_params)
+        return get_pool(self).acquire(partial(super().get_new_connection, conn_params))
+
+    def _close(self):
+        if self.connection is None or get_pool_options(self.settings_dict) is None:
+            return super()._close()
+        # Closed inside an atomic block, the wrapper keeps the connection until the block exits.
+        reusable = not self.in_atomic_block and self.reset_pooled_connection()
+        get_pool(self).release(self.connection, reusable)
+
+    def reset_pooled_connection(self):
+        """Roll back what a connection closed mid-transaction left open; whether it can be reused."""
+        if self.autocommit:
+            return True
+        try:
+            self.connection.rollback()
+        except Exception:
+            return False
+        return True
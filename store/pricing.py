@@ -0,0 +1,129 @@
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Product
+from .replicas import cache_timeout
+
+DOLLARS_TO_RIALS = 50000
+TAX_MULTIPLIER = Decimal(1.5)
+CENT = Decimal('0.01')
+ZERO = Decimal(0)
+PRICE_CACHE_TIMEOUT = getattr(settings, 'STORE_PRICE_CACHE_TIMEOUT', 3600)
+
+Price = namedtuple('Price', ['unit_price', 'discount', 'discounted_price', 'price_after_tax', 'price_rials'])
+
+
+def price_cache_key(product_id):
+    return f'store:price:{product_id}'
+
+
+def discount_rates_queryset(product_ids):
+    """`(product_id, rate)` of the largest discount of each of `product_ids` that has one, in one query."""
+    return (
+        Product.discounts.through.objects
+        .filter(product_id__in=product_ids)
+        .values('product_id')
+        .annotate(rate=Max('discount__discount'))
+        .values_list('product_id', 'rate')
+    )
+
+
+def get_discount_rates(product_ids):
+    return {product_id: Decimal(str(rate)) for product_id, rate in discount_rates_queryset(product_ids)}
+
+
+async def aget_discount_rates(product_ids):
+    return {product_id: Decimal(str(rate)) async for product_id, rate in discount_rates_queryset(product_ids)}
+
+
+def compute_prices(unit_prices, rates):
+    """
+    Effective prices of `{product_id: unit_price}` given their discount `rates`: the discounted price
+    rounded to the cent, then tax and the rial price from it. Each step runs over the whole page.
+    """
+    product_ids = list(unit_prices)
+    prices = [unit_prices[product_id] for product_id in product_ids]
+    discounts = [rates.get(product_id, ZERO) for product_id in product_ids]
+    discounted = [
+        price if not discount else (price - price * discount).quantize(CENT, ROUND_HALF_UP)
+        for price, discount in zip(prices, discounts)
+    ]
+    after_tax = [round(price * TAX_MULTIPLIER, 2) for price in discounted]
+    rials = [int(price * DOLLARS_TO_RIALS) for price in discounted]
+    return {
+        product_id: Price(*values)
+        for product_id, *values in zip(product_ids, prices, discounts, discounted, after_tax, rials)
+    }
+
+
+def invalidate_prices(product_ids):
+    """Drop the cached prices of `product_ids` once the current transaction commits."""
+    keys = [price_cache_key(product_id) for product_id in product_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class PriceList:
+    """
+    Effective prices (largest discount, tax, rials) of the products a response renders, loaded a page
+    at a time: `load()` reads the cached prices of the page with one cache round trip and fetches the
+    discounts of the others with one query. A cached price keeps the unit price it was computed from,
+    so a price change is a miss; discount changes drop the prices of their products (see
+    store.signals.handelers). Looking up a product that was not loaded loads it alone.
+    """
+
+    def __init__(self):
+        self.prices = {}
+
+    def __getitem__(self, product):
+        if product.id not in self.prices:
+            self.load([product])
+        return self.prices[product.id]
+
+    def load(self, products):
+        unit_prices = self.get_missing(products)
+        if not unit_prices:
+            return
+        keys = [price_cache_key(product_id) for product_id in unit_prices]
+        unit_prices = self.add_cached(unit_prices, cache.get_many(keys))
+        if unit_prices:
+            computed = compute_prices(unit_prices, get_discount_rates(list(unit_prices)))
+            cache.set_many(self.add_computed(computed), cache_timeout(PRICE_CACHE_TIMEOUT))
+
+    async def aload(self, products):
+        unit_prices = self.get_missing(products)
+        if not unit_prices:
+            return
+        keys = [price_cache_key(product_id) for product_id in unit_prices]
+        unit_prices = self.add_cached(unit_prices, await cache.aget_many(keys))
+        if unit_prices:
+            computed = compute_prices(unit_prices, await aget_discount_rates(list(unit_prices)))
+            await cache.aset_many(self.add_computed(computed), cache_timeout(PRICE_CACHE_TIMEOUT))
+
+    def get_missing(self, products):
+        return {product.id: product.unit_price for product in products if product.id not in self.prices}
+
+    def add_cached(self, unit_prices, cached):
+        """Keep the cached prices that are still current; return the unit prices left to compute."""
+        missing = {}
+        for product_id, unit_price in unit_prices.items():
+            price = cached.get(price_cache_key(product_id))
+            if price is not None and price.unit_price == unit_price:
+                self.prices[product_id] = price
+            else:
+                missing[product_id] = unit_price
+        return missing
+
+    def add_computed(self, computed):
+        self.prices.update(computed)
+        return {price_cache_key(product_id): price for product_id, price in computed.items()}
+
+
+def get_price_list(context):
+    """The PriceList shared by the serializers rendering one response."""
+    return context.setdefault('price_list', PriceList())
@@ -0,0 +1,156 @@
+import hashlib
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY_COOKIE = 'store_primary_until'
+
+
+@dataclass
+class ReadRouting:
+    """Where the reads of one request go: `replica` is the alias of its replica, None for the primary."""
+    replica: str = None
+
+
+_routing = ContextVar('store_read_routing', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'STORE_DATABASE_REPLICAS', []))
+
+
+def get_sticky_seconds():
+    return getattr(settings, 'STORE_REPLICA_STICKY_SECONDS', 10)
+
+
+def reading_from_replica():
+    routing = _routing.get()
+    return routing is not None and routing.replica is not None
+
+
+def cache_timeout(timeout):
+    """
+    `timeout` capped at the sticky window while reading from a replica: a payload a lagging replica
+    served after a write invalidated it stays cached no longer than the writer reads the primary.
+    """
+    return min(timeout, get_sticky_seconds()) if reading_from_replica() else timeout
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of store models to the replica ReplicaReadMiddleware picked for the request, and
+    everything else to the primary (`default`). Outside such requests (admin, commands, writes) it
+    leaves routing to Django. Once a request writes, its later reads go to the primary too.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and routing.replica is not None and model._meta.app_label == 'store':
+            return routing.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.replica = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMiddleware:
+    """
+    Picks a replica of `STORE_DATABASE_REPLICAS` for the safe-method requests of the store viewsets,
+    whose reads ReplicaRouter then sends there.
+
+    Clients read their writes: the response to any other method pins the client to the primary for
+    `STORE_REPLICA_STICKY_SECONDS`, with a cookie and, for requests with credentials, a cache entry
+    keyed by a hash of the Authorization header, for API clients that do not keep cookies.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _routing.set(ReadRouting())
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if self.is_write(request):
+            key = self.pin(request, response)
+            if key:
+                cache.set(key, True, get_sticky_seconds())
+        return response
+
+    async def __acall__(self, request):
+        token = _routing.set(ReadRouting())
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if self.is_write(request):
+            key = self.pin(request, response)
+            if key:
+                await cache.aset(key, True, get_sticky_seconds())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        replicas = get_replicas()
+        if routing is None or not replicas or request.method not in SAFE_METHODS:
+            return None
+        if is_store_viewset(view_func) and not self.is_pinned(request):
+            routing.replica = random.choice(replicas)
+        return None
+
+    @staticmethod
+    def is_write(request):
+        return request.method not in SAFE_METHODS and bool(get_replicas()) and get_sticky_seconds() > 0
+
+    def is_pinned(self, request):
+        try:
+            if float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time():
+                return True
+        except ValueError:
+            pass
+        key = self.pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def pin(self, request, response):
+        """Set the pinning cookie on `response`; return the cache key to pin the credentials under, if any."""
+        seconds = get_sticky_seconds()
+        response.set_cookie(PRIMARY_COOKIE, str(int(time.time() + seconds)), max_age=seconds, httponly=True,
+                            samesite='Lax')
+        return self.pin_key(request)
+
+    @staticmethod
+    def pin_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return f'store:primary:{hashlib.sha256(authorization.encode()).hexdigest()}'
+
+
+def is_store_viewset(view_func):
+    """Whether `view_func` serves a viewset of the store app, directly or through an AsyncViewSetView."""
+    view_func = getattr(view_func, 'view_initkwargs', {}).get('sync_view', view_func)
+    view_class = getattr(view_func, 'cls', None)
+    return view_class is not None and view_class.__module__.split('.')[0] == 'store'
@@ -0,0 +1,205 @@
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, ExpressionWrapper, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .models import Category, CategorySearchToken, Product, ProductSearchToken
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TOKEN_LENGTH = ProductSearchToken._meta.get_field('token').max_length
+
+
+def tokenize(text):
+    return {token.lower()[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall(text or '')}
+
+
+class BaseSearchBackend:
+    """
+    A product search backend filters a product queryset down to the matches of a search string and
+    annotates every match with a `search_rank` (higher is more relevant).
+
+    The index hooks are called by the product and category signal handlers: inside the transaction
+    of the change for `transactional` backends, whose index lives in the database, and once it has
+    committed for the others. Writes that skip the signals (bulk inserts, QuerySet.update()) reach the
+    index of backends that `needs_reindex` only through the hooks or rebuild().
+    """
+    rank_annotation = 'search_rank'
+    transactional = False
+    needs_reindex = True
+
+    def search(self, queryset, text):
+        raise NotImplementedError
+
+    def index_product(self, product):
+        pass
+
+    def index_products(self, products):
+        for product in products:
+            self.index_product(product)
+
+    def remove_product(self, product_id):
+        pass
+
+    def index_category(self, category):
+        pass
+
+    def remove_category(self, category_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class MySQLFullTextSearchBackend(BaseSearchBackend):
+    """
+    Uses the FULLTEXT indexes on `store_product.name` and `store_category.title`.
+    InnoDB maintains them on every write, so the index hooks are no-ops.
+    """
+    needs_reindex = False
+    fulltext_indexes = [
+        (Product, 'product_name_fulltext', 'name'),
+        (Category, 'category_title_fulltext', 'title'),
+    ]
+
+    def search(self, queryset, text):
+        quote_name = connections[queryset.db].ops.quote_name
+        name_rank = self.match(quote_name(Product._meta.db_table), 'name', text)
+        category_ids = list(
+            Category.objects.using(queryset.db)
+            .annotate(title_rank=self.match(quote_name(Category._meta.db_table), 'title', text))
+            .filter(title_rank__gt=0)
+            .values_list('pk', flat=True)
+        )
+        if not category_ids:
+            return queryset.annotate(**{self.rank_annotation: name_rank}).filter(**{f'{self.rank_annotation}__gt': 0})
+
+        # Products of a matching category rank above equally relevant name matches elsewhere.
+        category_rank = Case(When(category_id__in=category_ids, then=Value(1.0)), default=Value(0.0),
+                             output_field=FloatField())
+        return queryset.annotate(
+            name_rank=name_rank,
+            **{self.rank_annotation: name_rank + category_rank},
+        ).filter(Q(name_rank__gt=0) | Q(category_id__in=category_ids))
+
+    @staticmethod
+    def match(table, column, text):
+        return RawSQL(f'MATCH ({table}.`{column}`) AGAINST (%s IN NATURAL LANGUAGE MODE)', [text],
+                      output_field=FloatField())
+
+    def rebuild(self):
+        connection = connections[router.db_for_write(Product)]
+        with connection.cursor() as cursor:
+            for model, index_name, column in self.fulltext_indexes:
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f'ALTER TABLE {table} DROP INDEX `{index_name}`')
+                cursor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX `{index_name}` (`{column}`)')
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    A token -> product inverted index in two tables, ProductSearchToken and CategorySearchToken, for
+    databases without a full-text engine (SQLite, tests). It is written in the transaction of the
+    product or category change, so every process searches the same, committed index. Deleted products
+    and categories leave it with their rows, through the foreign key cascade.
+
+    A product scores `name_weight` for every search token in its name and `category_weight` for
+    every token in its category title. The statement has one subquery per table whatever the number
+    of matches: the scores are computed by the database, not passed to it.
+    """
+    transactional = True
+    name_weight = 2
+    category_weight = 1
+    rebuild_chunk_size = 2000
+
+    def search(self, queryset, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return queryset.none().annotate(**{self.rank_annotation: Value(0.0, output_field=FloatField())})
+        name_matches = ProductSearchToken.objects.using(queryset.db).filter(token__in=tokens).order_by()
+        title_matches = CategorySearchToken.objects.using(queryset.db).filter(token__in=tokens).order_by()
+        name_score = self.count(name_matches.filter(product_id=OuterRef('pk')), 'product_id')
+        title_score = self.count(title_matches.filter(category_id=OuterRef('category_id')), 'category_id')
+        rank = ExpressionWrapper(
+            Coalesce(name_score, 0) * self.name_weight + Coalesce(title_score, 0) * self.category_weight,
+            output_field=FloatField(),
+        )
+        return queryset.filter(
+            Q(pk__in=name_matches.values('product_id')) | Q(category_id__in=title_matches.values('category_id'))
+        ).annotate(**{self.rank_annotation: rank})
+
+    @staticmethod
+    def count(matches, group_by):
+        return Subquery(matches.values(group_by).annotate(matches=Count('id')).values('matches'))
+
+    def index_product(self, product):
+        self.index_products([product])
+
+    def index_products(self, products):
+        products = list(products)
+        ProductSearchToken.objects.filter(product_id__in=[product.pk for product in products]).delete()
+        ProductSearchToken.objects.bulk_create(
+            ProductSearchToken(token=token, product_id=product.pk)
+            for product in products
+            for token in tokenize(product.name)
+        )
+
+    def index_category(self, category):
+        CategorySearchToken.objects.filter(category_id=category.pk).delete()
+        CategorySearchToken.objects.bulk_create(
+            CategorySearchToken(token=token, category_id=category.pk) for token in tokenize(category.title)
+        )
+
+    def rebuild(self):
+        with transaction.atomic():
+            CategorySearchToken.objects.all().delete()
+            ProductSearchToken.objects.all().delete()
+            categories = Category.objects.only('id', 'title').iterator(chunk_size=self.rebuild_chunk_size)
+            self.bulk_create(CategorySearchToken(token=token, category_id=category.pk)
+                             for category in categories for token in tokenize(category.title))
+            products = Product.objects.only('id', 'name').iterator(chunk_size=self.rebuild_chunk_size)
+            self.bulk_create(ProductSearchToken(token=token, product_id=product.pk)
+                             for product in products for token in tokenize(product.name))
+
+    def bulk_create(self, tokens):
+        """Insert the `tokens` generator `rebuild_chunk_size` rows at a time, without holding them all in memory."""
+        while batch := list(islice(tokens, self.rebuild_chunk_size)):
+            type(batch[0]).objects.bulk_create(batch)
+
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Return the configured backend: `STORE_SEARCH_BACKEND` if set, otherwise FULLTEXT on MySQL and
+    the inverted index tables everywhere else.
+    """
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'STORE_SEARCH_BACKEND', None)
+        if backend_path:
+            _backend = import_string(backend_path)()
+        elif connections['default'].vendor == 'mysql':
+            _backend = MySQLFullTextSearchBackend()
+        else:
+            _backend = InvertedIndexSearchBackend()
+    return _backend
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """Filter backend for `?search=` that delegates to the configured search backend and orders by relevance."""
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        backend = get_search_backend()
+        return backend.search(queryset, text).order_by(f'-{backend.rank_annotation}', 'id')
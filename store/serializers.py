@@ -1,16 +1,33 @@
-from _decimal import Decimal
+from django.db.models import Manager
 from django.utils.text import slugify
 from rest_framework import serializers
-from django.db import transaction
+from rest_framework.exceptions import NotFound
 
+from .analytics import GROUP_BY_CATEGORY, GROUP_BY_DAY, GROUP_BY_PRODUCT
+from .checkout import CheckoutPipeline
 from .models import *
+from .pricing import get_price_list
 
-DOLLARS_TO_RIALS = 50000
+
+class PreloadListSerializer(serializers.ListSerializer):
+    """
+    Hands all instances to the child's `preload()` before rendering them, so what the rows need from
+    elsewhere (e.g. prices) is fetched once per list instead of once per row.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        self.child.preload(iterable)
+        return super().to_representation(iterable)
+
+    async def aload(self):
+        """Run the child's `apreload()` on the instances, for rendering from async views."""
+        await self.child.apreload(self.instance)
 
 
 class CategorySerializer(serializers.ModelSerializer):
     # nums_products = serializers.SerializerMethodField()
-    nums_products = serializers.IntegerField(source='products.count', read_only=True)
+    nums_products = serializers.IntegerField(source='products_count', read_only=True)
 
     class Meta:
         model = Category
@@ -22,22 +39,38 @@ class CategorySerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     title = serializers.CharField(max_length=255, source='name')
     price = serializers.DecimalField(max_digits=6, decimal_places=2, source='unit_price')
+    discount = serializers.SerializerMethodField()
+    discounted_price = serializers.SerializerMethodField()
     unit_price_after_tax = serializers.SerializerMethodField()
     price_rials = serializers.SerializerMethodField()
     category = serializers.HyperlinkedRelatedField(queryset=Category.objects.all(), view_name='category-detail')
+    comments_count = serializers.IntegerField(source='approved_comments_count', read_only=True)
 
     class Meta:
         model = Product
-        fields = ['id', 'title', 'price', 'inventory', 'category', 'unit_price_after_tax', 'price_rials']
+        fields = ['id', 'title', 'price', 'discount', 'discounted_price', 'inventory', 'category',
+                  'unit_price_after_tax', 'price_rials', 'comments_count']
+        list_serializer_class = PreloadListSerializer
+
+    def preload(self, products):
+        get_price_list(self.context).load(products)
+
+    async def apreload(self, products):
+        await get_price_list(self.context).aload(products)
+
+    def get_discount(self, product):
+        return get_price_list(self.context)[product].discount
+
+    def get_discounted_price(self, product):
+        return get_price_list(self.context)[product].discounted_price
 
     def get_unit_price_after_tax(self, product):
-        return round(product.unit_price * Decimal(1.5), 2)
+        return get_price_list(self.context)[product].price_after_tax
 
     def get_price_rials(self, product):
-        return int(product.unit_price * DOLLARS_TO_RIALS)
+        return get_price_list(self.context)[product].price_rials
 
     def validate(self, data):
-        print(data)
         if len(data['name']) < 6:
             raise serializers.ValidationError('Length is must be at least 6')
         return data
@@ -51,6 +84,24 @@ class ProductSerializer(serializers.ModelSerializer):
     # def update(self, instance, validated_data):  #     instance.inventory = 1  #     instance.save()  #     return instance
 
 
+class ProductImportSerializer(serializers.Serializer):
+    """
+    One row of a bulk product import (store.imports), with the field names of ProductSerializer.
+    Rows with an `id` update that product with the fields they have; the others create a product.
+    """
+    id = serializers.IntegerField(min_value=1, required=False)
+    title = serializers.CharField(max_length=255, source='name')
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, source='unit_price')
+    inventory = serializers.IntegerField()
+    category = serializers.IntegerField(min_value=1, source='category_id')
+    description = serializers.CharField(allow_blank=True, default='')
+
+    def validate_title(self, name):
+        if len(name) < 6:
+            raise serializers.ValidationError('Length is must be at least 6')
+        return name
+
+
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
@@ -61,10 +112,21 @@ class CommentSerializer(serializers.ModelSerializer):
         return Comment.objects.create(product_id=product_id, **validated_data)
 
 
+class CommentForAdminSerializer(CommentSerializer):
+    class Meta:
+        model = Comment
+        fields = ['id', 'name', 'body', 'status']
+
+
 class CartProductSerializer(serializers.ModelSerializer):
+    discounted_price = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
-        fields = ['id', 'name', 'unit_price']
+        fields = ['id', 'name', 'unit_price', 'discounted_price']
+
+    def get_discounted_price(self, product):
+        return get_price_list(self.context)[product].discounted_price
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -74,9 +136,16 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['id', 'product', 'quantity', 'item_total']
+        list_serializer_class = PreloadListSerializer
+
+    def preload(self, cart_items):
+        get_price_list(self.context).load(cart_item.product for cart_item in cart_items)
+
+    async def apreload(self, cart_items):
+        await get_price_list(self.context).aload(cart_item.product for cart_item in cart_items)
 
     def get_item_total(self, cart_item):
-        return cart_item.quantity * cart_item.product.unit_price
+        return cart_item.quantity * get_price_list(self.context)[cart_item.product].discounted_price
 
 
 class AddCartItemSerializer(serializers.ModelSerializer):
@@ -88,14 +157,42 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         cart_id = self.context['cart_pk']
         product = validated_data.get('product')
         quantity = validated_data.get('quantity')
-        try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product.id)
-            cart_item.quantity += quantity
-            cart_item.save()
-        except CartItem.DoesNotExist:
-            cart_item = CartItem.objects.create(cart_id=cart_id, **validated_data)
-        self.instance = cart_item
-        return cart_item
+        stored = CartItem.objects.add_quantities(cart_id, [(product.id, quantity)])
+        if stored is None:
+            raise NotFound('There is no cart with this cart id')
+        [(cart_item_id, _, quantity)] = stored
+        self.instance = CartItem(id=cart_item_id, cart_id=cart_id, product=product, quantity=quantity)
+        return self.instance
+
+
+class BulkAddCartItemListSerializer(serializers.ListSerializer):
+    def validate(self, lines):
+        product_ids = {line['product'] for line in lines}
+        existing_ids = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+        missing_ids = sorted(product_ids - existing_ids)
+        if missing_ids:
+            raise serializers.ValidationError(f'There is no product with id {missing_ids}')
+        return lines
+
+    def create(self, validated_data):
+        cart_id = self.context['cart_pk']
+        quantities = {}
+        for line in validated_data:
+            total = quantities.get(line['product'], 0) + line['quantity']
+            quantities[line['product']] = min(total, CartItem.MAX_QUANTITY)
+        stored = CartItem.objects.add_quantities(cart_id, quantities.items())
+        if stored is None:
+            raise NotFound('There is no cart with this cart id')
+        stored_quantities = {product_id: quantity for _, product_id, quantity in stored}
+        return [{'product': product_id, 'quantity': stored_quantities[product_id]} for product_id in quantities]
+
+
+class BulkAddCartItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=CartItem.MAX_QUANTITY)
+
+    class Meta:
+        list_serializer_class = BulkAddCartItemListSerializer
 
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
@@ -113,14 +210,22 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'items', 'total_price']
         read_only_fields = ['id']
 
+    def preload(self, carts):
+        get_price_list(self.context).load(item.product for cart in carts for item in cart.items.all())
+
+    async def apreload(self, carts):
+        await get_price_list(self.context).aload(item.product for cart in carts for item in cart.items.all())
+
     def get_total_price(self, cart):
-        return sum(item.quantity * item.product.unit_price for item in cart.items.all())
+        # `items` is rendered first and has loaded the prices of the cart's products.
+        prices = get_price_list(self.context)
+        return sum(item.quantity * prices[item.product].discounted_price for item in cart.items.all())
 
 
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
-        fields = ['id', 'user', 'phone_number', 'birth_date']
+        fields = ['id', 'user', 'phone_number', 'birth_date', 'orders_count', 'paid_total', 'last_order_at']
         read_only_fields = ['user', ]
 
 
@@ -156,6 +261,14 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'customer', 'datetime_created', 'status', 'items']
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    total_price = serializers.DecimalField(source='total_amount', max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'datetime_created', 'items_count', 'total_price']
+
+
 class OrderForAdminSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     customer = OrderCustomerSerializer()
@@ -174,37 +287,28 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
 class OrderCreateSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
-    def validated_cart_id(self, cart_id):
-        try:
-            if Cart.objects.prefetch_related('items').get(id=cart_id).items.count() == 0:
-                raise serializers.ValidationError('Your cart is empty')
-        except Cart.DoesNotExist:
-            raise serializers.ValidationError('There is no cart with this cart id')
-
-        return cart_id
-
     def save(self, **kwargs):
-        with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-            user_id = self.context['user_id']
-            customer = Customer.objects.get(user_id=user_id)
-
-            order = Order()
-            order.customer = customer
-            order.save()
-
-            cart_items = CartItem.objects.select_related('product').filter(cart_id=cart_id)
-
-            order_items = [
-                OrderItem(
-                    order=order,
-                    product=cart_item.product,
-                    unit_price=cart_item.product.unit_price,
-                    quantity=cart_item.quantity,
-                ) for cart_item in cart_items
-            ]
-
-            OrderItem.objects.bulk_create(order_items)
-            Cart.objects.get(pk=cart_id).delete()
-
-            return order
+        pipeline = CheckoutPipeline(
+            cart_id=self.validated_data['cart_id'],
+            user_id=self.context['user_id'],
+            customer_id=self.context.get('customer_id'),
+        )
+        self.instance = pipeline.run()
+        return self.instance
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    group_by = serializers.ChoiceField(choices=[GROUP_BY_DAY, GROUP_BY_PRODUCT, GROUP_BY_CATEGORY], default=GROUP_BY_DAY)
+    status = serializers.MultipleChoiceField(choices=Order.ORDER_STATUS, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+    def validate_status(self, status):
+        # Canceled orders are only reported when asked for.
+        return status or {Order.ORDER_STATUS_PAID, Order.ORDER_STATUS_UNPAID}
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'end': ['End date must not be before start date']})
+        return attrs
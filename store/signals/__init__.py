@@ -1,3 +1,28 @@
+from inspect import isfunction
+
 from django.dispatch import Signal
 
-order_create = Signal()
\ No newline at end of file
+
+class DeferredSignal(Signal):
+    """
+    A signal whose receivers can run outside the request that sends it. `send_deferred()` writes one
+    outbox job per live receiver in the current transaction, and the job workers call them once it
+    commits (see store.jobs). `name` is the dotted path the workers import the signal back from.
+    """
+
+    def __init__(self, name, use_caching=False):
+        super().__init__(use_caching=use_caching)
+        self.name = name
+
+    def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
+        # Jobs name their receiver by its dotted path, so only module-level functions can be imported back.
+        if not isfunction(receiver) or '.' in receiver.__qualname__:
+            raise ValueError(f'{receiver!r} cannot receive {self.name}: receivers must be module-level functions.')
+        super().connect(receiver, sender, weak, dispatch_uid)
+
+    def send_deferred(self, sender, **kwargs):
+        from store.jobs import enqueue_receivers
+        return enqueue_receivers(self, sender, **kwargs)
+
+
+order_create = DeferredSignal('store.signals.order_create')
@@ -1,11 +1,208 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import DEFERRED, F, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.conf import settings
 
-from store.models import Customer
+from store.models import Comment, Customer, Category, Discount, Order, Product
+from store.analytics import rebuild_customer_stats, sync_order_sales
+from store.cache import invalidate_cart_products
+from store.conditional import bump_generation
+from store.pricing import invalidate_prices
+from store.search import get_search_backend
+from store.signals import order_create
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_profile_for_newly_created_user(sender, instance, created, **kwargs):
     if created:
         Customer.objects.create(user=instance)
+
+
+def decrement_products_count(category_id):
+    # A count that drifted to zero stays there (rebuild_category_counts repairs it): MySQL rejects going
+    # below zero on the unsigned column.
+    Category.objects.filter(pk=category_id, products_count__gt=0).update(products_count=F('products_count') - 1,
+                                                                         datetime_modified=Now())
+
+
+@receiver(post_save, sender=Product)
+def update_category_products_count_on_save(sender, instance, created, **kwargs):
+    previous_category_id = None if created else instance.get_loaded_value('category_id')
+    if previous_category_id is DEFERRED or previous_category_id == instance.category_id:
+        return
+    if previous_category_id is not None:
+        decrement_products_count(previous_category_id)
+    Category.objects.filter(pk=instance.category_id).update(products_count=F('products_count') + 1,
+                                                            datetime_modified=Now())
+
+
+@receiver(post_delete, sender=Product)
+def update_category_products_count_on_delete(sender, instance, **kwargs):
+    decrement_products_count(instance.category_id)
+
+
+def add_approved_comments(product_id, delta):
+    Product.objects.filter(pk=product_id).update(approved_comments_count=F('approved_comments_count') + delta,
+                                                 datetime_modified=Now())
+
+
+@receiver(post_save, sender=Comment)
+def update_approved_comments_count_on_save(sender, instance, created, **kwargs):
+    if created:
+        previous_product_id, previous_status = None, None
+    else:
+        previous_product_id = instance.get_loaded_value('product_id')
+        previous_status = instance.get_loaded_value('status')
+        if previous_product_id is DEFERRED or previous_status is DEFERRED:
+            return
+    was_approved = previous_status == Comment.COMMENT_STATUS_APPROVED
+    is_approved = instance.status == Comment.COMMENT_STATUS_APPROVED
+    if was_approved and is_approved and previous_product_id == instance.product_id:
+        return
+    if was_approved:
+        add_approved_comments(previous_product_id, -1)
+    if is_approved:
+        add_approved_comments(instance.product_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def update_approved_comments_count_on_delete(sender, instance, **kwargs):
+    if instance.status == Comment.COMMENT_STATUS_APPROVED:
+        add_approved_comments(instance.product_id, -1)
+
+
+def update_search_index(update):
+    """Call `update(backend)` now for backends indexing in the database, after the commit for the others."""
+    backend = get_search_backend()
+    if backend.transactional:
+        update(backend)
+    else:
+        transaction.on_commit(lambda: update(backend))
+
+
+@receiver(post_save, sender=Product)
+def update_search_index_on_product_save(sender, instance, created, **kwargs):
+    if created or any(instance.get_loaded_value(name) != getattr(instance, name) for name in ('name', 'category_id')):
+        update_search_index(lambda backend: backend.index_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def update_search_index_on_product_delete(sender, instance, **kwargs):
+    product_id = instance.pk
+    update_search_index(lambda backend: backend.remove_product(product_id))
+
+
+@receiver(post_save, sender=Category)
+def update_search_index_on_category_save(sender, instance, **kwargs):
+    update_search_index(lambda backend: backend.index_category(instance))
+
+
+@receiver(post_delete, sender=Category)
+def update_search_index_on_category_delete(sender, instance, **kwargs):
+    category_id = instance.pk
+    update_search_index(lambda backend: backend.remove_category(category_id))
+
+
+@receiver(post_save, sender=Product)
+def invalidate_cached_carts_on_product_save(sender, instance, created, **kwargs):
+    if created:
+        return
+    # Cart payloads embed the product's name and unit price.
+    for field_name in ('name', 'unit_price'):
+        if instance.get_loaded_value(field_name) != getattr(instance, field_name):
+            invalidate_cart_products()
+            return
+
+
+@receiver(pre_delete, sender=Product)
+def invalidate_cached_carts_on_product_delete(sender, instance, **kwargs):
+    invalidate_cart_products()
+
+
+def discounts_changed(product_ids):
+    """Prices of `product_ids` changed with their discounts: drop them and the carts embedding them."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    # Product responses show the prices: let conditional GETs see the change.
+    Product.objects.filter(pk__in=product_ids).update(datetime_modified=Now())
+    invalidate_prices(product_ids)
+    invalidate_cart_products()
+
+
+def get_discounted_product_ids(discount_id):
+    return Product.discounts.through.objects.filter(discount_id=discount_id).values_list('product_id', flat=True)
+
+
+@receiver(m2m_changed, sender=Product.discounts.through)
+def update_prices_on_product_discounts_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        discounts_changed(pk_set if reverse else [instance.pk])
+    elif action == 'pre_clear' and reverse:
+        discounts_changed(get_discounted_product_ids(instance.pk))
+    elif action == 'post_clear' and not reverse:
+        discounts_changed([instance.pk])
+
+
+@receiver(post_save, sender=Discount)
+def update_prices_on_discount_save(sender, instance, created, **kwargs):
+    if not created:
+        discounts_changed(get_discounted_product_ids(instance.pk))
+
+
+@receiver(pre_delete, sender=Discount)
+def update_prices_on_discount_delete(sender, instance, **kwargs):
+    discounts_changed(get_discounted_product_ids(instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def bump_generation_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_generation(sender))
+
+
+@receiver(order_create)
+def record_sales_on_order_create(sender, order, **kwargs):
+    sync_order_sales([order.pk])
+
+
+@receiver(post_save, sender=Order)
+def move_sales_on_order_status_change(sender, instance, created, **kwargs):
+    previous_status = None if created else instance.get_loaded_value('status')
+    if previous_status is None or previous_status == instance.status:
+        return
+    # Orders whose order_create job has not run yet are counted here, under their new status; the job
+    # then finds them counted.
+    sync_order_sales([instance.pk])
+
+
+@receiver(post_save, sender=Order)
+def update_customer_stats_on_order_save(sender, instance, created, **kwargs):
+    customers = Customer.objects.filter(pk=instance.customer_id)
+    if created:
+        created_at = Value(instance.datetime_created)
+        customers.update(
+            orders_count=F('orders_count') + 1,
+            paid_total=F('paid_total') + (instance.total_amount if instance.status == Order.ORDER_STATUS_PAID else 0),
+            last_order_at=Greatest(Coalesce('last_order_at', created_at), created_at),
+        )
+        return
+    previous_customer_id = instance.get_loaded_value('customer_id')
+    previous_status = instance.get_loaded_value('status')
+    if previous_customer_id is DEFERRED or previous_status is DEFERRED:
+        return
+    if previous_customer_id != instance.customer_id:
+        rebuild_customer_stats(Customer.objects.filter(pk__in=[previous_customer_id, instance.customer_id]))
+        return
+    was_paid = previous_status == Order.ORDER_STATUS_PAID
+    is_paid = instance.status == Order.ORDER_STATUS_PAID
+    if was_paid != is_paid:
+        amount = instance.total_amount if is_paid else -instance.total_amount
+        customers.update(paid_total=F('paid_total') + amount)
+
+
+@receiver(post_delete, sender=Order)
+def update_customer_stats_on_order_delete(sender, instance, **kwargs):
+    rebuild_customer_stats(Customer.objects.filter(pk=instance.customer_id))
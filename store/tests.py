@@ -1,3 +1,1228 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from base64 import b64encode
+from collections import namedtuple
+from importlib import import_module
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
+from urllib.parse import parse_qs, urlparse
+from uuid import uuid4
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import URLResolver, get_resolver, resolve, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import urls as store_urls
+from .analytics import rebuild_customer_stats, rebuild_sales_rollups
+from .async_views import AsyncViewSetView
+from .cache import cache_cart, get_cached_cart, invalidate_carts
+from .checkout import CheckoutPipeline
+from .compiled import CompiledReadMixin
+from .imports import ProductImporter
+from .instrumentation import explain, record_queries
+from .jobs import JobRunner, object_path
+from .models import (Cart, CartItem, Category, CategorySearchToken, Comment, Customer, DailyCategorySales,
+                     DailyProductSales, Discount, Job, Order, OrderItem, Product, ProductSearchToken)
+from .pagination import KeysetPagination
+from .pool import ConnectionPool, PoolTimeout
+from .replicas import PRIMARY_COOKIE
+from .search import InvertedIndexSearchBackend
+from .signals import DeferredSignal, order_create
+
+
+def seed_store_data(categories=3, products_per_category=10, orders=3, items_per_order=3, cart_items=5):
+    """Create a small but complete catalog: products with comments, a staff user, a customer with orders and a cart."""
+    User = get_user_model()
+    staff = User.objects.create_superuser(username='staff', email='staff@store.local', password='staff-password')
+    user = User.objects.create_user(username='customer', email='customer@store.local', password='customer-password',
+                                    first_name='Jane', last_name='Doe')
+    customer = Customer.objects.get(user=user)
+
+    all_products = []
+    for c in range(categories):
+        category = Category.objects.create(title=f'Category {c}')
+        for p in range(products_per_category):
+            all_products.append(Product.objects.create(
+                name=f'Product {c}-{p}', slug=f'product-{c}-{p}', description='', category=category,
+                unit_price=p + 1, inventory=p * 3,
+            ))
+    comments = [
+        Comment.objects.create(product=product, name='Reviewer', body='Nice', status=status)
+        for product in all_products[:5]
+        for status in (Comment.COMMENT_STATUS_APPROVED, Comment.COMMENT_STATUS_WAITING)
+    ]
+
+    for o in range(orders):
+        order = Order.objects.create(customer=customer)
+        for product in all_products[o * items_per_order:(o + 1) * items_per_order]:
+            OrderItem.objects.create(order=order, product=product, quantity=2, unit_price=product.unit_price)
+        order.recalculate_totals()
+
+    cart = Cart.objects.create()
+    for product in all_products[:cart_items]:
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+    return {
+        'staff': staff,
+        'user': user,
+        'customer': customer,
+        'category': all_products[0].category,
+        'product': all_products[0],
+        'comment': comments[0],
+        'order': order,
+        'cart': cart,
+        'cart_item': cart.items.first(),
+    }
+
+
+Route = namedtuple('Route', ['user', 'budget', 'kwargs', 'method', 'data', 'content_type'],
+                   defaults=[{}, 'get', None, None])
+
+NDJSON = 'application/x-ndjson'
+
+# The most SQL queries every route in store/urls.py may run, per user it is requested as.
+# Names in `kwargs` and `data` refer to the objects returned by seed_store_data().
+QUERY_BUDGETS = {
+    'api-root': [Route(None, 0)],
+    'product-list': [Route(None, 3)],
+    'product-detail': [Route(None, 3, {'pk': 'product'})],
+    'product-bulk-import': [Route('staff', 10, method='post', content_type=NDJSON, data=[
+        {'id': 'product', 'price': '9.99', 'inventory': 7},
+        {'title': 'Imported product', 'price': '5', 'inventory': 1, 'category': 'category'},
+    ])],
+    'product-comment-list': [Route(None, 1, {'product_pk': 'product'})],
+    'product-comment-detail': [Route(None, 1, {'product_pk': 'product', 'pk': 'comment'})],
+    'category-list': [Route(None, 2)],
+    'category-detail': [Route(None, 2, {'pk': 'category'})],
+    'cart-list': [Route(None, 3, method='post')],
+    'cart-detail': [Route(None, 3, {'pk': 'cart'})],
+    'cart_items-list': [Route(None, 2, {'cart_pk': 'cart'})],
+    'cart_items-detail': [Route(None, 2, {'cart_pk': 'cart', 'pk': 'cart_item'})],
+    'cart_items-bulk': [Route(None, 5, {'cart_pk': 'cart'}, 'post', [{'product': 'product', 'quantity': 1}])],
+    'customer-list': [Route('staff', 1)],
+    'customer-detail': [Route('staff', 1, {'pk': 'customer'})],
+    'customer-me': [Route('user', 1)],
+    'customer-send-privet-email': [Route('staff', 0, {'pk': 'customer'})],
+    'order-list': [Route('staff', 1), Route('user', 1)],
+    'order-detail': [Route('staff', 2, {'pk': 'order'}), Route('user', 2, {'pk': 'order'})],
+    'sales-analytics-list': [Route('staff', 1, data={'start': '2023-01-01', 'end': '2023-12-31'})],
+    'db-pool-list': [Route('staff', 0)],
+}
+
+# A statement shape repeated this many times within one request is treated as an N+1.
+N_PLUS_ONE_THRESHOLD = 3
+
+
+def get_route_names(patterns):
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= get_route_names(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class SeededStoreTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store_data()
+
+    def resolve(self, value):
+        if isinstance(value, str) and value in self.data:
+            return self.data[value].pk
+        if isinstance(value, list):
+            return [self.resolve(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.resolve(item) for key, item in value.items()}
+        return value
+
+    def request_route(self, name, route, capture_stacks=False):
+        """Request the route named `name` as described by `route`; return the response and a QueryRecorder."""
+        cache.clear()
+        client = APIClient()
+        if route.user:
+            client.force_authenticate(self.data[route.user])
+        url = reverse(name, kwargs={key: self.resolve(value) for key, value in route.kwargs.items()})
+
+        data = self.resolve(route.data)
+        if route.content_type == NDJSON:
+            data = ''.join(json.dumps(row) + '\n' for row in data)
+        encoding = {'content_type': route.content_type} if route.content_type else {'format': 'json'}
+
+        with record_queries(capture_stacks=capture_stacks) as recorder:
+            response = getattr(client, route.method)(url, data, **encoding)
+        return response, recorder
+
+
+class QueryBudgetTests(SeededStoreTestCase):
+    def test_every_route_declares_a_budget(self):
+        self.assertEqual(get_route_names(store_urls.urlpatterns) - set(QUERY_BUDGETS), set())
+
+    def test_routes_stay_within_query_budget(self):
+        for name, routes in QUERY_BUDGETS.items():
+            for route in routes:
+                with self.subTest(route=name, user=route.user):
+                    response, recorder = self.request_route(name, route, capture_stacks=True)
+                    self.assertLess(response.status_code, 400, response.content)
+                    self.assertLessEqual(recorder.count, route.budget, recorder.report())
+                    self.assertFalse(recorder.repeated_shapes(N_PLUS_ONE_THRESHOLD), recorder.report())
+
+
+# Filtered and ordered reads whose queries QueryPlanTests checks on top of every route of QUERY_BUDGETS.
+PLANNED_READS = {
+    'product-list': [
+        Route(None, None, data={'inventory__lt': 3}),
+        Route(None, None, data={'inventory__gt': 10}),
+        Route(None, None, data={'ordering': 'name'}),
+        Route(None, None, data={'ordering': '-unit_price'}),
+        Route(None, None, data={'ordering': 'inventory', 'inventory__gt': 10}),
+    ],
+    'customer-list': [
+        Route('staff', None, data={'ordering': '-paid_total'}),
+        Route('staff', None, data={'ordering': '-last_order_at'}),
+        Route('staff', None, data={'orders_count__gte': 1, 'ordering': 'orders_count'}),
+    ],
+    'order-list': [Route('staff', None, data={'status': Order.ORDER_STATUS_UNPAID})],
+}
+
+Changelist = namedtuple('Changelist', ['model_name', 'params', 'sorts'], defaults=[{}, False])
+
+# Admin changelists whose queries QueryPlanTests checks. `sorts` allows sorting the rows found through
+# indexes: the inventory statuses are ranges of the (inventory, id) index, whose rows come in inventory
+# order; the customers' names are on the users, while the changelist breaks ties on the customer id; and
+# matches of name prefixes on either name column cannot come in name order.
+PLANNED_CHANGELISTS = [
+    Changelist('product'),
+    Changelist('product', {'inventory': '<3'}, sorts=True),
+    Changelist('product', {'inventory': '3<=10'}, sorts=True),
+    Changelist('product', {'inventory': '>10'}, sorts=True),
+    Changelist('customer', sorts=True),
+    Changelist('customer', {'q': 'Doe'}, sorts=True),
+    Changelist('order'),
+    Changelist('order', {'status__exact': Order.ORDER_STATUS_UNPAID}),
+    Changelist('comment'),
+    Changelist('comment', {'status__exact': Comment.COMMENT_STATUS_WAITING}),
+]
+
+# Tables read whole on purpose: the category list is not paginated.
+FULL_SCANS_ALLOWED = {'store_category'}
+
+# Table statistics read instead of counting rows (store.pagination.estimated_row_count), not planned queries.
+STATISTICS_TABLES = ('sqlite_stat1', 'information_schema')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'plans are expected from SQLite, see QueryPlanTests')
+class QueryPlanTests(SeededStoreTestCase):
+    """
+    EXPLAINs the SELECTs of every route of QUERY_BUDGETS and PLANNED_READS and of the admin changelists
+    of PLANNED_CHANGELISTS on the seeded data, and fails on full table scans and filesorts.
+
+    Only SQLite's plans are checked. MySQL plans by table statistics, and on the few seeded rows it reads
+    whole tables whatever their indexes, so these tests only show that the queries have indexes to use;
+    the indexes themselves are plain B-trees either engine can read.
+    """
+
+    def assertPlansUseIndexes(self, recorder, sorts=False):
+        for query in recorder.queries:
+            if not query.sql.lstrip().upper().startswith('SELECT') or any(
+                    table in query.sql for table in STATISTICS_TABLES):
+                continue
+            plan = explain(query)
+            problems = [table for table in plan.full_scans if table not in FULL_SCANS_ALLOWED]
+            if plan.filesort and not sorts:
+                problems.append('filesort')
+            self.assertFalse(problems, '\n'.join([query.sql, *plan.lines]))
+
+    def test_routes_use_indexes(self):
+        routes = [(name, route) for name, routes in QUERY_BUDGETS.items() for route in routes]
+        routes += [(name, route) for name, routes in PLANNED_READS.items() for route in routes]
+        for name, route in routes:
+            with self.subTest(route=name, user=route.user, data=route.data):
+                response, recorder = self.request_route(name, route)
+                self.assertLess(response.status_code, 400, response.content)
+                self.assertPlansUseIndexes(recorder)
+
+    def test_admin_changelists_use_indexes(self):
+        self.client.force_login(self.data['staff'])
+        for changelist in PLANNED_CHANGELISTS:
+            model_admin = admin.site._registry[apps.get_model('store', changelist.model_name)]
+            # Paginated after one row, as the changelists of real tables are, the page is read with a LIMIT.
+            with self.subTest(changelist=changelist.model_name, params=changelist.params), \
+                    mock.patch.object(model_admin, 'list_per_page', 1), record_queries() as recorder:
+                response = self.client.get(reverse(f'admin:store_{changelist.model_name}_changelist'),
+                                           changelist.params)
+                self.assertEqual(response.status_code, 200)
+                self.assertPlansUseIndexes(recorder, changelist.sorts)
+
+
+# A database standing in for a read replica of `default`, configured by config.test_settings.
+REPLICA = 'replica' if 'replica' in settings.DATABASES else None
+
+
+@skipUnless(REPLICA, 'needs a `replica` database, e.g. --settings=config.test_settings')
+@override_settings(STORE_DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TestCase):
+    # The data is only written to `default`: the empty replica answers as one the writes have not reached.
+    databases = {'default', REPLICA} - {None}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store_data()
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, client, name, **kwargs):
+        with record_queries() as recorder:
+            response = client.get(reverse(name, kwargs=kwargs))
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, {query.alias for query in recorder.queries}
+
+    def test_store_reads_go_to_a_replica(self):
+        response, aliases = self.get(APIClient(), 'product-list')
+        self.assertEqual(aliases, {REPLICA})
+        self.assertEqual(response.data['results'], [])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        cart = self.data['cart']
+        client = APIClient()
+        response = client.post(reverse('cart_items-list', kwargs={'cart_pk': cart.pk}),
+                               {'product': self.data['product'].pk, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        response, aliases = self.get(client, 'cart_items-list', cart_pk=cart.pk)
+        self.assertEqual(aliases, {'default'})
+        self.assertEqual(len(response.data), cart.items.count())
+
+        response, aliases = self.get(APIClient(), 'cart_items-list', cart_pk=cart.pk)
+        self.assertEqual(aliases, {REPLICA})
+
+        client.cookies[PRIMARY_COOKIE] = '0'
+        response, aliases = self.get(client, 'cart_items-list', cart_pk=cart.pk)
+        self.assertEqual(aliases, {REPLICA})
+
+    def test_credentials_pin_clients_without_cookies(self):
+        authorization = f'JWT {RefreshToken.for_user(self.data["user"]).access_token}'
+        writer = APIClient()
+        writer.credentials(HTTP_AUTHORIZATION=authorization)
+        response = writer.put(reverse('customer-me'), {'phone_number': '09120000000'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        reader = APIClient()
+        reader.credentials(HTTP_AUTHORIZATION=authorization)
+        response, aliases = self.get(reader, 'customer-me')
+        self.assertNotIn(REPLICA, aliases)
+        self.assertEqual(response.data['phone_number'], '09120000000')
+
+
+class FakeConnection:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        return ConnectionPool(lambda connection: connection.healthy, **options)
+
+    def test_connections_are_reused_up_to_max_size(self):
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        connection = pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        pool.release(connection)
+        self.assertIs(pool.acquire(FakeConnection), connection)
+        self.assertEqual((pool.stats()['created'], pool.stats()['timeouts']), (1, 1))
+
+    def test_checkouts_wait_for_a_release(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.acquire(FakeConnection)
+        threading.Timer(0.05, pool.release, [connection]).start()
+        self.assertIs(pool.acquire(FakeConnection), connection)
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['in_use']), (1, 1))
+        self.assertGreater(stats['wait_time_ms'], 0)
+
+    def test_unhealthy_and_idle_connections_are_replaced(self):
+        pool = self.make_pool(max_size=2, max_idle=0.01)
+        unhealthy = pool.acquire(FakeConnection)
+        unhealthy.healthy = False
+        pool.release(unhealthy)
+        idle = pool.acquire(FakeConnection)
+        self.assertIsNot(idle, unhealthy)
+        self.assertTrue(unhealthy.closed)
+
+        pool.release(idle)
+        time.sleep(0.02)
+        self.assertIsNot(pool.acquire(FakeConnection), idle)
+        self.assertTrue(idle.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['failed_checks'], stats['evicted']), (3, 1, 1))
+
+
+class KeysetPaginationTests(SeededStoreTestCase):
+    # Seeded prices and inventories repeat once per category, so pages of 4 split runs of equal values.
+    page_size = 4
+
+    def walk(self, url, link, client=None):
+        """The pages from `url` on, following the `link` ('next' or 'previous') of each."""
+        client = client or self.client
+        pages = []
+        with mock.patch.object(KeysetPagination, 'page_size', self.page_size):
+            while url:
+                response = client.get(url, HTTP_ACCEPT='application/json')
+                self.assertEqual(response.status_code, 200, response.content)
+                page = response.json()
+                self.assertLessEqual(len(page['results']), self.page_size)
+                pages.append(page)
+                url = page[link]
+        return pages
+
+    @staticmethod
+    def ids(pages):
+        return [product['id'] for page in pages for product in page['results']]
+
+    def test_cursors_walk_every_ordering_both_ways(self):
+        products = Product.objects.all()
+        for ordering, expected in [
+            (None, products.order_by('id')),
+            ('unit_price', products.order_by('unit_price', 'id')),
+            ('-unit_price', products.order_by('-unit_price', '-id')),
+            ('-inventory', products.order_by('-inventory', '-id')),
+        ]:
+            with self.subTest(ordering=ordering):
+                expected = list(expected.values_list('id', flat=True))
+                url = reverse('product-list') + (f'?ordering={ordering}' if ordering else '')
+                pages = self.walk(url, 'next')
+                self.assertEqual(self.ids(pages), expected)
+                self.assertIsNone(pages[0]['previous'])
+
+                backwards = self.walk(pages[-1]['previous'], 'previous')
+                self.assertEqual(self.ids(reversed(backwards)) + self.ids(pages[-1:]), expected)
+                self.assertIsNone(backwards[-1]['previous'])
+                self.assertIsNotNone(backwards[-1]['next'])
+
+    def test_nullable_orderings_list_rows_without_a_value(self):
+        User = get_user_model()
+        created = Order.objects.get(pk=self.data['order'].pk).datetime_created
+        for number in range(7):
+            customer = User.objects.create_user(username=f'customer-{number}', email=f'customer-{number}@store.local',
+                                                 password='password').customer
+            if number % 2:
+                # Pairs of customers share a last order time.
+                Customer.objects.filter(pk=customer.pk).update(
+                    last_order_at=created - timedelta(days=number // 4), orders_count=1)
+        client = APIClient()
+        client.force_authenticate(self.data['staff'])
+        customers = Customer.objects.all()
+        self.assertTrue(customers.filter(last_order_at__isnull=True).count() > self.page_size)
+
+        for ordering, expected in [
+            ('last_order_at', customers.order_by(F('last_order_at').asc(nulls_first=True), 'id')),
+            ('-last_order_at', customers.order_by(F('last_order_at').desc(nulls_last=True), '-id')),
+        ]:
+            with self.subTest(ordering=ordering):
+                expected = list(expected.values_list('id', flat=True))
+                pages = self.walk(reverse('customer-list') + f'?ordering={ordering}', 'next', client)
+                self.assertEqual(self.ids(pages), expected)
+                backwards = self.walk(pages[-1]['previous'], 'previous', client)
+                self.assertEqual(self.ids(reversed(backwards)) + self.ids(pages[-1:]), expected)
+
+    def test_invalid_cursors_are_not_found(self):
+        url = reverse('product-list')
+        next_link = self.client.get(url, {'ordering': 'unit_price'}, HTTP_ACCEPT='application/json').json()['next']
+        cursor = parse_qs(urlparse(next_link).query)['cursor'][0]
+        for params in [
+            {'cursor': 'not-a-cursor'},
+            {'cursor': b64encode(b'{"o":"id"}').decode()},
+            {'cursor': b64encode(b'{"o":"unit_price","v":"x","i":1,"r":false}').decode(), 'ordering': 'unit_price'},
+            # A cursor is only valid for the ordering it was issued for.
+            {'cursor': cursor, 'ordering': 'name'},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 404)
+
+
+class CategoryProductsCountTests(SeededStoreTestCase):
+    def assertCounts(self, *categories):
+        for category in categories:
+            category.refresh_from_db()
+            self.assertEqual(category.products_count, category.products.count(), category)
+
+    def test_product_changes_update_counts(self):
+        category = self.data['category']
+        other = Category.objects.create(title='Other')
+        product = Product.objects.create(name='Counted product', slug='counted', description='', category=category,
+                                         unit_price=1, inventory=1)
+        self.assertCounts(category, other)
+
+        product.category = other
+        product.save()
+        self.assertCounts(category, other)
+
+        # Saves that leave the category alone, or did not load it, change no count.
+        Product.objects.only('id', 'name').get(pk=product.pk).save()
+        product.name = 'Renamed product'
+        product.save()
+        self.assertCounts(category, other)
+
+        product.delete()
+        self.assertCounts(category, other)
+
+    def test_rebuild_category_counts(self):
+        Category.objects.update(products_count=99)
+        call_command('rebuild_category_counts', batch_size=2, stdout=StringIO())
+        self.assertCounts(*Category.objects.all())
+
+    def test_categories_with_products_are_not_deleted(self):
+        client = APIClient()
+        client.force_authenticate(self.data['staff'])
+        category = self.data['category']
+        client.delete(reverse('category-detail', kwargs={'pk': category.pk}))
+        self.assertTrue(Category.objects.filter(pk=category.pk).exists())
+
+        empty = Category.objects.create(title='Empty')
+        response = client.delete(reverse('category-detail', kwargs={'pk': empty.pk}))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Category.objects.filter(pk=empty.pk).exists())
+
+    def test_drifted_counts(self):
+        category = self.data['category']
+        Category.objects.filter(pk=category.pk).update(products_count=0)
+        client = APIClient()
+        client.force_authenticate(self.data['staff'])
+        client.delete(reverse('category-detail', kwargs={'pk': category.pk}))
+        self.assertTrue(Category.objects.filter(pk=category.pk).exists())
+
+        # Decrements stop at zero instead of failing.
+        product = Product.objects.create(name='Uncounted product', slug='uncounted', description='',
+                                         category=category, unit_price=1, inventory=1)
+        Category.objects.filter(pk=category.pk).update(products_count=0)
+        product.delete()
+        ProductImporter.update_category_counts({category.pk: -2})
+        category.refresh_from_db()
+        self.assertEqual(category.products_count, 0)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(title='Phones')
+        cls.cases = Category.objects.create(title='Cases')
+        cls.phone = cls.create_product('Blue phone stand', cls.cases)
+        cls.blue_case = cls.create_product('Blue silicone case', cls.cases)
+        cls.charger = cls.create_product('Wireless charger', cls.phones)
+
+    @staticmethod
+    def create_product(name, category):
+        return Product.objects.create(name=name, slug=name.lower().replace(' ', '-'), description='', category=category,
+                                      unit_price=10, inventory=1)
+
+    def search(self, text):
+        response = APIClient().get(reverse('product-list'), {'search': text}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [product['id'] for product in response.json()['results']]
+
+    def test_ranking(self):
+        # Every name token scores 2 and every category title token 1, and ties are listed newest first.
+        self.assertEqual(self.search('blue phone'), [self.phone.pk, self.blue_case.pk])
+        self.assertEqual(self.search('PHONES'), [self.charger.pk])
+        self.assertEqual(self.search('cases'), [self.blue_case.pk, self.phone.pk])
+        self.assertEqual(self.search('blue cases'), [self.blue_case.pk, self.phone.pk])
+        self.assertEqual(self.search('silicone phones'), [self.blue_case.pk, self.charger.pk])
+        self.assertEqual(self.search('red'), [])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_writes_update_the_index(self):
+        self.blue_case.name = 'Red silicone case'
+        self.blue_case.save()
+        self.assertEqual(self.search('blue'), [self.phone.pk])
+        self.assertEqual(self.search('red'), [self.blue_case.pk])
+
+        self.phone.category = self.phones
+        self.phone.save()
+        self.assertEqual(self.search('phones'), [self.charger.pk, self.phone.pk])
+
+        self.cases.title = 'Covers'
+        self.cases.save()
+        self.assertEqual(self.search('cases'), [])
+        self.assertEqual(self.search('covers'), [self.blue_case.pk])
+
+        self.charger.delete()
+        self.assertEqual(self.search('wireless'), [])
+        empty = Category.objects.create(title='Wireless')
+        empty.delete()
+        self.assertFalse(CategorySearchToken.objects.filter(token='wireless').exists())
+
+    def test_index_is_shared_and_rebuilt_from_the_database(self):
+        ProductSearchToken.objects.all().delete()
+        self.assertEqual(self.search('silicone'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        # A new backend, as in another process, reads the same index.
+        self.assertEqual(list(InvertedIndexSearchBackend().search(Product.objects.all(), 'silicone')),
+                         [self.blue_case])
+
+    def test_query_does_not_grow_with_matches(self):
+        backend = InvertedIndexSearchBackend()
+        few = str(backend.search(Product.objects.all(), 'wireless').query)
+        for i in range(20):
+            self.create_product(f'Wireless headset {i}', self.phones)
+        self.assertEqual(str(backend.search(Product.objects.all(), 'wireless').query), few)
+
+
+# Statements of one checkout, whatever the size of the cart (see store.checkout.CheckoutPipeline): locking
+# the items, discounts, customer, order, customer stats, order items, cart (SELECT and two DELETEs), outbox.
+CHECKOUT_QUERIES = 10
+
+
+class CheckoutTests(SeededStoreTestCase):
+    def checkout(self, cart_id):
+        client = APIClient()
+        client.force_authenticate(self.data['user'])
+        return client.post(reverse('order-list'), {'cart_id': str(cart_id)}, format='json')
+
+    def test_missing_and_empty_carts_are_refused(self):
+        orders_count = Order.objects.count()
+        response = self.checkout(uuid4())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'cart_id': ['There is no cart with this cart id']})
+
+        response = self.checkout(Cart.objects.create().pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'cart_id': ['Your cart is empty']})
+        self.assertEqual(Order.objects.count(), orders_count)
+
+    def test_checkout_charges_discounted_prices(self):
+        cart = self.data['cart']
+        product = self.data['product']
+        product.discounts.add(Discount.objects.create(discount=0.25, description='Quarter off'))
+        cart.items.filter(product=product).update(quantity=3)
+        expected_items = {
+            item.product_id: (item.quantity, item.product.unit_price * Decimal('0.75')
+                              if item.product_id == product.pk else item.product.unit_price)
+            for item in cart.items.select_related('product')
+        }
+
+        response = self.checkout(cart.pk)
+        self.assertEqual(response.status_code, 200, response.content)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.customer, self.data['customer'])
+        self.assertEqual({item.product_id: (item.quantity, item.unit_price) for item in order.items.all()},
+                         expected_items)
+        self.assertEqual(order.total_amount, sum(quantity * price for quantity, price in expected_items.values()))
+        self.assertEqual(order.items_count, len(expected_items))
+        self.assertEqual(len(response.data['items']), len(expected_items))
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
+        self.assertFalse(CartItem.objects.filter(cart_id=cart.pk).exists())
+
+    def test_checkout_queries_do_not_grow_with_the_cart(self):
+        products = list(Product.objects.all()[:10])
+        counts = []
+        for size in (1, len(products)):
+            cart = Cart.objects.create()
+            CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=2) for product in products[:size])
+            with record_queries() as recorder:
+                order = CheckoutPipeline(cart.pk, user_id=self.data['user'].pk).run()
+            self.assertEqual(order.items_count, size)
+            # The atomic block runs in the test's transaction, so it opens a savepoint instead.
+            counts.append(len([query for query in recorder.queries if 'SAVEPOINT' not in query.sql]))
+        self.assertEqual(counts, [CHECKOUT_QUERIES] * 2)
+
+
+class SalesRollupTests(SeededStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        rebuild_sales_rollups()
+
+    def rollups(self):
+        return {
+            model: set(model.objects.exclude(units=0, revenue=0).values_list('date', 'status', key, 'units', 'revenue'))
+            for model, key in [(DailyProductSales, 'product_id'), (DailyCategorySales, 'category_id')]
+        }
+
+    def assertRollupsRebuildTo(self, expected_paid_units):
+        rollups = self.rollups()
+        rebuild_sales_rollups()
+        self.assertEqual(rollups, self.rollups())
+        paid_units = DailyProductSales.objects.filter(status=Order.ORDER_STATUS_PAID).values_list('units', flat=True)
+        self.assertEqual(sum(paid_units), expected_paid_units)
+
+    def checkout(self):
+        order = CheckoutPipeline(self.data['cart'].pk, user_id=self.data['user'].pk).run()
+        return Order.objects.get(pk=order.pk)
+
+    def test_status_change_before_the_order_create_job(self):
+        order = self.checkout()
+        order.status = Order.ORDER_STATUS_PAID
+        order.save()
+        JobRunner().run_batch()
+        self.assertRollupsRebuildTo(sum(order.items.values_list('quantity', flat=True)))
+
+    def test_status_change_after_the_order_create_job(self):
+        order = self.checkout()
+        JobRunner().run_batch()
+        order.status = Order.ORDER_STATUS_PAID
+        order.save()
+        JobRunner().run_batch()
+        self.assertRollupsRebuildTo(sum(order.items.values_list('quantity', flat=True)))
+
+    def test_admin_item_edits(self):
+        order = self.checkout()
+        order.status = Order.ORDER_STATUS_PAID
+        order.save()
+        JobRunner().run_batch()
+        item = order.items.first()
+        other_order = self.data['order']
+
+        self.client.force_login(self.data['staff'])
+        response = self.client.post(reverse('admin:store_orderitem_change', args=[item.pk]), {
+            'order': other_order.pk, 'product': item.product_id, 'quantity': item.quantity + 3,
+            'unit_price': item.unit_price + 1,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertRollupsRebuildTo(sum(order.items.values_list('quantity', flat=True)))
+
+        response = self.client.post(reverse('admin:store_orderitem_delete', args=[order.items.first().pk]),
+                                    {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertRollupsRebuildTo(sum(order.items.values_list('quantity', flat=True)))
+
+    def test_sales_are_withdrawn_from_the_category_they_were_counted_in(self):
+        order = self.checkout()
+        JobRunner().run_batch()
+        item = order.items.select_related('product').first()
+        product = item.product
+        unpaid = DailyCategorySales.objects.filter(category_id=product.category_id, status=Order.ORDER_STATUS_UNPAID)
+        # The order's units in the product's category, the product's included, move to paid.
+        unpaid_units = sum(unpaid.values_list('units', flat=True)) - sum(
+            order.items.filter(product__category_id=product.category_id).values_list('quantity', flat=True))
+        product.category = Category.objects.create(title='Moved to')
+        product.save()
+        order.status = Order.ORDER_STATUS_PAID
+        order.save()
+
+        # Taken out of the category it was counted in, counted in the one it is in now.
+        self.assertEqual(sum(unpaid.values_list('units', flat=True)), unpaid_units)
+        moved = DailyCategorySales.objects.filter(category=product.category)
+        self.assertEqual(list(moved.values_list('status', 'units')), [(Order.ORDER_STATUS_PAID, item.quantity)])
+
+
+job_signal = DeferredSignal('store.tests.job_signal')
+
+
+def create_category(sender, title, **kwargs):
+    Category.objects.create(title=title)
+    if title.startswith('Failing'):
+        raise RuntimeError('Receiver failed')
+
+
+class JobRunnerTests(TestCase):
+    def setUp(self):
+        job_signal.connect(create_category)
+        self.addCleanup(job_signal.disconnect, create_category)
+
+    def send(self, title):
+        job, = job_signal.send_deferred(CheckoutPipeline, title=title)
+        return job
+
+    def make_due(self):
+        Job.objects.update(run_after=timezone.now())
+
+    def test_succeeded_jobs_are_deleted_with_the_receiver_writes(self):
+        job = self.send('Job category')
+        self.assertEqual(JobRunner().run_batch(), 1)
+        self.assertTrue(Category.objects.filter(title='Job category').exists())
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+        self.assertEqual(JobRunner().run_batch(), 0)
+
+    def test_failed_jobs_back_off_then_are_marked_failed(self):
+        job = self.send('Failing category')
+        runner = JobRunner(max_attempts=3, retry_delay=10)
+        for attempt in (1, 2):
+            start = timezone.now()
+            self.assertEqual(runner.run_batch(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.STATUS_PENDING, attempt))
+            self.assertIn('Receiver failed', job.last_error)
+            delay = 10 * 2 ** (attempt - 1)
+            self.assertGreaterEqual(job.run_after, start + timedelta(seconds=delay))
+            self.assertLessEqual(job.run_after, timezone.now() + timedelta(seconds=delay + 10))
+            self.assertEqual(runner.run_batch(), 0)
+            self.make_due()
+
+        self.assertEqual(runner.run_batch(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 3))
+        self.make_due()
+        self.assertEqual(runner.run_batch(), 0)
+        self.assertFalse(Category.objects.filter(title='Failing category').exists())
+
+    def test_jobs_are_claimed_again_once_their_lease_expires(self):
+        self.send('Leased category')
+        stalled = JobRunner()
+        claimed = stalled.claim()
+        self.assertEqual(JobRunner().run_batch(), 0)
+
+        self.make_due()
+        self.assertEqual(JobRunner().run_batch(), 1)
+        # The stalled worker's receiver rolls back when it finds the job claimed by another.
+        with mock.patch.object(stalled, 'claim', return_value=claimed):
+            self.assertEqual(stalled.run_batch(), 1)
+        self.assertEqual(Category.objects.filter(title='Leased category').count(), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_receivers_must_be_module_level_functions(self):
+        def nested(sender, **kwargs):
+            pass
+
+        for receiver in (nested, lambda sender, **kwargs: None, JobRunner().run_batch):
+            with self.assertRaises(ValueError):
+                job_signal.connect(receiver)
+
+
+class CartItemAddTests(SeededStoreTestCase):
+    def add(self, cart_id, product, quantity):
+        return APIClient().post(reverse('cart_items-list', kwargs={'cart_pk': cart_id}),
+                                {'product': product.pk, 'quantity': quantity}, format='json')
+
+    def bulk_add(self, cart_id, lines):
+        return APIClient().post(reverse('cart_items-bulk', kwargs={'cart_pk': cart_id}),
+                                [{'product': product.pk, 'quantity': quantity} for product, quantity in lines],
+                                format='json')
+
+    def test_adds_of_the_same_product_are_summed(self):
+        cart = Cart.objects.create()
+        product, other = Product.objects.all()[:2]
+        self.assertEqual(self.add(cart.pk, product, 2).data['quantity'], 2)
+        response = self.add(cart.pk, product, 3)
+        self.assertEqual(response.status_code, 201, response.content)
+        item = CartItem.objects.get(cart=cart, product=product)
+        self.assertEqual(response.data, {'id': item.pk, 'product': product.pk, 'quantity': 5})
+
+        response = self.bulk_add(cart.pk, [(product, 1), (other, 4), (product, 2)])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data, [{'product': product.pk, 'quantity': 8}, {'product': other.pk, 'quantity': 4}])
+        self.assertEqual(dict(cart.items.values_list('product_id', 'quantity')), {product.pk: 8, other.pk: 4})
+
+    def test_quantities_are_capped(self):
+        cart = Cart.objects.create()
+        product = self.data['product']
+        self.add(cart.pk, product, CartItem.MAX_QUANTITY - 1)
+        self.assertEqual(self.add(cart.pk, product, 10).data['quantity'], CartItem.MAX_QUANTITY)
+        response = self.bulk_add(Cart.objects.create().pk, [(product, CartItem.MAX_QUANTITY)] * 2)
+        self.assertEqual(response.data, [{'product': product.pk, 'quantity': CartItem.MAX_QUANTITY}])
+
+    def test_unknown_carts_are_not_found(self):
+        cart_id = uuid4()
+        self.assertEqual(self.add(cart_id, self.data['product'], 1).status_code, 404)
+        self.assertEqual(self.bulk_add(cart_id, [(self.data['product'], 1)]).status_code, 404)
+        self.assertFalse(CartItem.objects.filter(cart_id=cart_id).exists())
+
+
+class CartCacheTests(SeededStoreTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_cart(self, cart):
+        return APIClient().get(reverse('cart-detail', kwargs={'pk': cart.pk}), format='json').data
+
+    def test_payloads_read_before_a_write_commits_are_not_served(self):
+        cart = self.data['cart']
+        data, key = get_cached_cart(cart.pk)
+        self.assertIsNone(data)
+        stale = {'id': str(cart.pk), 'items': []}
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_carts([cart.pk])
+        # The payload read before the write is only cached now.
+        cache_cart(key, stale)
+        self.assertNotEqual(self.get_cart(cart), stale)
+
+    def test_product_changes_invalidate_carts(self):
+        cart = self.data['cart']
+        item = cart.items.select_related('product').first()
+        self.get_cart(cart)
+        with self.captureOnCommitCallbacks(execute=True):
+            item.product.name = 'Renamed in the cart'
+            item.product.save()
+        names = [line['product']['name'] for line in self.get_cart(cart)['items']]
+        self.assertIn('Renamed in the cart', names)
+
+
+@skipIf(connection.vendor == 'sqlite' and connection.is_in_memory_db(),
+        'needs a test database concurrent connections can write to, e.g. --settings=config.test_settings')
+class ConcurrentCartItemAddTests(TransactionTestCase):
+    threads = 8
+
+    def test_concurrent_adds_are_all_counted(self):
+        category = Category.objects.create(title='Category')
+        product = Product.objects.create(name='Product', slug='product', description='', category=category,
+                                         unit_price=1, inventory=1)
+        cart = Cart.objects.create()
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def add():
+            try:
+                barrier.wait()
+                CartItem.objects.add_quantities(cart.pk, [(product.pk, 1)])
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(list(cart.items.values_list('quantity', flat=True)), [self.threads])
+
+
+class ConditionalGetTests(SeededStoreTestCase):
+    def get(self, name, etag=None, params=None, **kwargs):
+        headers = {'HTTP_ACCEPT': 'application/json'}
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return APIClient().get(reverse(name, kwargs=kwargs), params, **headers)
+
+    def assertNotModified(self, name, etag, params=None, **kwargs):
+        response = self.get(name, etag, params, **kwargs)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def assertModified(self, name, etag, params=None, **kwargs):
+        response = self.get(name, etag, params, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_unchanged_product_is_not_modified(self):
+        product = self.data['product']
+        etag = self.get('product-detail', pk=product.pk)['ETag']
+        self.assertNotModified('product-detail', etag, pk=product.pk)
+        self.assertNotModified('product-list', self.get('product-list')['ETag'])
+
+    def test_admin_clear_inventory_changes_validators(self):
+        product = Product.objects.filter(inventory__gt=0).first()
+        detail_etag = self.get('product-detail', pk=product.pk)['ETag']
+        list_etag = self.get('product-list')['ETag']
+
+        self.client.force_login(self.data['staff'])
+        response = self.client.post(reverse('admin:store_product_changelist'),
+                                    {'action': 'clear_inventory', '_selected_action': [product.pk]})
+        self.assertEqual(response.status_code, 302)
+
+        response = self.assertModified('product-detail', detail_etag, pk=product.pk)
+        self.assertEqual(response.json()['inventory'], 0)
+        self.assertModified('product-list', list_etag)
+
+    def test_products_leaving_a_filter_change_the_list(self):
+        params = {'inventory__lt': 3}
+        response = self.get('product-list', params=params)
+        product = Product.objects.get(pk=response.json()['results'][0]['id'])
+        product.inventory = 50
+        product.save()
+        response = self.assertModified('product-list', response['ETag'], params)
+        self.assertNotIn(product.pk, [row['id'] for row in response.json()['results']])
+
+    def test_deletes_bump_the_generation(self):
+        product_etag = self.get('product-list')['ETag']
+        category_etag = self.get('category-list')['ETag']
+        product = Product.objects.create(name='Short-lived product', slug='short-lived', description='',
+                                         category=Category.objects.create(title='Short-lived'), unit_price=1,
+                                         inventory=1)
+        product_etag = self.assertModified('product-list', product_etag)['ETag']
+        category_etag = self.assertModified('category-list', category_etag)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        product_etag = self.assertModified('product-list', product_etag)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            product.category.delete()
+        self.assertModified('category-list', category_etag)
+
+
+def get_routes(patterns, prefix=''):
+    """`{(name, regex)}` of the named routes of `patterns`, with the regexes of the resolvers above them."""
+    routes = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            routes |= get_routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif pattern.name:
+            routes.add((pattern.name, prefix + str(pattern.pattern)))
+    return routes
+
+
+ASGI_URLCONF = 'config.asgi_urls'
+
+
+class AsyncReadTests(SeededStoreTestCase):
+    def setUp(self):
+        cache.clear()
+        delegate = mock.patch.object(AsyncViewSetView, 'delegate', autospec=True, side_effect=AsyncViewSetView.delegate)
+        self.delegate = delegate.start()
+        self.addCleanup(delegate.stop)
+
+    def urls(self):
+        cart = self.data['cart']
+        return [
+            reverse('product-list'),
+            reverse('product-list') + '?ordering=-unit_price&unit_price__gt=10',
+            reverse('product-detail', kwargs={'pk': self.data['product'].pk}),
+            reverse('category-list'),
+            reverse('category-detail', kwargs={'pk': self.data['product'].category_id}),
+            reverse('cart-detail', kwargs={'pk': cart.pk}),
+            reverse('product-detail', kwargs={'pk': 0}),
+        ]
+
+    async def aget(self, url, **headers):
+        with self.settings(ROOT_URLCONF=ASGI_URLCONF):
+            return await AsyncClient().get(url, headers={'Accept': 'application/json', **headers})
+
+    async def test_async_reads_match_the_sync_views(self):
+        for url in await sync_to_async(self.urls)():
+            with self.subTest(url=url):
+                expected = await sync_to_async(self.client.get)(url, HTTP_ACCEPT='application/json')
+                response = await self.aget(url)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        self.delegate.assert_not_called()
+
+    async def test_unchanged_reads_are_not_modified(self):
+        url = reverse('product-detail', kwargs={'pk': self.data['product'].pk})
+        etag = (await self.aget(url))['ETag']
+        response = await self.aget(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.delegate.assert_not_called()
+
+    async def test_requests_the_async_path_cannot_answer_are_delegated(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.data['staff']).access_token))()
+        url = reverse('product-list')
+        delegated = [
+            (url, {'Authorization': f'JWT {token}'}),
+            (url, {'Accept': 'text/html'}),
+            (url + '?search=product', {}),
+        ]
+        for url, headers in delegated:
+            with self.subTest(url=url, headers=headers):
+                self.delegate.reset_mock()
+                response = await self.aget(url, **headers)
+                self.assertEqual(response.status_code, 200)
+                self.delegate.assert_called_once()
+
+        self.delegate.reset_mock()
+        with self.settings(ROOT_URLCONF=ASGI_URLCONF):
+            response = await AsyncClient().post(reverse('category-list'), {'title': 'Anonymous'},
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.delegate.assert_called_once()
+
+    async def test_queries_are_recorded_without_leaving_the_event_loop(self):
+        urls = await sync_to_async(self.urls)()
+        with self.settings(STORE_QUERY_INSTRUMENTATION=True):
+            for url in [urls[0], urls[0] + '?search=product']:
+                with self.subTest(url=url):
+                    await sync_to_async(cache.clear)()
+                    expected = await sync_to_async(self.client.get)(url, HTTP_ACCEPT='application/json')
+                    await sync_to_async(cache.clear)()
+                    response = await self.aget(url)
+                    self.assertEqual(response['X-DB-Query-Count'], expected['X-DB-Query-Count'])
+                    self.assertNotEqual(response['X-DB-Query-Count'], '0')
+
+    def test_asgi_urlconf_keeps_the_wsgi_routes(self):
+        self.assertEqual(get_routes(get_resolver(ASGI_URLCONF).url_patterns),
+                         get_routes(get_resolver(settings.ROOT_URLCONF).url_patterns))
+        for url in self.urls():
+            with self.subTest(url=url):
+                match = resolve(url.partition('?')[0], urlconf=ASGI_URLCONF)
+                self.assertIs(match.func.view_class, AsyncViewSetView)
+                self.assertEqual(match.url_name, resolve(url.partition('?')[0]).url_name)
+
+
+class CompiledSerializerTests(SeededStoreTestCase):
+    def render(self, url, user=None):
+        cache.clear()
+        client = APIClient()
+        if user:
+            client.force_authenticate(self.data[user])
+        response = client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.content
+
+    def assertCompiledAsSerializer(self, url, user=None):
+        compiled = self.render(url, user)
+        with mock.patch.object(CompiledReadMixin, 'get_compiled_serializer', return_value=None):
+            self.assertEqual(compiled, self.render(url, user))
+
+    def test_products_with_discounts(self):
+        product = self.data['product']
+        product.discounts.add(Discount.objects.create(discount=0.25, description='Quarter off'),
+                              Discount.objects.create(discount=0.1, description='Tenth off'))
+        self.assertCompiledAsSerializer(reverse('product-list'))
+        self.assertCompiledAsSerializer(reverse('product-detail', kwargs={'pk': product.pk}))
+
+    def test_carts(self):
+        self.assertCompiledAsSerializer(reverse('cart-detail', kwargs={'pk': self.data['cart'].pk}))
+
+    def test_orders(self):
+        order = self.data['order']
+        for user in ('user', 'staff'):
+            with self.subTest(user=user):
+                self.assertCompiledAsSerializer(reverse('order-list'), user)
+                self.assertCompiledAsSerializer(reverse('order-detail', kwargs={'pk': order.pk}), user)
+
+
+class ProductImporterTests(SeededStoreTestCase):
+    def rows(self, count):
+        category_id = self.data['product'].category_id
+        return [(line, {'title': f'Imported {line}', 'price': '5', 'inventory': 1, 'category': category_id}, None)
+                for line in range(1, count + 1)]
+
+    def test_products_are_indexed_with_their_chunk(self):
+        ProductImporter(chunk_size=2).run(self.rows(5))
+        matches = InvertedIndexSearchBackend().search(Product.objects.all(), 'imported')
+        self.assertEqual(matches.count(), 5)
+
+    def test_the_index_is_rebuilt_once_without_inserted_ids(self):
+        backend = mock.Mock(spec=InvertedIndexSearchBackend, needs_reindex=True, transactional=True)
+        with mock.patch('store.imports.get_search_backend', return_value=backend), \
+                mock.patch.object(Product.objects, 'bulk_create'):
+            ProductImporter(chunk_size=2).run(self.rows(5))
+        backend.rebuild.assert_called_once()
+        backend.index_products.assert_not_called()
+
+    def test_backends_that_need_no_reindex_are_left_alone(self):
+        backend = mock.Mock(spec=InvertedIndexSearchBackend, needs_reindex=False)
+        with mock.patch('store.imports.get_search_backend', return_value=backend), \
+                mock.patch.object(Product.objects, 'bulk_create'):
+            ProductImporter(chunk_size=2).run(self.rows(5))
+        backend.rebuild.assert_not_called()
+        backend.index_products.assert_not_called()
+
+
+class CommentPermissionTests(SeededStoreTestCase):
+    def client_for(self, user=None):
+        client = APIClient()
+        if user:
+            client.force_authenticate(self.data[user])
+        return client
+
+    def url(self, comment=None):
+        product_pk = self.data['product'].pk
+        if comment is None:
+            return reverse('product-comment-list', kwargs={'product_pk': product_pk})
+        return reverse('product-comment-detail', kwargs={'product_pk': product_pk, 'pk': comment.pk})
+
+    def test_new_comments_wait_for_moderation(self):
+        response = self.client_for().post(self.url(), {'name': 'Reader', 'body': 'Nice', 'status': 'a'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        comment = Comment.objects.get(pk=response.data['id'])
+        self.assertEqual(comment.status, Comment.COMMENT_STATUS_WAITING)
+        self.assertNotIn('status', response.data)
+
+    def test_only_staff_edit_and_delete(self):
+        comment = self.data['comment']
+        for user, expected in ((None, 401), ('user', 403)):
+            with self.subTest(user=user):
+                client = self.client_for(user)
+                self.assertEqual(client.patch(self.url(comment), {'body': 'Edited'}, format='json').status_code,
+                                 expected)
+                self.assertEqual(client.delete(self.url(comment)).status_code, expected)
+        comment.refresh_from_db()
+        self.assertNotEqual(comment.body, 'Edited')
+
+        response = self.client_for('staff').delete(self.url(comment))
+        self.assertEqual(response.status_code, 204)
+
+    def test_staff_moderate_waiting_comments(self):
+        product = Product.objects.get(pk=self.data['product'].pk)
+        comment = Comment.objects.create(product=product, name='Reader', body='Waiting')
+        self.assertEqual(self.client_for().get(self.url(comment)).status_code, 404)
+
+        response = self.client_for('staff').patch(self.url(comment), {'status': Comment.COMMENT_STATUS_APPROVED},
+                                                  format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['status'], Comment.COMMENT_STATUS_APPROVED)
+        approved_count = product.approved_comments_count
+        product.refresh_from_db()
+        self.assertEqual(product.approved_comments_count, approved_count + 1)
+        self.assertEqual(self.client_for().get(self.url(comment)).status_code, 200)
+
+
+class CustomerStatsTests(SeededStoreTestCase):
+    def stats(self, customer):
+        return Customer.objects.values_list('orders_count', 'paid_total').get(pk=customer.pk)
+
+    def test_populating_sums_paid_items_without_order_totals(self):
+        customer = self.data['customer']
+        Order.objects.filter(customer=customer).update(status=Order.ORDER_STATUS_PAID, total_amount=0)
+        Customer.objects.update(orders_count=0, paid_total=0)
+        migration = import_module('store.migrations.0019_customer_stats')
+        migration.populate_customer_stats(apps, None)
+        paid_total = sum(item.quantity * item.unit_price for item in OrderItem.objects.filter(order__customer=customer))
+        self.assertEqual(self.stats(customer), (3, paid_total))
+
+    def test_admin_item_moves_and_deletes_update_both_customers(self):
+        customer = self.data['customer']
+        other = get_user_model().objects.create_user(username='other', email='other@store.local', password='password').customer
+        paid = Order.objects.create(customer=other, status=Order.ORDER_STATUS_PAID)
+        Order.objects.filter(customer=customer).update(status=Order.ORDER_STATUS_PAID)
+        rebuild_customer_stats(Customer.objects.all())
+        item = OrderItem.objects.filter(order__customer=customer).first()
+        amount = item.quantity * item.unit_price
+        paid_total = self.stats(customer)[1]
+
+        self.client.force_login(self.data['staff'])
+        response = self.client.post(reverse('admin:store_orderitem_change', args=[item.pk]), {
+            'order': paid.pk, 'product': item.product_id, 'quantity': item.quantity, 'unit_price': item.unit_price,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats(customer), (3, paid_total - amount))
+        self.assertEqual(self.stats(other), (1, amount))
+
+        response = self.client.post(reverse('admin:store_orderitem_delete', args=[item.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats(other), (1, 0))
+
+        response = self.client.post(reverse('admin:store_orderitem_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(OrderItem.objects.filter(order__customer=customer).values_list('pk', flat=True)),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats(customer), (3, 0))
+
+
+class SetupFakeDataTests(SeededStoreTestCase):
+    def test_old_data_is_replaced_without_real_customers(self):
+        customer = self.data['customer']
+        Job.objects.create(signal=order_create.name, sender=object_path(Order), receiver='store.tests.create_category',
+                           payload={'order': {'model': 'store.order', 'pk': self.data['order'].pk}})
+        options = {'categories': 2, 'discounts': 1, 'products': 5, 'customers': 3, 'orders': 2, 'carts': 2,
+                   'seed': 1, 'stdout': StringIO()}
+        call_command('setup_fake_data', **options)
+        call_command('setup_fake_data', **options)
+
+        self.assertTrue(Customer.objects.filter(pk=customer.pk).exists())
+        self.assertEqual(Customer.objects.filter(user__username__startswith='fake_').count(), 3)
+        self.assertFalse(Job.objects.exists())
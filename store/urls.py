@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework_nested import routers
 from . import views
+from .async_views import with_async_reads
 
 router = routers.DefaultRouter()
 router.register('products', views.ProductViewSet, basename='product')
@@ -8,6 +9,8 @@ router.register('categories', views.CategoryViewSet, basename='category')
 router.register('carts', views.CartViewSet, basename='cart')
 router.register('customers', views.CustomerVewSet, basename='customer')
 router.register('orders', views.OrderViewSet, basename='order')
+router.register('analytics/sales', views.SalesAnalyticsViewSet, basename='sales-analytics')
+router.register('db-pool', views.DatabasePoolViewSet, basename='db-pool')
 
 products_router = routers.NestedDefaultRouter(router, 'products', lookup='product')
 products_router.register('comments', views.CommentViewSet, basename='product-comment')
@@ -19,3 +22,11 @@ urlpatterns = [
     path('', include(products_router.urls)),
     path('', include(cart_items_router.urls)),
 ]
+
+# The same routes for the ASGI application (config.asgi_urls), with the catalog reads served by async views.
+ASYNC_READ_ROUTES = {'product-list', 'product-detail', 'category-list', 'category-detail', 'cart-detail'}
+
+async_urlpatterns = [
+    path('', include(with_async_reads(router.urls, ASYNC_READ_ROUTES))),
+    *urlpatterns[1:],
+]
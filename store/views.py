@@ -1,37 +1,62 @@
+import os
+
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.viewsets import ModelViewSet, GenericViewSet
+from rest_framework.viewsets import ModelViewSet, GenericViewSet, ViewSet
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.decorators import action
+from rest_framework.exceptions import UnsupportedMediaType
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from django.db.models import Prefetch
 
+from core.authentication import get_customer_id
 from .models import Product, Category, Comment, Cart, CartItem, Customer, Order, OrderItem
-from .serializers import (ProductSerializer, CategorySerializer, CommentSerializer, CartSerializer, CartItemSerializer,
-                          AddCartItemSerializer, UpdateCartItemSerializer, CustomerSerializer, OrderSerializer,
-                          OrderForAdminSerializer, OrderCreateSerializer, OrderUpdateSerializer)
-from .filters import ProductFilter
-from .pagination import DefaultPagination
+from .serializers import (ProductSerializer, CategorySerializer, CommentSerializer, CommentForAdminSerializer,
+                          CartSerializer, CartItemSerializer, AddCartItemSerializer, BulkAddCartItemSerializer,
+                          UpdateCartItemSerializer, CustomerSerializer,
+                          OrderSerializer, OrderSummarySerializer, OrderForAdminSerializer, OrderCreateSerializer,
+                          OrderUpdateSerializer, SalesReportQuerySerializer)
+from .analytics import sales_report
+from .async_views import AsyncReadMixin
+from .cache import acache_cart, aget_cached_cart, cache_cart, get_cached_cart, invalidate_carts
+from .compiled import CompiledReadMixin
+from .conditional import ConditionalGetMixin
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .imports import ProductImporter, get_reader
+from .pagination import CommentPagination, CustomerPagination, KeysetPagination, OrderPagination
+from .search import ProductSearchFilter
+from .pool import pool_stats
 from .permissions import IsAdminOrReadonly, SendPrivetEmailToCustomerPermission, CustomDjangoModelPermission
-from .signals import order_create
 
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CompiledReadMixin, AsyncReadMixin, ModelViewSet):
     serializer_class = ProductSerializer
     queryset = Product.objects.all()
-    filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
+    filter_backends = [ProductSearchFilter, DjangoFilterBackend, OrderingFilter]
     ordering_fields = ['name', 'unit_price', 'inventory']
-    search_fields = ['name', 'category__title']
     filterset_class = ProductFilter
-    pagination_class = DefaultPagination
+    pagination_class = KeysetPagination
     permission_classes = [IsAdminOrReadonly]
 
     def get_serializer_context(self):
         return {'request': self.request}
 
+    def can_read_async(self, request):
+        # Search backends may query (or build their index) while filtering.
+        return not request.query_params.get(ProductSearchFilter.search_param)
+
+    @action(detail=False, methods=['POST'], url_path='import', permission_classes=[IsAdminUser])
+    def bulk_import(self, request):
+        """Create and update products from a CSV or NDJSON body, streamed; see store.imports.ProductImporter."""
+        reader = get_reader(request.content_type)
+        if reader is None:
+            raise UnsupportedMediaType(request.content_type)
+        report = ProductImporter().run(reader(request.stream or []))
+        return Response(report.as_dict())
+
     def destroy(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
         product = get_object_or_404(Product.objects.select_related('category'), pk=pk)
@@ -42,26 +67,43 @@ class ProductViewSet(ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, AsyncReadMixin, ModelViewSet):
     serializer_class = CategorySerializer
-    queryset = Category.objects.prefetch_related('products').all()
+    queryset = Category.objects.all()
     permission_classes = [IsAdminOrReadonly]
 
     def destroy(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
-        category = get_object_or_404(Category.objects.prefetch_related('products'), pk=pk)
-        if category.products.count() > 0:
+        category = get_object_or_404(Category, pk=pk)
+        # Not products_count: writes that fire no signals let it drift, and deleting a category that still
+        # has products fails on their protected foreign key.
+        if category.products.exists():
             return Response({'error': 'There is some product relation this category. please remove them first.'})
         category.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class CommentViewSet(ModelViewSet):
-    serializer_class = CommentSerializer
+    pagination_class = CommentPagination
+
+    def get_permissions(self):
+        # Anyone may read and post comments; editing, deleting and moderating them is left to staff.
+        if self.request.method in ['PUT', 'PATCH', 'DELETE']:
+            return [IsAdminUser()]
+        return [AllowAny()]
 
     def get_queryset(self):
         product_pk = self.kwargs['product_pk']
-        return Comment.objects.filter(product_id=product_pk).all()
+        if self.request.user.is_staff:
+            return Comment.objects.filter(product_id=product_pk)
+        # Only approved comments are published.
+        return Comment.objects.filter(product_id=product_pk, status=Comment.COMMENT_STATUS_APPROVED)
+
+    def get_serializer_class(self):
+        # New comments wait for moderation: only staff see and set the status.
+        if self.request.user.is_staff:
+            return CommentForAdminSerializer
+        return CommentSerializer
 
     def get_serializer_context(self):
         return {'product_pk': self.kwargs['product_pk']}
@@ -75,6 +117,8 @@ class CartItemViewSet(ModelViewSet):
         return CartItem.objects.select_related('product').filter(cart_id=cart_pk).all()
 
     def get_serializer_class(self):
+        if self.action == 'bulk':
+            return BulkAddCartItemSerializer
         if self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
@@ -84,22 +128,78 @@ class CartItemViewSet(ModelViewSet):
     def get_serializer_context(self):
         return {'cart_pk': self.kwargs['cart_pk']}
 
+    def perform_create(self, serializer):
+        # Adding items records the cart's activity itself.
+        serializer.save()
+        invalidate_carts([self.kwargs['cart_pk']])
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.cart_changed(self.kwargs['cart_pk'])
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        self.cart_changed(self.kwargs['cart_pk'])
+
+    @staticmethod
+    def cart_changed(cart_pk):
+        Cart.objects.filter(pk=cart_pk).touch()
+        invalidate_carts([cart_pk])
 
-class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
+    @action(detail=False, methods=['POST'])
+    def bulk(self, request, cart_pk):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        invalidate_carts([cart_pk])
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class CartViewSet(CompiledReadMixin, AsyncReadMixin, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin,
+                  GenericViewSet):
     serializer_class = CartSerializer
     queryset = Cart.objects.prefetch_related('items__product').all()
     # lookup_value_regex = '[0-9a-fA-F]{8}\-?[0-9a-fA-F]{4}\-?[0-9a-fA-F]{4}\-?[0-9a-fA-F]{4}\-?[0-9a-fA-F]{12}'
 
+    def retrieve(self, request, *args, **kwargs):
+        data, key = get_cached_cart(kwargs['pk'])
+        if data is None:
+            cart = self.get_object()
+            data = self.get_serializer(cart).data
+            cache_cart(key, data)
+        return Response(data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        data, key = await aget_cached_cart(kwargs['pk'])
+        if data is None:
+            cart = await self.aget_object()
+            data = await self.aget_serializer_data(self.get_serializer(cart))
+            await acache_cart(key, data)
+        return Response(data)
+
+    def perform_destroy(self, instance):
+        cart_id = instance.pk
+        instance.delete()
+        invalidate_carts([cart_id])
+
 
 class CustomerVewSet(ModelViewSet):
     serializer_class = CustomerSerializer
     queryset = Customer.objects.all()
     permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = CustomerFilter
+    # Each is read off its (field, id) index, e.g. `?ordering=-paid_total` for the most valuable customers.
+    ordering_fields = ['orders_count', 'paid_total', 'last_order_at']
+    pagination_class = CustomerPagination
 
     @action(detail=False, methods=['GET', 'PUT'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        user_id = request.user.id
-        customer = Customer.objects.get(user_id=user_id)
+        customer_id = get_customer_id(request.user)
+        if customer_id is not None:
+            customer = Customer.objects.get(pk=customer_id)
+        else:
+            customer = Customer.objects.get(user_id=request.user.id)
         if request.method == 'GET':
             serializer = CustomerSerializer(customer)
             return Response(serializer.data)
@@ -114,9 +214,13 @@ class CustomerVewSet(ModelViewSet):
         return Response(f'sending email to Customer {pk=}')
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(CompiledReadMixin, ModelViewSet):
     # permission_classes = [IsAuthenticated]
     http_method_names = ['get', 'post', 'patch', 'delete', 'options', 'head']
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = OrderFilter
+    ordering_fields = ['datetime_created', 'total_amount']
+    pagination_class = OrderPagination
 
     def get_permissions(self):
         if self.request.method in ['PATCH', 'DELETE']:
@@ -124,18 +228,25 @@ class OrderViewSet(ModelViewSet):
         return [IsAuthenticated()]
 
     def get_queryset(self):
-        queryset = (Order.objects.prefetch_related(
-            Prefetch(
-                'items',
-                queryset=OrderItem.objects.select_related('product'),
-            )
-        ).select_related('customer__user').
-                    all())
+        if self.action == 'list':
+            # Only the summary is listed, and its totals are stored on the order itself.
+            queryset = Order.objects.all()
+        else:
+            queryset = (Order.objects.prefetch_related(
+                Prefetch(
+                    'items',
+                    queryset=OrderItem.objects.select_related('product'),
+                )
+            ).select_related('customer__user').
+                        all())
         user = self.request.user
 
         if user.is_staff:
             return queryset
 
+        customer_id = get_customer_id(user)
+        if customer_id is not None:
+            return queryset.filter(customer_id=customer_id)
         return queryset.filter(customer__user_id=user.id)
 
     def get_serializer_class(self):
@@ -145,12 +256,15 @@ class OrderViewSet(ModelViewSet):
         if self.request.method == 'PATCH':
             return OrderUpdateSerializer
 
+        if self.action == 'list':
+            return OrderSummarySerializer
+
         if self.request.user.is_staff:
             return OrderForAdminSerializer
         return OrderSerializer
 
     def get_serializer_context(self):
-        return {'user_id': self.request.user.id}
+        return {'user_id': self.request.user.id, 'customer_id': get_customer_id(self.request.user)}
 
     def create(self, request, *args, **kwargs):
         create_order_serializer = OrderCreateSerializer(
@@ -160,7 +274,31 @@ class OrderViewSet(ModelViewSet):
         create_order_serializer.is_valid(raise_exception=True)
         created_order = create_order_serializer.save()
 
-        order_create.send_robust(self.__class__, order=created_order)
-
+        created_order = self.get_queryset().get(pk=created_order.pk)
         serializer = OrderSerializer(created_order)
         return Response(serializer.data)
+
+
+class SalesAnalyticsViewSet(ViewSet):
+    """Units and revenue per day, product or category over a date range, read from the daily sales rollups."""
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        query = SalesReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'group_by': params['group_by'],
+            'results': sales_report(params['start'], params['end'], params['status'], params['group_by'],
+                                    params['limit']),
+        })
+
+
+class DatabasePoolViewSet(ViewSet):
+    """Connection pool stats (store.pool) of the worker process that serves the request."""
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response({'pid': os.getpid(), 'pools': pool_stats()})